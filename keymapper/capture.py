@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Record events of devices to a file, to replay them somewhere else.
+
+The file starts with a header that describes the devices of the group,
+followed by fixed-size binary records of all events.
+"""
+
+
+import json
+import time
+import select
+import struct
+
+import evdev
+
+from keymapper.logger import logger
+from keymapper.groups import _Group
+
+
+MAGIC = b'KMRC'
+VERSION = 1
+
+# magic, version, length of the json metadata that follows
+HEADER = struct.Struct('<4sBI')
+# kernel timestamp, index of the device, type, code, value
+RECORD = struct.Struct('<dBHHi')
+
+
+class Capture:
+    """Events of the devices of a group with the information to fake them."""
+    def __init__(self, group_key, types, devices, events):
+        """
+        Parameters
+        ----------
+        group_key : str
+            the group the events were recorded from
+        types : list of str
+            the types of that group, like groups.classify returns them
+        devices : list of dict
+            for each device its "name", "path" and "capabilities" like
+            InputDevice.capabilities(absinfo=True) returns them
+        events : list of tuples
+            timestamp, device index, type, code, value
+        """
+        self.group_key = group_key
+        self.types = types
+        self.devices = devices
+        self.events = events
+
+    def get_group(self):
+        """Get a group that looks like the one that was recorded."""
+        return _Group(
+            paths=[device['path'] for device in self.devices],
+            names=[device['name'] for device in self.devices],
+            types=self.types,
+            key=self.group_key
+        )
+
+    def get_duration(self):
+        """How many seconds passed between the first and the last event."""
+        if len(self.events) == 0:
+            return 0
+
+        return self.events[-1][0] - self.events[0][0]
+
+
+def _serialize_capabilities(capabilities):
+    """Make the output of capabilities(absinfo=True) json compatible."""
+    serialized = {}
+    for ev_type, codes in capabilities.items():
+        serialized[str(ev_type)] = [
+            [code[0], list(code[1])] if isinstance(code, tuple) else code
+            for code in codes
+        ]
+
+    return serialized
+
+
+def _deserialize_capabilities(serialized):
+    """Inverse of _serialize_capabilities."""
+    capabilities = {}
+    for ev_type, codes in serialized.items():
+        capabilities[int(ev_type)] = [
+            (code[0], evdev.AbsInfo(*code[1])) if isinstance(code, list)
+            else code
+            for code in codes
+        ]
+
+    return capabilities
+
+
+def write_header(file, group_key, types, devices):
+    """Start a capture file.
+
+    Parameters
+    ----------
+    file : file
+        opened in binary mode
+    group_key : str
+    types : list of str
+        the types of the group, see _Group
+    devices : list of InputDevice
+    """
+    metadata = json.dumps({
+        'group_key': group_key,
+        'types': types,
+        'devices': [{
+            'name': device.name,
+            'path': device.path,
+            'capabilities': _serialize_capabilities(
+                device.capabilities(absinfo=True)
+            ),
+        } for device in devices]
+    }).encode()
+
+    file.write(HEADER.pack(MAGIC, VERSION, len(metadata)))
+    file.write(metadata)
+
+
+def write_event(file, index, event):
+    """Add an event of the device with that index to the capture file."""
+    file.write(RECORD.pack(
+        event.timestamp(),
+        index,
+        event.type,
+        event.code,
+        event.value
+    ))
+
+
+def load(path):
+    """Read a capture file.
+
+    Raises a ValueError if it is not a valid capture.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError(f'"{path}" is not a key-mapper capture')
+
+    magic, version, metadata_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'"{path}" is not a key-mapper capture')
+
+    if version != VERSION:
+        raise ValueError(f'Unsupported capture version {version}')
+
+    offset = HEADER.size + metadata_length
+    metadata = json.loads(data[HEADER.size:offset])
+
+    # ignore an incomplete record at the end, in case recording was killed
+    end = offset + (len(data) - offset) // RECORD.size * RECORD.size
+    events = list(RECORD.iter_unpack(data[offset:end]))
+
+    devices = [{
+        'name': device['name'],
+        'path': device['path'],
+        'capabilities': _deserialize_capabilities(device['capabilities']),
+    } for device in metadata['devices']]
+
+    return Capture(
+        metadata['group_key'],
+        metadata['types'],
+        devices,
+        events
+    )
+
+
+def record(group, path, duration=None):
+    """Write all events of the group to a capture file.
+
+    Doesn't grab the devices, so they can be used normally in the meantime.
+    Blocks until the duration is over or until interrupted with ctrl + c.
+
+    Returns how many events were recorded.
+
+    Parameters
+    ----------
+    group : _Group
+    path : str
+        where to write the capture to
+    duration : float or None
+        in seconds. Records until interrupted if None.
+    """
+    devices = []
+    for device_path in group.paths:
+        try:
+            devices.append(evdev.InputDevice(device_path))
+        except (FileNotFoundError, OSError) as error:
+            logger.error('Could not open "%s": %s', device_path, error)
+
+    if len(devices) == 0:
+        return 0
+
+    fds = {device.fd: index for index, device in enumerate(devices)}
+    deadline = None if duration is None else time.time() + duration
+    count = 0
+
+    logger.info('Recording events of "%s" to "%s"', group.key, path)
+    with open(path, 'wb') as file:
+        write_header(file, group.key, group.types, devices)
+
+        try:
+            while deadline is None or time.time() < deadline:
+                timeout = None
+                if deadline is not None:
+                    timeout = max(0, deadline - time.time())
+
+                readable, _, _ = select.select(fds.keys(), [], [], timeout)
+                for fd in readable:
+                    index = fds[fd]
+                    for event in devices[index].read():
+                        write_event(file, index, event)
+                        count += 1
+        except KeyboardInterrupt:
+            pass
+
+    return count
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""Binary sidecar files of presets that load faster than their json.
+
+Next to large presets, a compiled copy is stored that contains the
+hash of the json it was made from. It is only used as long as the json
+is unchanged, so the json stays the source of truth and can still be
+edited by hand.
+"""
+
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+import itertools
+
+from keymapper.logger import logger
+from keymapper.key import Key
+
+
+MAGIC = b'KMCP'
+VERSION = 1
+
+# smaller presets load from their json fast enough
+COMPILE_THRESHOLD = 1000
+
+# magic, version, size and sha256 of the json, number of mappings,
+# number of sub keys, length of the config json, length of the symbols
+HEADER = struct.Struct('<4sBQ32sIIII')
+# number of sub keys of the key, number of characters of the symbol
+ENTRY = struct.Struct('<BI')
+# type, code, value
+SUB_KEY = struct.Struct('<HHi')
+
+
+def get_compiled_path(path):
+    """Get where the compiled copy of the preset at path is stored."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}.compiled')
+
+
+def compile_preset(content, mapping, config):
+    """Encode the preset in the compiled format.
+
+    Raises a ValueError if a key doesn't fit into the format.
+
+    Parameters
+    ----------
+    content : str
+        the json of the preset, exactly like it is written into its file
+    mapping : iterable
+        of Key objects and their symbols
+    config : dict
+        everything else that is stored in the preset
+    """
+    entries = bytearray()
+    sub_keys = bytearray()
+    symbols = bytearray()
+    count = 0
+    for key, symbol in mapping:
+        try:
+            entries += ENTRY.pack(len(key), len(symbol))
+            for sub_key in key:
+                sub_keys += SUB_KEY.pack(*sub_key)
+        except struct.error as error:
+            raise ValueError(f'Cannot compile {key}: {error}') from error
+
+        symbols += symbol.encode()
+        count += 1
+
+    encoded_content = content.encode()
+    encoded_config = json.dumps(config).encode()
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        len(encoded_content),
+        hashlib.sha256(encoded_content).digest(),
+        count,
+        len(sub_keys) // SUB_KEY.size,
+        len(encoded_config),
+        len(symbols)
+    )
+
+    return b''.join([header, encoded_config, entries, sub_keys, symbols])
+
+
+def _decode(data, content, path):
+    """Get the mapping and config out of a compiled preset.
+
+    Returns None if it was not made from that json content.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError(f'"{path}" is not a compiled preset')
+
+    (
+        magic, version, size, digest, num_entries, num_sub_keys,
+        config_length, symbols_length
+    ) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'"{path}" is not a compiled preset')
+
+    if version != VERSION:
+        logger.debug('"%s" has the outdated version %d', path, version)
+        return None
+
+    if size != len(content) or digest != hashlib.sha256(content).digest():
+        logger.debug('"%s" is outdated', path)
+        return None
+
+    entries_offset = HEADER.size + config_length
+    sub_keys_offset = entries_offset + num_entries * ENTRY.size
+    symbols_offset = sub_keys_offset + num_sub_keys * SUB_KEY.size
+    if len(data) != symbols_offset + symbols_length:
+        raise ValueError(f'"{path}" is incomplete')
+
+    entries = list(ENTRY.iter_unpack(data[entries_offset:sub_keys_offset]))
+    lengths = [entry[0] for entry in entries]
+    if 0 in lengths or sum(lengths) != num_sub_keys:
+        raise ValueError(f'"{path}" has an invalid number of sub keys')
+
+    symbols = str(data[symbols_offset:], 'utf-8')
+    if sum(entry[1] for entry in entries) != len(symbols):
+        raise ValueError(f'"{path}" has an invalid length of symbols')
+
+    config = json.loads(bytes(data[HEADER.size:entries_offset]))
+    sub_keys = SUB_KEY.iter_unpack(data[sub_keys_offset:symbols_offset])
+
+    mapping = {}
+    position = 0
+    for length, symbol_length in entries:
+        key = Key.from_verified(tuple(itertools.islice(sub_keys, length)))
+        end = position + symbol_length
+        mapping[key] = symbols[position:end]
+        position = end
+
+    return mapping, config
+
+
+def load_compiled(path):
+    """Load the preset at path from its compiled copy.
+
+    Returns a tuple of a dict of Key objects to symbols and the config,
+    or None if there is no up to date compiled copy. Raises a ValueError
+    if the compiled copy is broken.
+
+    Parameters
+    ----------
+    path : str
+        path of the json of the preset
+    """
+    compiled_path = get_compiled_path(path)
+    if not os.path.exists(compiled_path):
+        return None
+
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    with open(compiled_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError(f'"{compiled_path}" is empty')
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with memoryview(data) as view:
+                return _decode(view, content, compiled_path)
@@ -37,6 +37,18 @@ NONE = 'none'
 
 INITIAL_CONFIG = {
     'autoload': {},
+    'daemon': {
+        # how many injections autoload starts at the same time
+        'autoload_concurrency': 4
+    },
+    'injection': {
+        # how many of the most recent decisions about input events each
+        # injection remembers for debugging. 0 disables it.
+        'trace_size': 0,
+        # measure latencies and count events for
+        # key-mapper-control --command stats
+        'record_stats': False
+    },
     'macros': {
         # some time between keystrokes might be required for them to be
         # detected properly in software.
@@ -77,6 +89,23 @@ class ConfigBase:
         self._config = {}
         self.fallback = fallback
 
+        # increased whenever the config changes, to know when the values
+        # that get resolved before are outdated
+        self._revision = 0
+        self._cache = {}
+        self._cache_revision = None
+
+    def get_revision(self):
+        """Get a number that changes if this config or a fallback changes."""
+        if self.fallback is None:
+            return self._revision
+
+        return self._revision + self.fallback.get_revision()
+
+    def _invalidate(self):
+        """Forget all cached values, after _config was modified."""
+        self._revision += 1
+
     def _resolve(self, path, func, config=None):
         """Call func for the given config value.
 
@@ -118,6 +147,7 @@ class ConfigBase:
                 del parent[chunk]
 
         self._resolve(path, callback)
+        self._invalidate()
 
     def set(self, path, value):
         """Set a config key.
@@ -138,6 +168,7 @@ class ConfigBase:
             parent[chunk] = value
 
         self._resolve(path, callback)
+        self._invalidate()
 
     def get(self, path, log_unknown=True):
         """Get a config value. If not set, return the default
@@ -149,6 +180,27 @@ class ConfigBase:
         log_unknown : bool
             If True, write an error if `path` does not exist in the config
         """
+        revision = self.get_revision()
+        if revision != self._cache_revision:
+            self._cache = {}
+            self._cache_revision = revision
+
+        # lists are not hashable, and their chunks might contain dots
+        cache_key = path if isinstance(path, str) else tuple(path)
+        resolved = self._cache.get(cache_key)
+        if resolved is None:
+            resolved = self._get_uncached(path, log_unknown)
+            if resolved is not None:
+                self._cache[cache_key] = resolved
+
+        if isinstance(resolved, (dict, list)):
+            # modifications are only allowed via set
+            return copy.deepcopy(resolved)
+
+        return resolved
+
+    def _get_uncached(self, path, log_unknown):
+        """Search the config, the fallback and the defaults for the path."""
         def callback(parent, child, chunk):
             return child
 
@@ -166,9 +218,24 @@ class ConfigBase:
         # modifications are only allowed via set
         return copy.deepcopy(resolved)
 
+    def snapshot(self, paths):
+        """Get multiple config values at once.
+
+        The values won't change anymore when the config is modified.
+
+        Parameters
+        ----------
+        paths : iterable
+            of paths like they are passed to get
+
+        Returns a dict of path to value.
+        """
+        return {path: self.get(path) for path in paths}
+
     def clear_config(self):
         """Remove all configurations in memory."""
         self._config = {}
+        self._invalidate()
 
 
 class GlobalConfig(ConfigBase):
@@ -241,12 +308,14 @@ class GlobalConfig(ConfigBase):
             logger.debug('Config "%s" doesn\'t exist yet', self.path)
             self.clear_config()
             self._config = copy.deepcopy(INITIAL_CONFIG)
+            self._invalidate()
             self.save_config()
             return
 
         with open(self.path, 'r') as file:
             try:
                 self._config.update(json.load(file))
+                self._invalidate()
                 logger.info('Loaded config from "%s"', self.path)
             except json.decoder.JSONDecodeError as error:
                 logger.error(
@@ -30,21 +30,27 @@ import sys
 import json
 import time
 import atexit
+import hashlib
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
 
 from pydbus import SystemBus
+from pydbus.registration import ObjectWrapper, ObjectRegistration
+from pydbus.generic import signal
 import gi
 gi.require_version('GLib', '2.0')
-from gi.repository import GLib
+from gi.repository import GLib, Gio
 
 from keymapper.logger import logger, is_debug
 from keymapper.injection.injector import Injector, UNKNOWN
+from keymapper.injection.context import Context
+from keymapper.injection import profiling
 from keymapper.mapping import Mapping
 from keymapper.config import config
 from keymapper.state import system_mapping
 from keymapper.groups import groups
-
-
-BUS_NAME = 'keymapper.Control'
+from keymapper.trigger import BUS_NAME, OBJECT_PATH
 
 
 class AutoloadHistory:
@@ -95,6 +101,237 @@ class AutoloadHistory:
         return False
 
 
+class PresetCache:
+    """Remembers compiled presets to avoid parsing them for each injection.
+
+    Entries are keyed by the path, modification time and size of the
+    preset file and by the xmodmap digest, because symbols are resolved to
+    keycodes and macros are parsed when compiling.
+    """
+    def __init__(self, size=16):
+        """Construct an empty cache.
+
+        Parameters
+        ----------
+        size : int
+            How many presets to keep at most. The least recently used
+            ones are removed first.
+        """
+        self._size = size
+        # mapping of key -> Context
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def get_key(preset_path, xmodmap_digest):
+        """Get the key of the preset in its current state on the disk.
+
+        Raises a FileNotFoundError if the preset doesn't exist.
+        """
+        if not os.path.exists(preset_path):
+            raise FileNotFoundError(
+                f'Tried to load non-existing preset "{preset_path}"'
+            )
+
+        stat = os.stat(preset_path)
+        return preset_path, stat.st_mtime_ns, stat.st_size, xmodmap_digest
+
+    def get(self, key):
+        """Get the Context of the compiled preset or None."""
+        context = self._entries.get(key)
+        if context is not None:
+            self._entries.move_to_end(key)
+
+        return context
+
+    def put(self, key, context):
+        """Remember a compiled preset."""
+        # outdated versions of the same preset won't be needed anymore
+        for existing_key in list(self._entries.keys()):
+            if existing_key[0] == key[0]:
+                del self._entries[existing_key]
+
+        self._entries[key] = context
+
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Workers:
+    """Thread pool that runs tasks of the same key one after the other.
+
+    Tasks of different keys run in parallel. Exclusive tasks wait for all
+    tasks that were submitted before them, and all tasks that are
+    submitted afterwards wait for them.
+    """
+    # key of exclusive tasks
+    ALL = object()
+
+    def __init__(self, max_workers=4):
+        """Construct the pool, threads are started when needed."""
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='key-mapper-worker'
+        )
+        # (key, function, args) tuples that didn't start yet, in the order
+        # in which they were submitted
+        self._pending = collections.deque()
+        # keys of the tasks that are currently running
+        self._running = set()
+        self._idle = threading.Condition()
+
+    def submit(self, key, function, *args):
+        """Run the function in a thread once previous tasks of key are done.
+
+        Parameters
+        ----------
+        key : hashable
+            for example a group key
+        function : callable
+        """
+        with self._idle:
+            self._pending.append((key, function, args))
+            self._schedule()
+
+    def submit_exclusive(self, function, *args):
+        """Run the function in a thread once all previous tasks are done."""
+        self.submit(self.ALL, function, *args)
+
+    def _schedule(self):
+        """Start the pending tasks that don't have to wait anymore.
+
+        Has to be called while holding the _idle condition.
+        """
+        busy = set(self._running)
+        for task in list(self._pending):
+            key = task[0]
+            if self.ALL in busy:
+                # nothing may overtake an exclusive task
+                break
+
+            if key is self.ALL and len(busy) > 0:
+                break
+
+            if key not in busy:
+                self._pending.remove(task)
+                self._running.add(key)
+                self._executor.submit(self._work, *task)
+
+            busy.add(key)
+
+    def _work(self, key, function, args):
+        """Run the task and start the ones that waited for it."""
+        try:
+            function(*args)
+        except Exception:  # pylint: disable=broad-except
+            # Don't stop working on the remaining tasks of that key.
+            # Tasks that have a caller report the error to it on their
+            # own, see _DaemonObjectWrapper.
+            logger.exception('Task for "%s" failed', key)
+        finally:
+            with self._idle:
+                self._running.remove(key)
+                self._schedule()
+                self._idle.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until all submitted tasks are done.
+
+        Returns False if the timeout was reached.
+        """
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: len(self._pending) + len(self._running) == 0,
+                timeout
+            )
+
+
+class _TrackedInvocation:
+    """Remembers if a method call was already replied to."""
+    def __init__(self, invocation):
+        """
+        Parameters
+        ----------
+        invocation : Gio.DBusMethodInvocation
+        """
+        self._invocation = invocation
+        self.replied = False
+
+    def return_value(self, value):
+        """Reply with the return value."""
+        self.replied = True
+        self._invocation.return_value(value)
+
+    def return_dbus_error(self, name, message):
+        """Reply with an error."""
+        self.replied = True
+        self._invocation.return_dbus_error(name, message)
+
+    def __getattr__(self, name):
+        return getattr(self._invocation, name)
+
+
+class _DaemonObjectWrapper(ObjectWrapper):
+    """Handles dbus calls of the daemon without blocking the main loop.
+
+    Slow methods are called in the worker pool of the daemon and replied
+    to once they are done. The main loop stays free to answer, for
+    example, get_state of other clients in the meantime.
+    """
+    __slots__ = ()
+
+    def call_method(
+            self, connection, sender, object_path, interface_name,
+            method_name, parameters, invocation
+    ):
+        """Called by GDBus in the main loop for each incoming method call."""
+        if method_name not in self.object.slow_methods:
+            super().call_method(
+                connection, sender, object_path, interface_name,
+                method_name, parameters, invocation
+            )
+            return
+
+        # calls for the same group are done in order, calls that affect
+        # all groups wait for all others
+        key = self.object.get_worker_key(method_name, parameters.unpack())
+        submit_args = (
+            self._call_method_in_worker,
+            connection, sender, object_path, interface_name,
+            method_name, parameters, invocation
+        )
+        if key is None:
+            self.object.workers.submit_exclusive(*submit_args)
+        else:
+            self.object.workers.submit(key, *submit_args)
+
+    def _call_method_in_worker(
+            self, connection, sender, object_path, interface_name,
+            method_name, parameters, invocation
+    ):
+        """Call the method in a thread of the worker pool and reply."""
+        # pydbus replies to the invocation after calling the method, which
+        # GDBus allows from any thread. Errors of the method are replied by
+        # pydbus as well. Anything that fails beyond that would leave the
+        # caller waiting until its timeout, but replying twice is not
+        # allowed.
+        tracked_invocation = _TrackedInvocation(invocation)
+        try:
+            super().call_method(
+                connection, sender, object_path, interface_name,
+                method_name, parameters, tracked_invocation
+            )
+        except Exception as error:
+            if not tracked_invocation.replied:
+                invocation.return_dbus_error(
+                    f'{BUS_NAME}.Error.{error.__class__.__name__}',
+                    str(error)
+                )
+            raise
+
+
 class Daemon:
     """Starts injecting keycodes based on the configuration.
 
@@ -132,14 +369,83 @@ class Daemon:
                 <method name='autoload_single'>
                     <arg type='s' name='group_key' direction='in'/>
                 </method>
+                <method name='get_autoload_report'>
+                    <arg type='a{{sa{{sd}}}}' name='response' direction='out'/>
+                </method>
+                <method name='get_timings'>
+                    <arg type='s' name='group_key' direction='in'/>
+                    <arg type='a{{sd}}' name='response' direction='out'/>
+                </method>
+                <method name='get_stats'>
+                    <arg type='s' name='group_key' direction='in'/>
+                    <arg type='a{{st}}' name='counters' direction='out'/>
+                    <arg type='a{{sat}}' name='histograms' direction='out'/>
+                </method>
+                <method name='get_trace'>
+                    <arg type='s' name='group_key' direction='in'/>
+                    <arg type='ay' name='response' direction='out'/>
+                </method>
+                <method name='take_snapshot'>
+                    <arg type='s' name='group_key' direction='in'/>
+                    <arg type='s' name='response' direction='out'/>
+                </method>
                 <method name='hello'>
                     <arg type='s' name='out' direction='in'/>
                     <arg type='s' name='response' direction='out'/>
                 </method>
+                <signal name='state_changed'>
+                    <arg type='s' name='group_key'/>
+                    <arg type='i' name='state'/>
+                </signal>
             </interface>
         </node>
     """
 
+    # Those are called in a worker thread when called over dbus, because
+    # they refresh groups, read files or wait for processes and
+    # subprocesses. See get_worker_key for their order.
+    slow_methods = {
+        'start_injecting',
+        'stop_injecting',
+        'stop_all',
+        'autoload',
+        'autoload_single',
+        'get_stats',
+        'get_trace',
+        'take_snapshot',
+    }
+
+    # emitted with the group_key and the new state of its injection
+    state_changed = signal()
+
+    @staticmethod
+    def get_worker_key(method_name, args):
+        """Get the group that a slow method call waits for.
+
+        Calls for the same group are done one after the other. None if
+        the call affects all groups.
+
+        Parameters
+        ----------
+        method_name : str
+            one of slow_methods
+        args : tuple
+            the arguments of the call
+        """
+        if method_name in ['stop_all', 'autoload']:
+            return None
+
+        group_key = args[0]
+        if method_name == 'autoload_single' and group_key.startswith('/dev/'):
+            # resolved without refreshing groups, which is too slow for
+            # the main loop. Devices that are unknown so far can't be
+            # injected by anything else yet anyway.
+            group = groups.find(path=group_key)
+            if group is not None:
+                return group.key
+
+        return group_key
+
     def __init__(self):
         """Constructs the daemon."""
         logger.debug('Creating daemon')
@@ -149,6 +455,30 @@ class Daemon:
         self.autoload_history = AutoloadHistory()
         self.refreshed_devices_at = 0
 
+        # mapping of group_key -> step -> seconds of the previous autoload
+        self.autoload_report = {}
+        # mapping of group_key -> step -> seconds of start_injecting
+        self._start_timings = {}
+
+        self.preset_cache = PresetCache()
+        # the xmodmap.json content that was last added to system_mapping
+        self._xmodmap_digest = None
+
+        # autoload starts injections in multiple threads
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        # mapping of group_key -> the previously emitted state
+        self._states = {}
+        self._state_lock = threading.Lock()
+
+        # for calls over dbus, see slow_methods
+        self.workers = Workers()
+
+        # set when the dbus interface is published
+        self._registration = None
+        self._name_owner = None
+
         atexit.register(self.stop_all)
 
     @classmethod
@@ -206,7 +536,18 @@ class Daemon:
         """Make the dbus interface available."""
         bus = SystemBus()
         try:
-            bus.publish(BUS_NAME, self)
+            # like bus.publish, but with a wrapper that doesn't block
+            # the main loop with slow calls
+            node_info = Gio.DBusNodeInfo.new_for_xml(self.dbus)
+            interfaces = node_info.interfaces
+            self._registration = ObjectRegistration(
+                bus,
+                OBJECT_PATH,
+                interfaces,
+                _DaemonObjectWrapper(self, interfaces),
+                own_wrapper=True
+            )
+            self._name_owner = bus.request_name(BUS_NAME)
         except RuntimeError as error:
             logger.error('Is the service is already running? %s', str(error))
             sys.exit(1)
@@ -217,14 +558,21 @@ class Daemon:
         logger.debug('Running daemon')
         loop.run()
 
-    def refresh(self, group_key=None):
+    def refresh(self, group_key=None, path=None):
         """Refresh groups if the specified group is unknown.
 
         Parameters
         ----------
         group_key : str
             unique identifier used by the groups object
+        path : str
+            a path in /dev/input that should be part of a known group
         """
+        with self._refresh_lock:
+            self._refresh(group_key, path)
+
+    def _refresh(self, group_key, path):
+        """Refresh without locking, see refresh."""
         now = time.time()
         if now - 10 > self.refreshed_devices_at:
             logger.debug('Refreshing because last info is too old')
@@ -232,8 +580,11 @@ class Daemon:
             self.refreshed_devices_at = now
             return
 
-        if not groups.find(key=group_key):
-            logger.debug('Refreshing because "%s" is unknown', group_key)
+        if not groups.find(key=group_key, path=path):
+            logger.debug(
+                'Refreshing because "%s" is unknown',
+                group_key or path
+            )
             groups.refresh()
             self.refreshed_devices_at = now
 
@@ -248,11 +599,136 @@ class Daemon:
 
         self.injectors[group_key].stop_injecting()
         self.autoload_history.forget(group_key)
+        self._update_state(self.injectors[group_key])
 
     def get_state(self, group_key):
         """Get the injectors state."""
         injector = self.injectors.get(group_key)
-        return injector.get_state() if injector else UNKNOWN
+        if injector is None:
+            return UNKNOWN
+
+        state = injector.get_state()
+        self._check_state(injector)
+        return state
+
+    def get_timings(self, group_key):
+        """Get how long each step of the most recent start took.
+
+        Returns a mapping of step -> seconds, including the steps of the
+        injection process (like grabbing devices) once it reported them
+        together with its state.
+        """
+        timings = self._start_timings.get(group_key, {}).copy()
+        injector = self.injectors.get(group_key)
+        if injector is not None:
+            timings.update(injector.get_timings())
+            self._check_state(injector)
+
+        return timings
+
+    def get_stats(self, group_key):
+        """Get event counters and latency histograms of the injection.
+
+        Returns two dicts, see keymapper.injection.stats.Stats.serialize.
+        Both are empty if the group is not being injected.
+        """
+        injector = self.injectors.get(group_key)
+        if injector is None:
+            return {}, {}
+
+        stats = injector.get_stats()
+        self._check_state(injector)
+        return stats
+
+    def get_trace(self, group_key):
+        """Get what the injection recently did with input events.
+
+        Returns the binary dump, see keymapper.injection.trace.decode.
+        Empty if the group is not being injected or if tracing is
+        disabled via injection.trace_size.
+        """
+        injector = self.injectors.get(group_key)
+        if injector is None:
+            return b''
+
+        trace = injector.get_trace()
+        self._check_state(injector)
+        return trace
+
+    def take_snapshot(self, group_key):
+        """Write a tracemalloc snapshot of the injection of the group.
+
+        Returns the path of the snapshot. Empty if the injection is not
+        being profiled, which requires KEYMAPPER_PROFILE to be set in the
+        environment of the service.
+        """
+        injector = self.injectors.get(group_key)
+        if injector is None:
+            return ''
+
+        path = injector.take_snapshot()
+        self._check_state(injector)
+        return path
+
+    def _update_state(self, injector):
+        """Emit state_changed if the state of the injection is new."""
+        # read it in any case, so that the pipe doesn't stay readable
+        state = injector.get_state()
+        group_key = injector.group.key
+
+        with self._state_lock:
+            if self.injectors.get(group_key) is not injector:
+                # replaced by a newer injection, which reports its own state
+                return
+
+            if self._states.get(group_key) == state:
+                return
+
+            self._states[group_key] = state
+
+        logger.debug('State of "%s" changed to %d', group_key, state)
+        self.state_changed(group_key, state)
+
+    def _check_state(self, injector):
+        """Emit state_changed later if reading from the injector changed it.
+
+        Everything that reads the messages of the injection process might
+        consume the one that finishes starting, and the watch of _watch
+        won't fire for it anymore. The comparison runs in the GLib main
+        loop, because this is called from worker threads.
+        """
+        GLib.idle_add(self._update_state, injector)
+
+    def _watch(self, injector):
+        """Emit state_changed when the injection process reports progress.
+
+        The callbacks run in the GLib main loop.
+        """
+        condition = GLib.IO_IN | GLib.IO_HUP
+
+        def on_message(*_):
+            self._update_state(injector)
+            return True
+
+        def on_exit(*_):
+            GLib.source_remove(message_watch)
+            self._update_state(injector)
+            return False
+
+        message_watch = GLib.io_add_watch(
+            injector.fileno(),
+            GLib.PRIORITY_DEFAULT,
+            condition,
+            on_message
+        )
+        GLib.io_add_watch(
+            injector.sentinel,
+            GLib.PRIORITY_DEFAULT,
+            condition,
+            on_exit
+        )
+
+        self._update_state(injector)
 
     def set_config_dir(self, config_dir):
         """All future operations will use this config dir.
@@ -282,7 +758,9 @@ class Daemon:
         group_key : str
             unique identifier used by the groups object
         """
+        start = time.monotonic()
         self.refresh(group_key)
+        refresh_time = time.monotonic() - start
 
         group = groups.find(key=group_key)
         if group is None:
@@ -298,8 +776,9 @@ class Daemon:
 
         if not isinstance(preset, str):
             # might be broken due to a previous bug
-            config.remove(['autoload', group.key])
-            config.save_config()
+            with self._lock:
+                config.remove(['autoload', group.key])
+                config.save_config()
             return
 
         logger.info('Autoloading for "%s"', group.key)
@@ -314,6 +793,11 @@ class Daemon:
         self.start_injecting(group.key, preset)
         self.autoload_history.remember(group.key, preset)
 
+        self.autoload_report[group.key] = {
+            'refresh': refresh_time,
+            **self._start_timings.get(group.key, {})
+        }
+
     def autoload_single(self, group_key):
         """Inject the configured autoload preset for the device.
 
@@ -322,7 +806,8 @@ class Daemon:
         Parameters
         ----------
         group_key : str
-            unique identifier used by the groups object
+            unique identifier used by the groups object, or a path in
+            /dev/input. udev only knows the latter.
         """
         # avoid some confusing logs and filter obviously invalid requests
         if group_key.startswith('key-mapper'):
@@ -339,6 +824,20 @@ class Daemon:
             )
             return
 
+        if group_key.startswith('/dev/'):
+            path = group_key
+            self.refresh(path=path)
+            group = groups.find(path=path)
+            if group is None:
+                # not relevant for key-mapper, for example a power button
+                logger.debug('No group found for "%s"', path)
+                return
+
+            if group.key.startswith('key-mapper'):
+                return
+
+            group_key = group.key
+
         self._autoload(group_key)
 
     def autoload(self):
@@ -361,8 +860,39 @@ class Daemon:
             logger.error('No presets configured to autoload')
             return
 
-        for group_key, _ in autoload_presets:
-            self._autoload(group_key)
+        self.autoload_report = {}
+
+        # do this once before, instead of possibly in each thread
+        self.refresh()
+
+        # most of the time is spent waiting for files and processes, so
+        # threads work fine for this
+        concurrency = config.get('daemon.autoload_concurrency')
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = [
+                executor.submit(self._autoload, group_key)
+                for group_key, _ in autoload_presets
+            ]
+
+        for future in futures:
+            # raises exceptions that happened in the threads
+            future.result()
+
+    def get_autoload_report(self):
+        """Get how long each step of the previous autoload took.
+
+        Returns a mapping of group_key -> step -> seconds. The steps of
+        the injection process (like grabbing devices) show up once it is
+        done with them.
+        """
+        report = {}
+        for group_key, timings in self.autoload_report.items():
+            report[group_key] = timings.copy()
+            injector = self.injectors.get(group_key)
+            if injector is not None:
+                report[group_key].update(injector.get_timings())
+
+        return report
 
     def start_injecting(self, group_key, preset):
         """Start injecting the preset for the device.
@@ -399,43 +929,111 @@ class Daemon:
             f'{preset}.json'
         )
 
-        mapping = Mapping()
+        timings = {}
+
+        with self._lock:
+            start = time.monotonic()
+            xmodmap_digest = self._update_system_mapping()
+            timings['load_xmodmap'] = time.monotonic() - start
+
+        start = time.monotonic()
         try:
-            mapping.load(preset_path)
+            context = self._get_context(preset_path, xmodmap_digest)
         except FileNotFoundError as error:
             logger.error(str(error))
             return False
+        timings['load_preset'] = time.monotonic() - start
+
+        # Only configurable by whoever starts the service. The injections
+        # write their profiles there as root.
+        profile_dir = os.environ.get(profiling.ENV_VAR) or None
+
+        # don't let autoload threads interfere with each other when
+        # replacing injections
+        with self._lock:
+            if self.injectors.get(group_key) is not None:
+                self.stop_injecting(group_key)
+
+            start = time.monotonic()
+            try:
+                injector = Injector(
+                    group,
+                    context.mapping,
+                    context,
+                    profile_dir
+                )
+                injector.start()
+                self.injectors[group.key] = injector
+            except OSError:
+                # I think this will never happen, probably leftover from
+                # some earlier version
+                return False
+            timings['start_process'] = time.monotonic() - start
+
+            self._watch(injector)
+
+        self._start_timings[group.key] = timings
 
-        if self.injectors.get(group_key) is not None:
-            self.stop_injecting(group_key)
+        return True
 
+    def _update_system_mapping(self):
+        """Add the xmodmap of the users session to the system_mapping.
+
+        Returns a digest of the used xmodmap.json, or None if there is none.
+        """
         # Path to a dump of the xkb mappings, to provide more human
         # readable keys in the correct keyboard layout to the service.
         # The service cannot use `xmodmap -pke` because it's running via
         # systemd.
         xmodmap_path = os.path.join(self.config_dir, 'xmodmap.json')
         try:
-            with open(xmodmap_path, 'r') as file:
-                # do this for each injection to make sure it is up to
-                # date when the system layout changes.
-                xmodmap = json.load(file)
-                logger.debug('Using keycodes from "%s"', xmodmap_path)
-                system_mapping.update(xmodmap)
-                # the service now has process wide knowledge of xmodmap
-                # keys of the users session
+            # do this for each injection to make sure it is up to
+            # date when the system layout changes.
+            with open(xmodmap_path, 'rb') as file:
+                content = file.read()
         except FileNotFoundError:
             logger.error('Could not find "%s"', xmodmap_path)
+            return None
 
-        try:
-            injector = Injector(group, mapping)
-            injector.start()
-            self.injectors[group.key] = injector
-        except OSError:
-            # I think this will never happen, probably leftover from
-            # some earlier version
-            return False
+        digest = hashlib.sha1(content).hexdigest()
+        if digest != self._xmodmap_digest:
+            logger.debug('Using keycodes from "%s"', xmodmap_path)
+            system_mapping.update(json.loads(content))
+            # the service now has process wide knowledge of xmodmap
+            # keys of the users session
+            self._xmodmap_digest = digest
 
-        return True
+        return digest
+
+    def _get_context(self, preset_path, xmodmap_digest):
+        """Get the compiled preset from the cache or compile it.
+
+        Raises a FileNotFoundError if the preset doesn't exist.
+        """
+        # stat before loading, so that a change while it is being loaded
+        # causes it to be compiled again next time
+        cache_key = PresetCache.get_key(preset_path, xmodmap_digest)
+
+        with self._lock:
+            context = self.preset_cache.get(cache_key)
+
+        if context is not None:
+            logger.debug('Using cached preset "%s"', preset_path)
+            # they might fall back to the global config, which may have
+            # changed in the meantime
+            context.update_settings()
+            return context
+
+        mapping = Mapping()
+        mapping.load(preset_path)
+
+        # parsing macros and mapping symbols to codes depends on the
+        # process wide system_mapping
+        with self._lock:
+            context = Context(mapping)
+            self.preset_cache.put(cache_key, context)
+
+        return context
 
     def stop_all(self):
         """Stop all injections."""
@@ -401,7 +401,13 @@ class _FindGroups(threading.Thread):
 class _Groups:
     """Contains and manages all groups."""
     def __init__(self):
-        self._groups = {}
+        self._groups = []
+
+        # indexes for find, a tuple of dicts that map keys, names and
+        # paths to lists of groups. Replaced as a whole whenever _groups is
+        # replaced, so that other threads never see a half built index.
+        self._indexes = ({}, {}, {})
+
         self._find_groups()
 
     def refresh(self):
@@ -447,7 +453,28 @@ class _Groups:
 
     def set_groups(self, new_groups):
         """Overwrite all groups."""
+        indexes = self._build_indexes(new_groups)
         self._groups = new_groups
+        self._indexes = indexes
+
+    @staticmethod
+    def _build_indexes(new_groups):
+        """Map keys, names and paths to groups to avoid searching in find.
+
+        Each of them maps to all groups that have it, in their original
+        order. Keys should be unique, but if they are not, find returns
+        the first group that matches just like a linear search would.
+        """
+        by_key = {}
+        by_name = {}
+        by_path = {}
+        for group in new_groups:
+            by_key.setdefault(group.key, []).append(group)
+            by_name.setdefault(group.name, []).append(group)
+            for path in group.paths:
+                by_path.setdefault(path, []).append(group)
+
+        return by_key, by_name, by_path
 
     def list_group_names(self):
         """Return a list of all 'name' properties of the groups."""
@@ -468,7 +495,7 @@ class _Groups:
 
     def loads(self, dump):
         """Load a serialized representation created via dumps."""
-        self._groups = [_Group.loads(group) for group in json.loads(dump)]
+        self.set_groups([_Group.loads(group) for group in json.loads(dump)])
 
     def find(self, name=None, key=None, path=None):
         """Find a group that matches the provided parameters.
@@ -483,7 +510,19 @@ class _Groups:
         path : str
             "/dev/input/event3"
         """
-        for group in self._groups:
+        # start with the most specific index, the other parameters
+        # are checked afterwards
+        by_key, by_name, by_path = self._indexes
+        if key:
+            candidates = by_key.get(key, [])
+        elif path:
+            candidates = by_path.get(path, [])
+        elif name:
+            candidates = by_name.get(name, [])
+        else:
+            candidates = self._groups
+
+        for group in candidates:
             if name and group.name != name:
                 continue
 
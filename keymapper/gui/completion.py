@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""Find symbol names for the autocompletion of the symbol input.
+
+Filtering all names on each keystroke is slow, so they are indexed by
+their short substrings.
+"""
+
+
+import heapq
+
+from keymapper.state import system_mapping
+
+
+# the length of the longest indexed substrings
+GRAM_SIZE = 3
+
+# how many suggestions are shown at most
+LIMIT = 50
+
+# not part of the system_mapping, but useful to suggest
+EXTRA_NAMES = [
+    'mouse(up, 1)', 'mouse(down, 1)', 'mouse(left, 1)', 'mouse(right, 1)',
+    'wheel(up, 1)', 'wheel(down, 1)', 'wheel(left, 1)', 'wheel(right, 1)'
+]
+
+
+def _get_grams(name):
+    """Get all substrings of the name that are up to GRAM_SIZE long."""
+    return {
+        name[start:start + size]
+        for size in range(1, GRAM_SIZE + 1)
+        for start in range(len(name) - size + 1)
+    }
+
+
+class SymbolIndex:
+    """Substring index over all names of the system_mapping.
+
+    It is rebuilt when the system_mapping changed since the last search.
+    """
+    def __init__(self, mapping=system_mapping, extra_names=None):
+        """
+        Parameters
+        ----------
+        mapping : SystemMapping
+        extra_names : list of str
+            suggested in addition to the names of the mapping.
+            Defaults to EXTRA_NAMES
+        """
+        self._mapping = mapping
+        self._extra_names = EXTRA_NAMES if extra_names is None else extra_names
+        self._revision = None
+        self._names = []
+        self._lower = []
+        # maps substrings to the indices of the names that contain them
+        self._grams = {}
+
+    def _refresh(self):
+        """Build the index if the names changed."""
+        if self._revision == self._mapping.revision:
+            return
+
+        names = set(self._mapping.list_names())
+        names.update(self._extra_names)
+        self._names = sorted(names)
+        self._lower = [name.lower() for name in self._names]
+
+        grams = {}
+        for index, name in enumerate(self._lower):
+            for gram in _get_grams(name):
+                grams.setdefault(gram, []).append(index)
+
+        self._grams = grams
+        self._revision = self._mapping.revision
+
+    def _rank(self, index, query):
+        """Sort key of a name. Lower is better."""
+        name = self._lower[index]
+        if name == query:
+            kind = 0
+        elif name.startswith(query):
+            kind = 1
+        else:
+            kind = 2
+
+        return kind, len(name), self._names[index]
+
+    def search(self, query, limit=LIMIT):
+        """Get the names that contain the query, the best matches first.
+
+        Exact matches come first, then names that start with the query,
+        then the rest. Shorter names come first within each of those.
+        Case insensitive.
+
+        Parameters
+        ----------
+        query : str
+        limit : int
+            how many names to return at most
+        """
+        self._refresh()
+
+        query = query.lower()
+        if query == '':
+            return []
+
+        if len(query) <= GRAM_SIZE:
+            candidates = self._grams.get(query, [])
+        else:
+            # only the names that contain its rarest piece need to be
+            # checked
+            candidates = min(
+                (
+                    self._grams.get(query[start:start + GRAM_SIZE], [])
+                    for start in range(len(query) - GRAM_SIZE + 1)
+                ),
+                key=len
+            )
+            candidates = [
+                index for index in candidates
+                if query in self._lower[index]
+            ]
+
+        best = heapq.nsmallest(
+            limit,
+            candidates,
+            key=lambda index: self._rank(index, query)
+        )
+        return [self._names[index] for index in best]
+
+
+symbol_index = SymbolIndex()
@@ -124,6 +124,9 @@ class RootHelper:
         This blocks forever until it discovers a new command on the socket.
         """
         rlist = {}
+        # the capabilities of a device are expensive to ask for, so the
+        # ranges of all its EV_ABS codes are figured out once here
+        abs_ranges = {}
 
         if self.group is None:
             logger.error('group is None')
@@ -147,6 +150,7 @@ class RootHelper:
 
         for device in virtual_devices:
             rlist[device.fd] = device
+            abs_ranges[device.fd] = utils.get_abs_ranges(device)
 
         logger.debug(
             'Starting reading keycodes from "%s"',
@@ -162,53 +166,77 @@ class RootHelper:
                 # is closed and select has nothing to select from?
                 continue
 
+            # everything that arrived in the meantime is sent to the gui
+            # at once
+            batch = []
             for fd in ready_fds[0]:
                 if rlist[fd] == self._commands:
                     # all commands will cause the reader to start over
                     # (possibly for a different device).
                     # _handle_commands will check what is going on
+                    self._send_events(batch)
                     return
 
                 device = rlist[fd]
 
                 try:
-                    event = device.read_one()
-                    if event:
-                        self._send_event(event, device)
+                    events = list(device.read())
+                except BlockingIOError:
+                    # nothing to read after all
+                    continue
                 except OSError:
                     logger.debug('Device "%s" disappeared', device.path)
+                    self._send_events(batch)
                     return
 
-    def _send_event(self, event, device):
-        """Write the event into the pipe to the main process.
+                for event in events:
+                    event_tuple = self._prepare_event(
+                        event,
+                        abs_ranges[fd]
+                    )
+                    if event_tuple is not None:
+                        batch.append(event_tuple)
+
+            self._send_events(batch)
+
+    def _prepare_event(self, event, abs_ranges):
+        """Turn the event into what is sent to the main process.
+
+        Returns None if the event should not be sent.
 
         Parameters
         ----------
         event : evdev.InputEvent
-        device : evdev.InputDevice
+        abs_ranges : dict
+            code: (min, max) of the EV_ABS events of the device
         """
         # value: 1 for down, 0 for up, 2 for hold.
         if event.type == EV_KEY and event.value == 2:
             # ignore hold-down events
-            return
+            return None
 
         blacklisted_keys = [
             evdev.ecodes.BTN_TOOL_DOUBLETAP
         ]
 
         if event.type == EV_KEY and event.code in blacklisted_keys:
-            return
+            return None
 
         if event.type == EV_ABS:
-            abs_range = utils.get_abs_range(device, event.code)
-            event.value = utils.normalize_value(event, abs_range)
+            abs_range = abs_ranges.get(event.code)
+            value = utils.normalize_value(event, abs_range)
         else:
-            event.value = utils.normalize_value(event)
+            value = utils.normalize_value(event)
 
-        self._results.send({
-            'type': 'event',
-            'message': (
-                event.sec, event.usec,
-                event.type, event.code, event.value
-            )
-        })
+        return event.sec, int(event.usec), event.type, event.code, value
+
+    def _send_events(self, events):
+        """Write the events into the pipe to the main process.
+
+        Parameters
+        ----------
+        events : list of tuples
+            sec, usec, type, code and value of each event
+        """
+        if len(events) > 0:
+            self._results.send_events(events)
@@ -27,6 +27,7 @@ see gui.helper.helper
 
 import evdev
 from evdev.ecodes import EV_REL
+from gi.repository import GLib
 
 from keymapper.logger import logger
 from keymapper.key import Key
@@ -35,9 +36,12 @@ from keymapper.ipc.pipe import Pipe
 from keymapper.gui.helper import TERMINATE, REFRESH_GROUPS
 from keymapper import utils
 from keymapper.state import custom_mapping
+from keymapper.injection.context import LEFT_PURPOSE, RIGHT_PURPOSE
 
 
 DEBOUNCE_TICKS = 3
+# milliseconds between two ticks while a debounce is pending
+DEBOUNCE_INTERVAL = 33
 
 
 def will_report_up(ev_type):
@@ -67,11 +71,73 @@ class Reader:
         self._commands = None
         self.connect()
 
+        # GLib source ids and the callback, while watching the pipe
+        self._callback = None
+        self._io_watch = None
+        self._debounce_timeout = None
+
     def connect(self):
         """Connect to the helper."""
         self._results = Pipe('/tmp/key-mapper/results')
         self._commands = Pipe('/tmp/key-mapper/commands')
 
+    def watch(self, callback):
+        """Call the callback whenever the helper sends something.
+
+        Also while keys that don't report their release are waiting to be
+        considered as released. Runs in the GLib main loop. The callback
+        is supposed to use read to get the new state.
+        """
+        self.stop_watching()
+        self._callback = callback
+        self._io_watch = GLib.io_add_watch(
+            self._results.fileno(),
+            GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN,
+            self._on_results
+        )
+
+        if len(self._debounce_remove) > 0:
+            self._schedule_debounce()
+
+    def stop_watching(self):
+        """Don't call the callback of watch anymore."""
+        if self._io_watch is not None:
+            GLib.source_remove(self._io_watch)
+            self._io_watch = None
+
+        if self._debounce_timeout is not None:
+            GLib.source_remove(self._debounce_timeout)
+            self._debounce_timeout = None
+
+        self._callback = None
+
+    def _on_results(self, *_):
+        """The helper wrote into the results pipe."""
+        self._callback()
+        return True
+
+    def _schedule_debounce(self):
+        """Tick the debounces regularly until none of them is pending."""
+        if self._callback is None or self._debounce_timeout is not None:
+            return
+
+        self._debounce_timeout = GLib.timeout_add(
+            DEBOUNCE_INTERVAL,
+            self._on_debounce_timeout
+        )
+
+    def _on_debounce_timeout(self):
+        """Move pending debounces forward and inform the callback."""
+        self._debounce_tick()
+        self._callback()
+
+        if len(self._debounce_remove) == 0:
+            self._debounce_timeout = None
+            return False
+
+        return True
+
     def are_new_devices_available(self):
         """Check if groups contains new devices.
 
@@ -116,15 +182,23 @@ class Reader:
         # this is in some ways similar to the keycode_mapper and
         # event_producer, but its much simpler because it doesn't
         # have to trigger anything, manage any macros and only
-        # reports key-down events. This function is called periodically
-        # by the window.
+        # reports key-down events. This function is called by the window
+        # whenever something arrives, see watch.
 
         # remember the previous down-event from the pipe in order to
         # be able to tell if the reader should return the updated combination
         previous_event = self.previous_event
         key_down_received = False
 
-        self._debounce_tick()
+        if self._callback is None:
+            # nothing ticks the debounces regularly without watching,
+            # so each read counts as a tick
+            self._debounce_tick()
+
+        # the purposes might change in the gui at any time, but not while
+        # handling the pending events
+        settings = custom_mapping.snapshot([LEFT_PURPOSE, RIGHT_PURPOSE])
+        purposes = (settings[LEFT_PURPOSE], settings[RIGHT_PURPOSE])
 
         while self._results.poll():
             message = self._results.recv()
@@ -133,7 +207,7 @@ class Reader:
                 continue
 
             gamepad = GAMEPAD in self.group.types
-            if not utils.should_map_as_btn(event, custom_mapping, gamepad):
+            if not utils.should_map_as_btn(event, purposes, gamepad):
                 continue
 
             event_tuple = (event.type, event.code, event.value)
@@ -208,6 +282,7 @@ class Reader:
             self._get_event(message)
 
         self._unreleased = {}
+        self._debounce_remove = {}
         self.previous_event = None
         self.previous_result = None
 
@@ -231,11 +306,13 @@ class Reader:
         """Act like the key was released if no new event arrives in time."""
         if not will_report_up(event_tuple[0]):
             self._debounce_remove[event_tuple[:2]] = DEBOUNCE_TICKS
+            self._schedule_debounce()
 
     def _debounce_tick(self):
         """If the counter reaches 0, the key is not considered held down."""
         for type_code in list(self._debounce_remove.keys()):
             if type_code not in self._unreleased:
+                del self._debounce_remove[type_code]
                 continue
 
             # clear wheel events from unreleased after some time
@@ -29,31 +29,22 @@ from keymapper.state import custom_mapping, system_mapping
 from keymapper.logger import logger
 from keymapper.key import Key
 from keymapper.gui.reader import reader
+from keymapper.gui.completion import symbol_index
 
 
 CTX_KEYCODE = 2
 
 
+# only one symbol input can be focused at a time, so they share it
 store = Gtk.ListStore(str)
 
 
-def populate_store():
-    """Fill the dropdown for key suggestions with values."""
-    for name in system_mapping.list_names():
+def populate_store(text):
+    """Fill the dropdown for key suggestions with the best matches."""
+    store.clear()
+    for name in symbol_index.search(text):
         store.append([name])
 
-    extra = [
-        'mouse(up, 1)', 'mouse(down, 1)', 'mouse(left, 1)', 'mouse(right, 1)',
-        'wheel(up, 1)', 'wheel(down, 1)', 'wheel(left, 1)', 'wheel(right, 1)'
-    ]
-
-    for key in extra:
-        # add some more keys to the dropdown list
-        store.append([key])
-
-
-populate_store()
-
 
 def to_string(key):
     """A nice to show description of the pressed key."""
@@ -180,6 +171,7 @@ class Row(Gtk.ListBoxRow):
         self.put_together(symbol)
 
         self._state = IDLE
+        self._complete = self.is_complete()
 
     def refresh_state(self):
         """Refresh the state.
@@ -219,6 +211,22 @@ class Row(Gtk.ListBoxRow):
         symbol = self.symbol_input.get_text()
         return symbol if symbol else None
 
+    def is_complete(self):
+        """Check if both the key and the symbol are set."""
+        return self.get_key() is not None and self.get_symbol() is not None
+
+    def _refresh_complete(self):
+        """Tell the window when the row becomes complete.
+
+        Then it might need a new empty row.
+        """
+        complete = self.is_complete()
+        displayed = self.get_parent() is not None
+        if complete and not self._complete and displayed:
+            self.window.row_list.check_add_row()
+
+        self._complete = complete
+
     def set_new_key(self, new_key):
         """Check if a keycode has been pressed and if so, display it.
 
@@ -272,13 +280,18 @@ class Row(Gtk.ListBoxRow):
             symbol=symbol,
             previous_key=previous_key
         )
+        self._refresh_complete()
 
-    def on_symbol_input_change(self, _):
+    def on_symbol_input_change(self, symbol_input):
         """When the output symbol for that keycode is typed in."""
+        if symbol_input.has_focus():
+            populate_store(symbol_input.get_text())
+
         key = self.get_key()
         symbol = self.get_symbol()
 
         if symbol is None:
+            self._complete = False
             return
 
         if key is not None:
@@ -287,11 +300,11 @@ class Row(Gtk.ListBoxRow):
                 symbol=symbol,
                 previous_key=None
             )
+            self._refresh_complete()
 
-    def match(self, _, key, tree_iter):
-        """Search the avilable names."""
-        value = store.get_value(tree_iter, 0)
-        return key in value.lower()
+    def match(self, *_):
+        """Show all suggestions, the store only contains matching names."""
+        return True
 
     def show_click_here(self):
         """Show 'click here' on the keycode input button."""
@@ -320,7 +333,7 @@ class Row(Gtk.ListBoxRow):
         self.show_click_here()
         self.keycode_input.set_active(False)
         self._state = IDLE
-        self.window.save_preset()
+        self.window.save_preset_later()
 
     def set_keycode_input_label(self, label):
         """Set the label of the keycode input."""
@@ -334,13 +347,30 @@ class Row(Gtk.ListBoxRow):
         label.set_justify(Gtk.Justification.CENTER)
         self.keycode_input.set_opacity(1)
 
+    def on_symbol_input_focus(self, symbol_input, _):
+        """Set up the autocompletion of the symbol input.
+
+        Only when it is needed, because doing that for each row takes
+        long for large presets.
+        """
+        populate_store(symbol_input.get_text())
+
+        if symbol_input.get_completion() is not None:
+            return
+
+        completion = Gtk.EntryCompletion()
+        completion.set_model(store)
+        completion.set_text_column(0)
+        completion.set_match_func(self.match)
+        symbol_input.set_completion(completion)
+
     def on_symbol_input_unfocus(self, symbol_input, _):
         """Save the preset and correct the input casing."""
         symbol = symbol_input.get_text()
         correct_case = system_mapping.correct_case(symbol)
         if symbol != correct_case:
             symbol_input.set_text(correct_case)
-        self.window.save_preset()
+        self.window.save_preset_later()
 
     def put_together(self, symbol):
         """Create all child GTK widgets and connect their signals."""
@@ -386,11 +416,6 @@ class Row(Gtk.ListBoxRow):
         symbol_input.set_alignment(0.5)
         symbol_input.set_width_chars(4)
         symbol_input.set_has_frame(False)
-        completion = Gtk.EntryCompletion()
-        completion.set_model(store)
-        completion.set_text_column(0)
-        completion.set_match_func(self.match)
-        symbol_input.set_completion(completion)
 
         if symbol is not None:
             symbol_input.set_text(symbol)
@@ -399,6 +424,10 @@ class Row(Gtk.ListBoxRow):
             'changed',
             self.on_symbol_input_change
         )
+        symbol_input.connect(
+            'focus-in-event',
+            self.on_symbol_input_focus
+        )
         symbol_input.connect(
             'focus-out-event',
             self.on_symbol_input_unfocus
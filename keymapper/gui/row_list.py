@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Manages the rows of the list of mappings."""
+
+
+from gi.repository import GLib
+
+from keymapper.logger import logger
+from keymapper.state import custom_mapping
+from keymapper.gui.row import Row
+
+
+# how many rows of a preset are created at once. Rows for the remaining
+# mappings are only created when scrolling down to them
+ROW_BATCH_SIZE = 50
+
+
+class RowList:
+    """Adds and removes the rows of the mappings of custom_mapping.
+
+    Rows of large presets are created in batches while scrolling down.
+    One empty row is always the last one.
+    """
+    def __init__(self, key_list, window):
+        """
+        Parameters
+        ----------
+        key_list : Gtk.ListBox
+            Inside of a scrolled window
+        window : Window
+            The window that the rows belong to
+        """
+        self.key_list = key_list
+        self.window = window
+        # (key, symbol) tuples of the preset that don't have a row yet,
+        # see load_more_rows
+        self._unloaded_mappings = []
+        self._load_rows_source = None
+
+        # create more rows when getting close to the end of the list
+        adjustment = key_list.get_parent().get_vadjustment()
+        adjustment.connect('value-changed', self.load_more_rows)
+        adjustment.connect('changed', self.load_more_rows)
+
+    def load(self):
+        """Create the first rows of custom_mapping, the rest comes later."""
+        self._unloaded_mappings = list(custom_mapping)
+        self.add_rows(ROW_BATCH_SIZE)
+
+    def clear(self):
+        """Remove all rows."""
+        self.key_list.forall(self.key_list.remove)
+        self._unloaded_mappings = []
+
+    def add_rows(self, count):
+        """Create rows for the next few mappings that don't have one yet.
+
+        They are added before the empty row.
+        """
+        batch = self._unloaded_mappings[:count]
+        self._unloaded_mappings = self._unloaded_mappings[count:]
+
+        rows = self.key_list.get_children()
+        position = len(rows)
+        if position > 0 and rows[-1].get_key() is None:
+            position -= 1
+
+        for key, output in batch:
+            single_key_mapping = Row(
+                window=self.window,
+                delete_callback=self.on_row_removed,
+                key=key,
+                symbol=output
+            )
+            self.key_list.insert(single_key_mapping, position)
+            position += 1
+
+    def load_more_rows(self, adjustment):
+        """Create more rows if the end of the list is visible or close."""
+        if len(self._unloaded_mappings) == 0:
+            return
+
+        if self._load_rows_source is not None:
+            return
+
+        page_size = adjustment.get_page_size()
+        end = adjustment.get_value() + page_size
+        if adjustment.get_upper() - end > page_size:
+            return
+
+        def add_rows():
+            self._load_rows_source = None
+            self.add_rows(ROW_BATCH_SIZE)
+            return False
+
+        # not while gtk is still busy figuring out the size of the list
+        self._load_rows_source = GLib.idle_add(add_rows)
+
+    def add_empty(self):
+        """Add one empty row for a single mapped key."""
+        empty = Row(window=self.window, delete_callback=self.on_row_removed)
+        self.key_list.insert(empty, -1)
+
+    def on_row_removed(self, single_key_mapping):
+        """Stuff to do when a row was removed
+
+        Parameters
+        ----------
+        single_key_mapping : Row
+        """
+        # https://stackoverflow.com/a/30329591/4417769
+        self.key_list.remove(single_key_mapping)
+        self.check_add_row()
+
+    def check_add_row(self):
+        """Ensure that one empty row is available at all times.
+
+        Rows call this when they become complete.
+        """
+        rows = self.key_list.get_children()
+
+        # verify that all mappings are displayed.
+        # One of them is possibly the empty row
+        num_rows = len(rows) + len(self._unloaded_mappings)
+        num_maps = len(custom_mapping)
+        if num_rows < num_maps or num_rows > num_maps + 1:
+            logger.error(
+                'custom_mapping contains %d rows, '
+                'but %d are displayed',
+                len(custom_mapping), num_rows
+            )
+            logger.spam(
+                'Mapping %s',
+                list(custom_mapping)
+            )
+            logger.spam(
+                'Rows    %s',
+                [(row.get_key(), row.get_symbol()) for row in rows]
+            )
+
+        # the old approach which involved just counting the number of
+        # mappings and rows didn't seem very robust. The empty row is
+        # usually at the end, so start looking there.
+        for row in reversed(rows):
+            if not row.is_complete():
+                # unfinished row found
+                break
+        else:
+            self.add_empty()
+
+        return True
@@ -41,6 +41,8 @@ from keymapper.gui.row import Row, to_string
 from keymapper.key import Key
 from keymapper.gui.reader import reader
 from keymapper.gui.helper import is_helper_running
+from keymapper.gui.writer import preset_writer
+from keymapper.gui.row_list import RowList
 from keymapper.injection.injector import RUNNING, FAILED, NO_GRAB
 from keymapper.daemon import Daemon
 from keymapper.config import config
@@ -130,9 +132,27 @@ class Window:
 
         self.start_processes()
 
+        # True while waiting for the injection that was started by
+        # on_apply_preset_clicked
+        self.applying = False
+        self.dbus.state_changed.connect(self.on_injector_state_changed)
+
         self.group = None
         self.preset_name = None
 
+        # syntax errors of macros, see _get_macro_error
+        self._macro_errors = {}
+        self._macro_errors_revision = None
+
+        # what is wrong with the mappings of custom_mapping, see
+        # check_mapping. Maps Key objects to their unknown symbol or to the
+        # syntax error of their macro.
+        self._unknown_symbols = {}
+        self._syntax_errors = {}
+        # the system_mapping revision the errors were found with. None if
+        # all mappings need to be checked again.
+        self._mapping_errors_revision = None
+
         css_provider = Gtk.CssProvider()
         with open(get_data_path('style.css'), 'r') as file:
             css_provider.load_from_data(bytes(file.read(), encoding='UTF-8'))
@@ -170,6 +190,8 @@ class Window:
         # dialog is not centered when it is opened for the first time
         self.about.set_position(Gtk.WindowPosition.CENTER_ON_PARENT)
 
+        self.row_list = RowList(self.get('key_list'), self)
+
         self.get('version-label').set_text(
             f'key-mapper {VERSION} {COMMIT_HASH[:7]}'
             f'\npython-evdev {EVDEV_VERSION}' if EVDEV_VERSION else ''
@@ -207,10 +229,8 @@ class Window:
 
     def setup_timeouts(self):
         """Setup all GLib timeouts."""
-        self.timeouts = [
-            GLib.timeout_add(100, self.check_add_row),
-            GLib.timeout_add(1000 / 30, self.consume_newest_keycode)
-        ]
+        self.timeouts = []
+        reader.watch(self.consume_newest_keycode)
 
     def start_processes(self):
         """Start helper and daemon via pkexec to run in the background."""
@@ -311,44 +331,10 @@ class Window:
         for timeout in self.timeouts:
             GLib.source_remove(timeout)
             self.timeouts = []
+        reader.stop_watching()
         reader.terminate()
         Gtk.main_quit()
 
-    def check_add_row(self):
-        """Ensure that one empty row is available at all times."""
-        rows = self.get('key_list').get_children()
-
-        # verify that all mappings are displayed.
-        # One of them is possibly the empty row
-        num_rows = len(rows)
-        num_maps = len(custom_mapping)
-        if num_rows < num_maps or num_rows > num_maps + 1:
-            logger.error(
-                'custom_mapping contains %d rows, '
-                'but %d are displayed',
-                len(custom_mapping), num_rows
-            )
-            logger.spam(
-                'Mapping %s',
-                list(custom_mapping)
-            )
-            logger.spam(
-                'Rows    %s',
-                [(row.get_key(), row.get_symbol()) for row in rows]
-            )
-
-        # iterating over that 10 times per second is a bit wasteful,
-        # but the old approach which involved just counting the number of
-        # mappings and rows didn't seem very robust.
-        for row in rows:
-            if row.get_key() is None or row.get_symbol() is None:
-                # unfinished row found
-                break
-        else:
-            self.add_empty()
-
-        return True
-
     def select_newest_preset(self):
         """Find and select the newest preset (and its device)."""
         device, preset = find_newest_preset()
@@ -409,8 +395,7 @@ class Window:
 
     def clear_mapping_table(self):
         """Remove all rows from the mappings table."""
-        key_list = self.get('key_list')
-        key_list.forall(key_list.remove)
+        self.row_list.clear()
         custom_mapping.empty()
 
     def can_modify_mapping(self, *_):
@@ -445,8 +430,8 @@ class Window:
     def consume_newest_keycode(self):
         """To capture events from keyboards, mice and gamepads."""
         # the "event" event of Gtk.Window wouldn't trigger on gamepad
-        # events, so it became a GLib timeout to periodically check kernel
-        # events.
+        # events, so the reader calls this whenever the helper sends
+        # something.
 
         # letting go of one of the keys of a combination won't just make
         # it return the leftover key, it will continue to return None because
@@ -483,7 +468,6 @@ class Window:
         """Stop injecting the mapping."""
         self.dbus.stop_injecting(self.group.key)
         self.show_status(CTX_APPLY, 'Applied the system default')
-        GLib.timeout_add(100, self.show_device_mapping_status)
 
     def show_status(self, context_id, message, tooltip=None):
         """Show a status message and set its tooltip.
@@ -522,20 +506,46 @@ class Window:
             status_bar.push(context_id, message)
             status_bar.set_tooltip_text(tooltip)
 
-    def check_macro_syntax(self):
-        """Check if the programmed macros are allright."""
-        self.show_status(CTX_MAPPING, None)
-        for key, output in custom_mapping:
-            if not is_this_a_macro(output):
-                continue
+    def _get_macro_error(self, macro):
+        """Get the syntax error of the macro, or None if it is fine.
 
-            error = parse(output, custom_mapping, return_errors=True)
-            if error is None:
-                continue
+        Remembers the result, so that only macros that changed are
+        parsed again.
+        """
+        if self._macro_errors_revision != system_mapping.revision:
+            # symbols that are used in macros might have changed
+            self._macro_errors = {}
+            self._macro_errors_revision = system_mapping.revision
 
-            position = to_string(key)
-            msg = f'Syntax error at {position}, hover for info'
-            self.show_status(CTX_MAPPING, msg, error)
+        if macro not in self._macro_errors:
+            self._macro_errors[macro] = parse(macro, return_errors=True)
+
+        return self._macro_errors[macro]
+
+    def _check_symbol(self, key, symbol):
+        """Remember if the mapping of the key is broken.
+
+        Parameters
+        ----------
+        key : Key
+        symbol : str or None
+            None if the key is not mapped anymore
+        """
+        self._unknown_symbols.pop(key, None)
+        self._syntax_errors.pop(key, None)
+
+        if symbol is None:
+            return
+
+        if is_this_a_macro(symbol):
+            error = self._get_macro_error(symbol)
+            if error is not None:
+                self._syntax_errors[key] = error
+
+            return
+
+        if system_mapping.get(symbol) is None:
+            self._unknown_symbols[key] = symbol
 
     def on_rename_button_clicked(self, _):
         """Rename the preset based on the contents of the name input."""
@@ -572,6 +582,8 @@ class Window:
             return
 
         custom_mapping.changed = False
+        # don't write it again after removing it
+        preset_writer.flush()
         delete_preset(self.group.name, self.preset_name)
         self.populate_presets()
 
@@ -634,14 +646,32 @@ class Window:
         self.unreleased_warn = False
         self.button_left_warn = False
         self.dbus.set_config_dir(get_config_path())
-        self.dbus.start_injecting(self.group.key, preset)
+        self.applying = True
+        if not self.dbus.start_injecting(self.group.key, preset):
+            self.applying = False
+            self.show_status(
+                CTX_ERROR,
+                f'Failed to apply preset "{self.preset_name}"'
+            )
+            return
 
+        # on_injector_state_changed will show the result
         self.show_status(
             CTX_APPLY,
             'Starting injection...'
         )
 
-        GLib.timeout_add(100, self.show_injection_result)
+    def on_injector_state_changed(self, group_key, state):
+        """The service reports progress of an injection."""
+        if self.group is None or group_key != self.group.key:
+            return
+
+        if self.applying and state in [RUNNING, FAILED, NO_GRAB]:
+            self.applying = False
+            self.show_injection_result(state)
+            return
+
+        self.show_device_mapping_status(state)
 
     def on_autoload_switch(self, _, active):
         """Load the preset automatically next time the user logs in."""
@@ -679,9 +709,18 @@ class Window:
 
         self.show_device_mapping_status()
 
-    def show_injection_result(self):
-        """Show if the injection was successfully started."""
-        state = self.dbus.get_state(self.group.key)
+    def show_injection_result(self, state=None):
+        """Show if the injection was successfully started.
+
+        Returns True if it is still starting.
+
+        Parameters
+        ----------
+        state : int
+            The state of the injection. Asks the service if None.
+        """
+        if state is None:
+            state = self.dbus.get_state(self.group.key)
 
         if state == RUNNING:
             msg = f'Applied preset "{self.preset_name}"'
@@ -689,9 +728,13 @@ class Window:
             if custom_mapping.get_symbol(Key.btn_left()):
                 msg += ', CTRL + DEL to stop'
 
-            self.show_status(CTX_APPLY, msg)
+            tooltip = None
+            if is_debug():
+                tooltip = f'{msg}\n{self.get_timings_text()}'
 
-            self.show_device_mapping_status()
+            self.show_status(CTX_APPLY, msg, tooltip)
+
+            self.show_device_mapping_status(state)
             return False
 
         if state == FAILED:
@@ -702,22 +745,45 @@ class Window:
             return False
 
         if state == NO_GRAB:
-            self.show_status(
-                CTX_ERROR,
-                'The device was not grabbed',
+            tooltip = (
                 'Either another application is already grabbing it or '
                 'your preset doesn\'t contain anything that is sent by the '
                 'device.'
             )
+            if is_debug():
+                tooltip += f'\n{self.get_timings_text()}'
+
+            self.show_status(
+                CTX_ERROR,
+                'The device was not grabbed',
+                tooltip
+            )
             return False
 
-        # keep the timeout running
         return True
 
-    def show_device_mapping_status(self):
-        """Figure out if this device is currently under keymappers control."""
+    def get_timings_text(self):
+        """Describe how long each step of applying the preset took."""
+        timings = self.dbus.get_timings(self.group.key)
+        lines = [
+            f'{step}: {seconds * 1000:.1f} ms'
+            for step, seconds in timings.items()
+        ]
+        logger.debug('Applying took %s', ', '.join(lines))
+        return '\n'.join(lines)
+
+    def show_device_mapping_status(self, state=None):
+        """Figure out if this device is currently under keymappers control.
+
+        Parameters
+        ----------
+        state : int
+            The state of the injection. Asks the service if None.
+        """
         group_key = self.group.key
-        state = self.dbus.get_state(group_key)
+        if state is None:
+            state = self.dbus.get_state(group_key)
+
         if state == RUNNING:
             logger.info('Group "%s" is currently mapped', group_key)
             self.get('apply_system_layout').set_opacity(1)
@@ -775,16 +841,10 @@ class Window:
         self.preset_name = preset
 
         custom_mapping.load(self.group.get_preset_path(preset))
+        # the errors of the previous preset don't matter anymore
+        self._mapping_errors_revision = None
 
-        key_list = self.get('key_list')
-        for key, output in custom_mapping:
-            single_key_mapping = Row(
-                window=self,
-                delete_callback=self.on_row_removed,
-                key=key,
-                symbol=output
-            )
-            key_list.insert(single_key_mapping, -1)
+        self.row_list.load()
 
         autoload_switch = self.get('preset_autoload_switch')
 
@@ -795,7 +855,7 @@ class Window:
             ))
 
         self.get('preset_name_input').set_text('')
-        self.add_empty()
+        self.row_list.add_empty()
 
         self.initialize_gamepad_config()
 
@@ -805,38 +865,25 @@ class Window:
         """Set the purpose of the left joystick."""
         purpose = dropdown.get_active_id()
         custom_mapping.set('gamepad.joystick.left_purpose', purpose)
-        self.save_preset()
+        self.save_preset_later()
 
     def on_right_joystick_changed(self, dropdown):
         """Set the purpose of the right joystick."""
         purpose = dropdown.get_active_id()
         custom_mapping.set('gamepad.joystick.right_purpose', purpose)
-        self.save_preset()
+        self.save_preset_later()
 
     def on_joystick_mouse_speed_changed(self, gtk_range):
         """Set how fast the joystick moves the mouse."""
         speed = 2 ** gtk_range.get_value()
         custom_mapping.set('gamepad.joystick.pointer_speed', speed)
 
-    def add_empty(self):
-        """Add one empty row for a single mapped key."""
-        empty = Row(window=self, delete_callback=self.on_row_removed)
-        key_list = self.get('key_list')
-        key_list.insert(empty, -1)
-
-    def on_row_removed(self, single_key_mapping):
-        """Stuff to do when a row was removed
-
-        Parameters
-        ----------
-        single_key_mapping : Row
-        """
-        key_list = self.get('key_list')
-        # https://stackoverflow.com/a/30329591/4417769
-        key_list.remove(single_key_mapping)
-
     def save_preset(self, *_):
         """Write changes to presets to disk."""
+        # otherwise changes that are still being written in the background
+        # might overwrite this
+        preset_writer.flush()
+
         if not custom_mapping.changed:
             return
 
@@ -855,20 +902,86 @@ class Window:
             self.show_status(CTX_ERROR, 'Permission denied!', error)
             logger.error(error)
 
-        for _, symbol in custom_mapping:
-            if is_this_a_macro(symbol):
-                continue
+        self.check_mapping()
+
+    def save_preset_later(self, *_):
+        """Write changes to presets to disk in the background.
+
+        For frequent events, multiple changes shortly after each other
+        are written only once.
+        """
+        if not custom_mapping.changed:
+            return
+
+        # turning it into json and writing it happens in the background
+        path = self.group.get_preset_path(self.preset_name)
+        preset_writer.save(
+            path,
+            custom_mapping.clone_for_saving(),
+            self.on_preset_saved
+        )
+
+        self.check_mapping()
+
+    def on_preset_saved(self, path, error):
+        """Called by the preset_writer after saving in the background."""
+        # the preset_writer is not allowed to touch gtk in its thread
+        GLib.idle_add(self._show_preset_saved, path, error)
 
-            if system_mapping.get(symbol) is None:
-                self.show_status(CTX_MAPPING, f'Unknown mapping "{symbol}"')
-                break
+    def _show_preset_saved(self, path, error):
+        """Show the result of saving in the background."""
+        if error is not None:
+            if isinstance(error, PermissionError):
+                self.show_status(CTX_ERROR, 'Permission denied!', str(error))
+            else:
+                self.show_status(CTX_ERROR, 'Failed to save!', str(error))
+
+            return False
+
+        if self.group is None or self.preset_name is None:
+            return False
+
+        if path != self.group.get_preset_path(self.preset_name):
+            return False
+
+        # its modification date is the newest now, so it moves to the top
+        if self.get('preset_selection').get_active() != 0:
+            self.populate_presets()
+
+        return False
+
+    def check_mapping(self):
+        """Show a message if any of the mappings is broken.
+
+        Only the mappings that changed since the previous check are
+        checked again.
+        """
+        changes = custom_mapping.pop_changes()
+
+        if self._mapping_errors_revision != system_mapping.revision:
+            # a different preset, or symbols might be known now
+            self._unknown_symbols = {}
+            self._syntax_errors = {}
+            self._mapping_errors_revision = system_mapping.revision
+            for key, symbol in custom_mapping:
+                self._check_symbol(key, symbol)
         else:
-            # no broken mappings found
-            self.show_status(CTX_MAPPING, None)
+            for key, (_, symbol) in changes.items():
+                self._check_symbol(key, symbol)
+
+        if len(self._unknown_symbols) > 0:
+            symbol = next(iter(self._unknown_symbols.values()))
+            self.show_status(CTX_MAPPING, f'Unknown mapping "{symbol}"')
+            return
 
-            # checking macros is probably a bit more expensive, do that if
-            # the regular mappings are allright
-            self.check_macro_syntax()
+        if len(self._syntax_errors) > 0:
+            key, error = next(iter(self._syntax_errors.items()))
+            position = to_string(key)
+            msg = f'Syntax error at {position}, hover for info'
+            self.show_status(CTX_MAPPING, msg, error)
+            return
+
+        self.show_status(CTX_MAPPING, None)
 
     def on_about_clicked(self, _):
         """Show the about/help dialog."""
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""Save presets in the background, to keep the gui responsive."""
+
+
+import os
+import time
+import threading
+
+from keymapper.logger import logger
+from keymapper.presets import preset_index
+
+
+# how many seconds to wait for more changes before writing
+SAVE_DELAY = 0.5
+
+
+class PresetWriter:
+    """Saves presets in a background thread.
+
+    Turning them into json, compiling and writing them all happens in
+    that thread. Saves of the same file that happen shortly after each
+    other are combined into one, only the newest state is saved.
+    """
+    def __init__(self, delay=SAVE_DELAY):
+        """
+        Parameters
+        ----------
+        delay : float
+            how many seconds to wait for more changes before writing
+        """
+        self.delay = delay
+        # maps paths to the newest Mapping to save there and its callback
+        self._pending = {}
+        self._deadline = 0
+        self._condition = threading.Condition()
+        # held while writing, to be able to wait for it to finish
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def save(self, path, mapping, callback=None):
+        """Save the mapping to the path soon. Doesn't block.
+
+        Parameters
+        ----------
+        path : str
+        mapping : Mapping
+            Must not be modified anymore afterwards, see
+            Mapping.clone_for_saving.
+        callback : function
+            Called with the path and the OSError, or None if it was saved.
+            This happens in the thread that saved it, which is not the
+            thread of the gui.
+        """
+        with self._condition:
+            self._pending[path] = (mapping, callback)
+            self._deadline = time.time() + self.delay
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._condition.notify()
+
+    def flush(self):
+        """Save everything that is pending right away and wait for it.
+
+        Should be called before writing or removing presets any other way,
+        otherwise old content might end up overwriting it.
+        """
+        with self._condition:
+            pending = self._pending
+            self._pending = {}
+
+        # if the thread is currently writing, wait for it to finish
+        with self._write_lock:
+            self._save(pending)
+
+    def clear(self):
+        """Forget everything that is pending. Only needed for tests."""
+        with self._condition:
+            self._pending = {}
+
+        with self._write_lock:
+            pass
+
+    def _run(self):
+        """Wait for a pause in the changes and then write them."""
+        while True:
+            with self._condition:
+                while len(self._pending) == 0:
+                    self._condition.wait()
+
+                remaining = self._deadline - time.time()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+            # taken while holding the lock, so that flush waits until
+            # it is written
+            with self._write_lock:
+                with self._condition:
+                    pending = self._pending
+                    self._pending = {}
+
+                self._save(pending)
+
+            # release the clones while waiting for the next changes, so
+            # that custom_mapping doesn't need to copy its mappings
+            pending = None
+
+    @staticmethod
+    def _save(pending):
+        """Save the mappings into their files."""
+        for path, (mapping, callback) in pending.items():
+            error = None
+            try:
+                mapping.save(path)
+            except OSError as exception:
+                logger.error('Failed to save "%s": %s', path, exception)
+                error = exception
+
+            preset_index.invalidate(os.path.dirname(path))
+
+            if callback is not None:
+                callback(path, error)
+
+
+preset_writer = PresetWriter()
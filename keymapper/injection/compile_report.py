@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""Find out what a preset costs before it is injected.
+
+Compiles the preset like the injection would, but without any devices,
+so that presets can be checked offline.
+"""
+
+
+import time
+import tracemalloc
+from collections import namedtuple
+
+from evdev import ecodes
+
+from keymapper.state import system_mapping
+from keymapper.injection.context import Context
+from keymapper.injection.injector import construct_capabilities
+from keymapper.injection.macros import parse, is_this_a_macro
+
+
+CompileReport = namedtuple('CompileReport', [
+    'mappings',
+    'key_to_code',
+    'macros',
+    'max_permutations',
+    'longest_combination',
+    'macro_tasks',
+    'max_macro_tasks',
+    'capabilities',
+    'memory',
+    'peak_memory',
+    'seconds',
+    'errors',
+])
+
+
+def _count_tasks(macro):
+    """How many tasks the macro and all of its children consist of."""
+    return len(macro.tasks) + sum(
+        _count_tasks(child) for child in macro.child_macros
+    )
+
+
+def _find_errors(mapping, context):
+    """Describe each mapping that didn't make it into the context."""
+    errors = []
+    for key, output in mapping:
+        if key.keys in context.macros or key.keys in context.key_to_code:
+            continue
+
+        if is_this_a_macro(output):
+            error = parse(output, return_errors=True)
+            errors.append(f'{key}: Failed to parse "{output}": {error}')
+        else:
+            errors.append(f'{key}: Unknown symbol "{output}"')
+
+    return errors
+
+
+def compile_report(mapping, xmodmap_path=None):
+    """Compile the mapping like the injection does and measure that.
+
+    Returns a CompileReport. Nothing is injected.
+
+    Parameters
+    ----------
+    mapping : Mapping
+    xmodmap_path : str
+        The xmodmap.json of the config dir. If set, its symbols are used
+        like the service does instead of the xmodmap of the current
+        session, which might not even exist. Raises a FileNotFoundError
+        if it doesn't exist.
+    """
+    if xmodmap_path is not None:
+        system_mapping.load_xmodmap_file(xmodmap_path)
+
+    start = time.perf_counter()
+    Context(mapping)
+    seconds = time.perf_counter() - start
+
+    # compile it once more to see the memory, because tracing allocations
+    # slows it down. If something else is already tracing, the peak might
+    # be from before.
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+
+    before = tracemalloc.get_traced_memory()[0]
+    context = Context(mapping)
+    after, peak = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+
+    # permutations of a combination share the same macro object
+    macros = {id(macro): macro for macro in context.macros.values()}
+    macro_tasks = [_count_tasks(macro) for macro in macros.values()]
+    combinations = [len(key) for key, _ in mapping]
+    permutations = (len(key.get_permutations()) for key, _ in mapping)
+
+    return CompileReport(
+        mappings=len(mapping),
+        key_to_code=len(context.key_to_code),
+        macros=len(context.macros),
+        max_permutations=max(permutations, default=0),
+        longest_combination=max(combinations, default=0),
+        macro_tasks=sum(macro_tasks),
+        max_macro_tasks=max(macro_tasks, default=0),
+        # the purpose of joysticks only matters for gamepads
+        capabilities=construct_capabilities(context, gamepad=True),
+        memory=after - before,
+        peak_memory=max(peak - before, after - before),
+        seconds=seconds,
+        errors=_find_errors(mapping, context)
+    )
+
+
+def format_report(report):
+    """Make a CompileReport human readable. Returns a list of lines."""
+    lines = [
+        f'{"mappings":<24}{report.mappings:>12}',
+        f'{"key_to_code entries":<24}{report.key_to_code:>12}',
+        f'{"macro entries":<24}{report.macros:>12}',
+        f'{"max permutations":<24}{report.max_permutations:>12}',
+        f'{"longest combination":<24}{report.longest_combination:>12}',
+        f'{"macro tasks":<24}{report.macro_tasks:>12}',
+        f'{"largest macro":<24}{report.max_macro_tasks:>12}',
+        f'{"memory":<24}{report.memory / 1024:>9.1f} KiB',
+        f'{"peak memory":<24}{report.peak_memory / 1024:>9.1f} KiB',
+        f'{"compile time":<24}{report.seconds * 1000:>10.1f} ms',
+        'capabilities',
+    ]
+
+    for ev_type, codes in report.capabilities.items():
+        if len(codes) == 0:
+            continue
+
+        type_name = ecodes.EV.get(ev_type, ev_type)
+        lines.append(f'    {type_name:<20}{len(set(codes)):>12}')
+
+    for error in report.errors:
+        lines.append(f'error: {error}')
+
+    return lines
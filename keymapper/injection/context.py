@@ -28,6 +28,23 @@ from keymapper.state import system_mapping
 from keymapper.config import NONE, MOUSE, WHEEL, BUTTONS
 
 
+# config values that are used while injecting
+LEFT_PURPOSE = 'gamepad.joystick.left_purpose'
+RIGHT_PURPOSE = 'gamepad.joystick.right_purpose'
+POINTER_SPEED = 'gamepad.joystick.pointer_speed'
+NON_LINEARITY = 'gamepad.joystick.non_linearity'
+X_SCROLL_SPEED = 'gamepad.joystick.x_scroll_speed'
+Y_SCROLL_SPEED = 'gamepad.joystick.y_scroll_speed'
+TRACE_SIZE = 'injection.trace_size'
+RECORD_STATS = 'injection.record_stats'
+KEYSTROKE_SLEEP_MS = 'macros.keystroke_sleep_ms'
+SETTINGS = [
+    LEFT_PURPOSE, RIGHT_PURPOSE, POINTER_SPEED, NON_LINEARITY,
+    X_SCROLL_SPEED, Y_SCROLL_SPEED, TRACE_SIZE, RECORD_STATS,
+    KEYSTROKE_SLEEP_MS
+]
+
+
 class Context:
     """Stores injection-process wide information.
 
@@ -71,6 +88,16 @@ class Context:
         keycodes are pretty much ignored and not written to the desktop.
         So this uinput should not have EV_ABS capabilities. Only EV_REL
         and EV_KEY is allowed.
+    stats : Stats or None
+        Latencies and counters of the events handled by the injection,
+        if enabled.
+    trace : TraceBuffer or None
+        Remembers what happened to the most recent events, if enabled.
+    left_purpose, right_purpose, pointer_speed, non_linearity,
+    x_scroll_speed, y_scroll_speed, trace_size, record_stats,
+    keystroke_sleep_ms
+        Config values of the mapping, so that they don't have to be
+        looked up while injecting. See update_settings.
     """
     def __init__(self, mapping):
         self.mapping = mapping
@@ -82,14 +109,31 @@ class Context:
 
         self.left_purpose = None
         self.right_purpose = None
-        self.update_purposes()
+        self.pointer_speed = None
+        self.non_linearity = None
+        self.x_scroll_speed = None
+        self.y_scroll_speed = None
+        self.trace_size = None
+        self.record_stats = None
+        self.keystroke_sleep_ms = None
+        self.update_settings()
 
         self.uinput = None
-
-    def update_purposes(self):
-        """Read joystick purposes from the configuration."""
-        self.left_purpose = self.mapping.get('gamepad.joystick.left_purpose')
-        self.right_purpose = self.mapping.get('gamepad.joystick.right_purpose')
+        self.stats = None
+        self.trace = None
+
+    def update_settings(self):
+        """Read the config values that are needed for the injection."""
+        settings = self.mapping.snapshot(SETTINGS)
+        self.left_purpose = settings[LEFT_PURPOSE]
+        self.right_purpose = settings[RIGHT_PURPOSE]
+        self.pointer_speed = settings[POINTER_SPEED]
+        self.non_linearity = settings[NON_LINEARITY]
+        self.x_scroll_speed = settings[X_SCROLL_SPEED]
+        self.y_scroll_speed = settings[Y_SCROLL_SPEED]
+        self.trace_size = settings[TRACE_SIZE]
+        self.record_stats = settings[RECORD_STATS]
+        self.keystroke_sleep_ms = settings[KEYSTROKE_SLEEP_MS]
 
     def _parse_macros(self):
         """To quickly get the target macro during operation."""
@@ -97,7 +141,7 @@ class Context:
         macros = {}
         for key, output in self.mapping:
             if is_this_a_macro(output):
-                macro = parse(output, self.mapping)
+                macro = parse(output, self)
                 if macro is None:
                     continue
 
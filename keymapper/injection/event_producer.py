@@ -217,11 +217,10 @@ class EventProducer:
         its position, this will keep injecting the mouse movement events.
         """
         abs_range = self.abs_range
-        mapping = self.context.mapping
-        pointer_speed = mapping.get('gamepad.joystick.pointer_speed')
-        non_linearity = mapping.get('gamepad.joystick.non_linearity')
-        x_scroll_speed = mapping.get('gamepad.joystick.x_scroll_speed')
-        y_scroll_speed = mapping.get('gamepad.joystick.y_scroll_speed')
+        pointer_speed = self.context.pointer_speed
+        non_linearity = self.context.non_linearity
+        x_scroll_speed = self.context.x_scroll_speed
+        y_scroll_speed = self.context.y_scroll_speed
         max_speed = 2 ** 0.5  # for normalized abs event values
 
         if abs_range is not None:
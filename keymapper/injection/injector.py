@@ -24,6 +24,7 @@
 
 import asyncio
 import time
+import threading
 import multiprocessing
 
 import evdev
@@ -36,8 +37,11 @@ from keymapper.mapping import DISABLE_CODE
 from keymapper.injection.keycode_mapper import KeycodeMapper
 from keymapper.injection.context import Context
 from keymapper.injection.event_producer import EventProducer
+from keymapper.injection.stats import Stats, FORWARDED
+from keymapper.injection import trace
+from keymapper.injection.profiling import Profiler
 from keymapper.injection.numlock import set_numlock, is_numlock_on, \
-    ensure_numlock
+    find_numlock_device
 
 
 DEV_NAME = 'key-mapper'
@@ -45,6 +49,13 @@ DEV_NAME = 'key-mapper'
 # messages
 CLOSE = 0
 OK = 1
+TIMINGS = 7
+STATS = 8
+TRACE = 9
+SNAPSHOT = 10
+
+# messages that the process answers with a tuple of message and reply
+REQUESTS = [STATS, TRACE, SNAPSHOT]
 
 # states
 UNKNOWN = -1
@@ -71,6 +82,68 @@ def is_in_capabilities(key, capabilities):
     return False
 
 
+def construct_capabilities(context, gamepad):
+    """Adds all used keycodes into a copy of a devices capabilities.
+
+    Sometimes capabilities are a bit tricky and change how the system
+    interprets the device.
+
+    Parameters
+    ----------
+    context : Context
+    gamepad : bool
+        If gamepad events can be translated to mouse events. (also
+        depends on the configured purpose)
+
+    Returns
+    -------
+    a mapping of int event type to an array of int event codes.
+    """
+    ecodes = evdev.ecodes
+
+    capabilities = {
+        EV_KEY: []
+    }
+
+    # support all injected keycodes
+    for code in context.key_to_code.values():
+        if code == DISABLE_CODE:
+            continue
+
+        if code not in capabilities[EV_KEY]:
+            capabilities[EV_KEY].append(code)
+
+    # and all keycodes that are injected by macros
+    for macro in context.macros.values():
+        macro_capabilities = macro.get_capabilities()
+        for ev_type in macro_capabilities:
+            if len(macro_capabilities[ev_type]) == 0:
+                continue
+            if ev_type not in capabilities:
+                capabilities[ev_type] = []
+            capabilities[ev_type] += list(macro_capabilities[ev_type])
+
+    if gamepad and context.joystick_as_mouse():
+        # REL_WHEEL was also required to recognize the gamepad
+        # as mouse, even if no joystick is used as wheel.
+        capabilities[EV_REL] = [
+            evdev.ecodes.REL_X,
+            evdev.ecodes.REL_Y,
+            evdev.ecodes.REL_WHEEL,
+            evdev.ecodes.REL_HWHEEL,
+        ]
+
+        if capabilities.get(EV_KEY) is None:
+            capabilities[EV_KEY] = []
+
+        if ecodes.BTN_MOUSE not in capabilities[EV_KEY]:
+            # to be able to move the cursor, this key capability is
+            # needed
+            capabilities[EV_KEY].append(ecodes.BTN_MOUSE)
+
+    return capabilities
+
+
 class Injector(multiprocessing.Process):
     """Keeps injecting events in the background based on mapping and config.
 
@@ -80,7 +153,7 @@ class Injector(multiprocessing.Process):
     """
     regrab_timeout = 0.2
 
-    def __init__(self, group, mapping):
+    def __init__(self, group, mapping, context=None, profile_dir=None):
         """Setup a process to start injecting keycodes based on custom_mapping.
 
         Parameters
@@ -88,17 +161,135 @@ class Injector(multiprocessing.Process):
         group : _Group
             the device group
         mapping : Mapping
+        context : Context or None
+            An already compiled Context of the mapping, for example from
+            the cache of the daemon. If None, the injection process will
+            create it.
+        profile_dir : str or None
+            If set, the injection process profiles itself and writes the
+            profile into this directory when it stops.
         """
         self.group = group
         self._event_producer = None
         self._state = UNKNOWN
         self._msg_pipe = multiprocessing.Pipe()
+        self._msg_lock = threading.Lock()
         self.mapping = mapping
-        self.context = None  # only needed inside the injection process
+        self.context = context  # only needed inside the injection process
+        self.profile_dir = profile_dir
+        self._profiler = None
+        # how long the steps of starting the injection took in seconds
+        self._timings = {}
+        # mapping of request message -> the most recent reply
+        self._replies = {}
         super().__init__()
 
     """Functions to interact with the running process"""
 
+    def _read_messages(self):
+        """Handle all messages that the process has sent so far."""
+        # the daemon asks for the state from multiple threads
+        with self._msg_lock:
+            while self._msg_pipe[1].poll():
+                msg = self._msg_pipe[1].recv()
+
+                if isinstance(msg, tuple) and msg[0] == TIMINGS:
+                    self._timings.update(msg[1])
+                    continue
+
+                if isinstance(msg, tuple) and msg[0] in REQUESTS:
+                    self._replies[msg[0]] = msg[1]
+                    continue
+
+                if self._state != STARTING:
+                    continue
+
+                # it might have finished starting up
+                if msg == OK:
+                    self._state = RUNNING
+
+                if msg == NO_GRAB:
+                    self._state = NO_GRAB
+
+    def fileno(self):
+        """Get the fd that becomes readable when the process sends messages.
+
+        Use get_state afterwards to handle them.
+        """
+        return self._msg_pipe[1].fileno()
+
+    def get_timings(self):
+        """Get a dict of step to seconds of what the process did so far.
+
+        Can be safely called from the main process.
+        """
+        self._read_messages()
+        return self._timings.copy()
+
+    def _request(self, msg, timeout):
+        """Send a request to the process and wait for the reply.
+
+        Returns None if the process didn't answer.
+        """
+        if not self.is_alive():
+            return None
+
+        with self._msg_lock:
+            self._replies.pop(msg, None)
+            self._msg_pipe[1].send(msg)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            # _read_messages fills _replies from other threads as well, so
+            # checking and taking the reply needs to happen at once
+            with self._msg_lock:
+                if msg in self._replies:
+                    return self._replies.pop(msg)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error(
+                    'Injection for "%s" did not answer request %d',
+                    self.group.key, msg
+                )
+                return None
+
+            # other threads might read the answer in the meantime, so
+            # don't wait too long at once
+            self._msg_pipe[1].poll(min(remaining, 0.05))
+            self._read_messages()
+
+    def get_stats(self, timeout=1):
+        """Ask the process for its latency histograms and event counters.
+
+        Returns the two dicts of Stats.serialize, which are empty if the
+        process didn't answer.
+
+        Can be safely called from the main process.
+        """
+        return self._request(STATS, timeout) or ({}, {})
+
+    def get_trace(self, timeout=1):
+        """Ask the process for its recent decisions about input events.
+
+        Returns the binary dump of the TraceBuffer, see
+        keymapper.injection.trace.decode. Empty if tracing is disabled
+        or the process didn't answer.
+
+        Can be safely called from the main process.
+        """
+        return self._request(TRACE, timeout) or b''
+
+    def take_snapshot(self, timeout=5):
+        """Ask the process to write a tracemalloc snapshot.
+
+        Returns the path of the snapshot, which is empty if the process
+        is not being profiled or didn't answer.
+
+        Can be safely called from the main process.
+        """
+        return self._request(SNAPSHOT, timeout) or ''
+
     def get_state(self):
         """Get the state of the injection.
 
@@ -115,14 +306,7 @@ class Injector(multiprocessing.Process):
         if self._state == UNKNOWN and alive:
             self._state = STARTING
 
-        # if there is a message available, it might have finished starting up
-        if self._state == STARTING and self._msg_pipe[1].poll():
-            msg = self._msg_pipe[1].recv()
-            if msg == OK:
-                self._state = RUNNING
-
-            if msg == NO_GRAB:
-                self._state = NO_GRAB
+        self._read_messages()
 
         if self._state in [STARTING, RUNNING] and not alive:
             self._state = FAILED
@@ -130,7 +314,6 @@ class Injector(multiprocessing.Process):
 
         return self._state
 
-    @ensure_numlock
     def stop_injecting(self):
         """Stop injecting keycodes.
 
@@ -140,7 +323,9 @@ class Injector(multiprocessing.Process):
             'Stopping injecting keycodes for group "%s"',
             self.group.key
         )
-        self._msg_pipe[1].send(CLOSE)
+        with self._msg_lock:
+            self._msg_pipe[1].send(CLOSE)
+
         self._state = STOPPED
 
     """Process internal stuff"""
@@ -236,64 +421,8 @@ class Injector(multiprocessing.Process):
         return capabilities
 
     def _construct_capabilities(self, gamepad):
-        """Adds all used keycodes into a copy of a devices capabilities.
-
-        Sometimes capabilities are a bit tricky and change how the system
-        interprets the device.
-
-        Parameters
-        ----------
-        gamepad : bool
-            If gamepad events can be translated to mouse events. (also
-            depends on the configured purpose)
-
-        Returns
-        -------
-        a mapping of int event type to an array of int event codes.
-        """
-        ecodes = evdev.ecodes
-
-        capabilities = {
-            EV_KEY: []
-        }
-
-        # support all injected keycodes
-        for code in self.context.key_to_code.values():
-            if code == DISABLE_CODE:
-                continue
-
-            if code not in capabilities[EV_KEY]:
-                capabilities[EV_KEY].append(code)
-
-        # and all keycodes that are injected by macros
-        for macro in self.context.macros.values():
-            macro_capabilities = macro.get_capabilities()
-            for ev_type in macro_capabilities:
-                if len(macro_capabilities[ev_type]) == 0:
-                    continue
-                if ev_type not in capabilities:
-                    capabilities[ev_type] = []
-                capabilities[ev_type] += list(macro_capabilities[ev_type])
-
-        if gamepad and self.context.joystick_as_mouse():
-            # REL_WHEEL was also required to recognize the gamepad
-            # as mouse, even if no joystick is used as wheel.
-            capabilities[EV_REL] = [
-                evdev.ecodes.REL_X,
-                evdev.ecodes.REL_Y,
-                evdev.ecodes.REL_WHEEL,
-                evdev.ecodes.REL_HWHEEL,
-            ]
-
-            if capabilities.get(EV_KEY) is None:
-                capabilities[EV_KEY] = []
-
-            if ecodes.BTN_MOUSE not in capabilities[EV_KEY]:
-                # to be able to move the cursor, this key capability is
-                # needed
-                capabilities[EV_KEY].append(ecodes.BTN_MOUSE)
-
-        return capabilities
+        """Get the capabilities of the uinput. See construct_capabilities."""
+        return construct_capabilities(self.context, gamepad)
 
     async def _msg_listener(self):
         """Wait for messages from the main process to do special stuff."""
@@ -311,6 +440,21 @@ class Injector(multiprocessing.Process):
                 loop.stop()
                 return
 
+            if msg == STATS:
+                stats = self.context.stats
+                serialized = ({}, {}) if stats is None else stats.serialize()
+                self._msg_pipe[0].send((STATS, serialized))
+
+            if msg == TRACE:
+                trace_buffer = self.context.trace
+                dump = b'' if trace_buffer is None else trace_buffer.dump()
+                self._msg_pipe[0].send((TRACE, dump))
+
+            if msg == SNAPSHOT:
+                profiler = self._profiler
+                path = '' if profiler is None else profiler.snapshot()
+                self._msg_pipe[0].send((SNAPSHOT, path))
+
     def get_udev_name(self, name, suffix):
         """Make sure the generated name is not longer than 80 chars."""
         max_len = 80  # based on error messages
@@ -328,6 +472,19 @@ class Injector(multiprocessing.Process):
         Use this function as starting point in a process. It creates
         the loops needed to read and map events and keeps running them.
         """
+        if self.profile_dir is None:
+            self._run()
+            return
+
+        self._profiler = Profiler(self.profile_dir, self.group.key)
+        self._profiler.start()
+        try:
+            self._run()
+        finally:
+            self._profiler.stop()
+
+    def _run(self):
+        """Inject until stopped, see run."""
         logger.info('Starting injecting the mapping for "%s"', self.group.key)
 
         # create a new event loop, because somehow running an infinite loop
@@ -337,19 +494,39 @@ class Injector(multiprocessing.Process):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
 
-        # create this within the process after the event loop creation,
-        # so that the macros use the correct loop
-        self.context = Context(self.mapping)
+        # how long each step of starting took, to find out why applying
+        # a preset is slow on some systems
+        timings = {}
+
+        start = time.monotonic()
+        if self.context is None:
+            self.context = Context(self.mapping)
+        timings['context'] = time.monotonic() - start
+
+        trace_size = self.context.trace_size
+        if trace_size > 0:
+            self.context.trace = trace.TraceBuffer(trace_size)
+
+        if self.context.record_stats:
+            self.context.stats = Stats()
 
         # grab devices as early as possible. If events appear that won't get
         # released anymore before the grab they appear to be held down
         # forever
+        start = time.monotonic()
         sources = self._grab_devices()
+        timings['grab'] = time.monotonic() - start
 
         self._event_producer = EventProducer(self.context)
 
-        numlock_state = is_numlock_on()
-        coroutines = []
+        start = time.monotonic()
+        numlock_device = find_numlock_device(sources)
+        numlock_state = is_numlock_on(numlock_device)
+        timings['numlock'] = time.monotonic() - start
+        # where KEY_NUMLOCK can be written to in order to toggle it
+        numlock_uinput = None
+
+        start = time.monotonic()
 
         # where mapped events go to.
         # See the Context docstring on why this is needed.
@@ -359,40 +536,40 @@ class Injector(multiprocessing.Process):
             events=self._construct_capabilities(GAMEPAD in self.group.types)
         )
 
+        forward_to = []
         for source in sources:
             # certain capabilities can have side effects apparently. with an
             # EV_ABS capability, EV_REL won't move the mouse pointer anymore.
             # so don't merge all InputDevices into one UInput device.
-            gamepad = classify(source) == GAMEPAD
-            forward_to = evdev.UInput(
+            forward_to.append(evdev.UInput(
                 name=self.get_udev_name(source.name, 'forwarded'),
                 phys=DEV_NAME,
                 events=self._copy_capabilities(source)
-            )
+            ))
 
-            # actual reading of events
-            coroutines.append(self._event_consumer(source, forward_to))
+            if source is numlock_device:
+                numlock_uinput = forward_to[-1]
 
-            # The event source of the current iteration will deliver events
-            # that are needed for this. It is that one that will be mapped
-            # to a mouse-like devnode.
-            if gamepad and self.context.joystick_as_mouse():
-                self._event_producer.set_abs_range_from(source)
+        timings['uinput'] = time.monotonic() - start
 
-        if len(coroutines) == 0:
+        if len(sources) == 0:
             logger.error('Did not grab any device')
+            self._msg_pipe[0].send((TIMINGS, timings))
             self._msg_pipe[0].send(NO_GRAB)
             return
 
+        coroutines = self.get_coroutines(sources, forward_to)
         coroutines.append(self._msg_listener())
 
-        # run besides this stuff
-        coroutines.append(self._event_producer.run())
-
         # set the numlock state to what it was before injecting, because
         # grabbing devices screws this up
-        set_numlock(numlock_state)
+        start = time.monotonic()
+        set_numlock(numlock_state, numlock_device, numlock_uinput)
+        timings['set_numlock'] = time.monotonic() - start
 
+        # the timings arrive together with the state, so anyone who
+        # sees the state can also see how long it took to get there
+        self._msg_pipe[0].send((TIMINGS, timings))
         self._msg_pipe[0].send(OK)
 
         try:
@@ -409,11 +586,50 @@ class Injector(multiprocessing.Process):
             # reached otherwise.
             logger.debug('asyncio coroutines ended')
 
+        # ungrabbing might change the numlock as well
+        numlock_state = is_numlock_on(numlock_device)
+
         for source in sources:
             # ungrab at the end to make the next injection process not fail
             # its grabs
             source.ungrab()
 
+        set_numlock(numlock_state, numlock_device, numlock_uinput)
+
+    def get_coroutines(self, sources, forward_to):
+        """Get the coroutines that read, map and inject events of sources.
+
+        This is the event handling of the injection without grabbing
+        devices and creating uinputs, so the sources and uinputs may
+        also be fakes. The context needs to exist already. Creates the
+        event producer, unless there is one already.
+
+        Parameters
+        ----------
+        sources : list of evdev.InputDevice
+        forward_to : list of evdev.UInput
+            for each source, where events go that are not mapped
+        """
+        if self._event_producer is None:
+            self._event_producer = EventProducer(self.context)
+
+        coroutines = []
+        for source, uinput in zip(sources, forward_to):
+            # actual reading of events
+            coroutines.append(self._event_consumer(source, uinput))
+
+            # The event source of the current iteration will deliver events
+            # that are needed for this. It is that one that will be mapped
+            # to a mouse-like devnode.
+            gamepad = classify(source) == GAMEPAD
+            if gamepad and self.context.joystick_as_mouse():
+                self._event_producer.set_abs_range_from(source)
+
+        # run besides this stuff
+        coroutines.append(self._event_producer.run())
+
+        return coroutines
+
     async def _event_consumer(self, source, forward_to):
         """Reads input events to inject keycodes or talk to the event_producer.
 
@@ -439,15 +655,20 @@ class Injector(multiprocessing.Process):
         gamepad = classify(source) == GAMEPAD
 
         keycode_handler = KeycodeMapper(self.context, source, forward_to)
+        stats = self.context.stats
+        purposes = (self.context.left_purpose, self.context.right_purpose)
 
         async for event in source.async_read_loop():
+            if stats is not None:
+                stats.events += 1
+
             if self._event_producer.is_handled(event):
                 # the event_producer will take care of it
                 self._event_producer.notify(event)
                 continue
 
             # for mapped stuff
-            if utils.should_map_as_btn(event, self.context.mapping, gamepad):
+            if utils.should_map_as_btn(event, purposes, gamepad):
                 will_report_key_up = utils.will_report_key_up(event)
 
                 keycode_handler.handle_keycode(event)
@@ -467,6 +688,14 @@ class Injector(multiprocessing.Process):
 
             # forward the rest
             forward_to.write(event.type, event.code, event.value)
+            if stats is not None:
+                stats.record(FORWARDED, event)
+            if self.context.trace is not None:
+                self.context.trace.record(
+                    (event.type, event.code, event.value),
+                    trace.FORWARDED,
+                    event.code
+                )
             # this already includes SYN events, so need to syn here again
 
         # This happens all the time in tests because the async_read_loop
@@ -30,6 +30,8 @@ from evdev.ecodes import EV_KEY, EV_ABS
 from keymapper.logger import logger
 from keymapper.mapping import DISABLE_CODE
 from keymapper import utils
+from keymapper.injection.stats import FORWARDED, MAPPED, MACRO
+from keymapper.injection import trace
 
 
 # this state is shared by all KeycodeMappers of this process
@@ -316,6 +318,33 @@ class KeycodeMapper:
 
         return key
 
+    def _record(
+            self, event, event_tuple, decision,
+            output=trace.NO_OUTPUT, path=None
+    ):
+        """Remember what happened to the event, if anyone is interested.
+
+        Parameters
+        ----------
+        event : evdev.InputEvent
+        event_tuple : int, int, int
+            type, code and value of the event before it was normalized
+        decision : int
+            for the trace, for example trace.MAPPED
+        output : int
+            the code that was written, if any
+        path : str or None
+            for the stats, one of FORWARDED, MAPPED or MACRO. None if
+            nothing was written.
+        """
+        stats = self.context.stats
+        if stats is not None and path is not None:
+            stats.record(path, event)
+
+        trace_buffer = self.context.trace
+        if trace_buffer is not None:
+            trace_buffer.record(event_tuple, decision, output)
+
     def handle_keycode(self, event, forward=True):
         """Write mapped keycodes, forward unmapped ones and manage macros.
 
@@ -370,16 +399,26 @@ class KeycodeMapper:
 
                 if target_code == DISABLE_CODE:
                     logger.key_spam(key, 'releasing disabled key')
+                    self._record(event, original_tuple, trace.DISABLED)
                 elif target_code is None:
                     logger.key_spam(key, 'releasing key')
+                    self._record(event, original_tuple, trace.RELEASE)
                 elif unreleased_entry.is_mapped():
                     # release what the input is mapped to
                     logger.key_spam(key, 'releasing %s', target_code)
                     self.write((target_type, target_code, 0))
+                    self._record(
+                        event, original_tuple, trace.RELEASE,
+                        target_code, MAPPED
+                    )
                 elif forward:
                     # forward the release event
                     logger.key_spam((original_tuple,), 'forwarding release')
                     self.forward(original_tuple)
+                    self._record(
+                        event, original_tuple, trace.FORWARDED,
+                        event.code, FORWARDED
+                    )
                 else:
                     logger.key_spam(key, 'not forwarding release')
             elif event.type != EV_ABS:
@@ -402,6 +441,7 @@ class KeycodeMapper:
                 # of key-down events when a continuous value is reported, for
                 # example for gamepad triggers or mouse-wheel-side buttons
                 logger.key_spam(key, 'duplicate key down')
+                self._record(event, original_tuple, trace.DUPLICATE)
                 return
 
             # it would start a macro usually
@@ -413,6 +453,7 @@ class KeycodeMapper:
                 # not finished, especially since gamepad-triggers report a ton
                 # of events with a positive value.
                 logger.key_spam(key, 'macro already running')
+                self._record(event, original_tuple, trace.DUPLICATE)
                 return
 
         """starting new macros or injecting new keys"""
@@ -429,6 +470,10 @@ class KeycodeMapper:
                 macro.press_key()
                 logger.key_spam(key, 'maps to macro %s', macro.code)
                 asyncio.ensure_future(macro.run(self.macro_write))
+                self._record(
+                    event, original_tuple, trace.MACRO,
+                    trace.NO_OUTPUT, MACRO
+                )
                 return
 
             if key in self.context.key_to_code:
@@ -439,15 +484,24 @@ class KeycodeMapper:
 
                 if target_code == DISABLE_CODE:
                     logger.key_spam(key, 'disabled')
+                    self._record(event, original_tuple, trace.DISABLED)
                     return
 
                 logger.key_spam(key, 'maps to %s', target_code)
                 self.write((EV_KEY, target_code, 1))
+                self._record(
+                    event, original_tuple, trace.MAPPED,
+                    target_code, MAPPED
+                )
                 return
 
             if forward:
                 logger.key_spam((original_tuple,), 'forwarding')
                 self.forward(original_tuple)
+                self._record(
+                    event, original_tuple, trace.FORWARDED,
+                    event.code, FORWARDED
+                )
             else:
                 logger.key_spam((event_tuple,), 'not forwarding')
 
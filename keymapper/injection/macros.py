@@ -156,25 +156,28 @@ class _Macro:
     Coroutines receive a handler as argument, which is a function that can be
     used to inject input events into the system.
     """
-    def __init__(self, code, mapping):
+    def __init__(self, code, context):
         """Create a macro instance that can be populated with tasks.
 
         Parameters
         ----------
         code : string or None
             The original parsed code, for logging purposes.
-        mapping : Mapping
-            The preset object, needed for some config stuff
+        context : Context or None
+            The context of the injection, needed for some config stuff.
+            Only macros that are run need one.
         """
         self.code = code
-        self.mapping = mapping
+        self.context = context
 
         # List of coroutines that will be called sequentially.
         # This is the compiled code
         self.tasks = []
 
-        # is a lock so that h() can be realized
-        self._holding_lock = asyncio.Lock()
+        # is a lock so that h() can be realized. Created when it is needed,
+        # because macros may be parsed outside of the injection process
+        # and its event loop.
+        self._holding_lock = None
 
         self.running = False
 
@@ -185,12 +188,17 @@ class _Macro:
         }
 
         self.child_macros = []
-        
-        self.keystroke_sleep_ms = None
+
+    def _get_holding_lock(self):
+        """Get the lock for h(), create it if it doesn't exist yet."""
+        if self._holding_lock is None:
+            self._holding_lock = asyncio.Lock()
+
+        return self._holding_lock
 
     def is_holding(self):
         """Check if the macro is waiting for a key to be released."""
-        return self._holding_lock.locked()
+        return self._holding_lock is not None and self._holding_lock.locked()
 
     def get_capabilities(self):
         """Resolve all capabilities of the macro and those of its children."""
@@ -217,8 +225,6 @@ class _Macro:
         if self.running:
             logger.error('Tried to run already running macro "%s"', self.code)
             return
-        
-        self.keystroke_sleep_ms = self.mapping.get('macros.keystroke_sleep_ms')
 
         self.running = True
         for task in self.tasks:
@@ -238,7 +244,7 @@ class _Macro:
             logger.error('Already holding')
             return
 
-        asyncio.ensure_future(self._holding_lock.acquire())
+        asyncio.ensure_future(self._get_holding_lock().acquire())
 
         for macro in self.child_macros:
             macro.press_key()
@@ -258,8 +264,9 @@ class _Macro:
             # able to acquire the lock. Release it right after so that
             # it can be acquired by press_key again.
             try:
-                await self._holding_lock.acquire()
-                self._holding_lock.release()
+                holding_lock = self._get_holding_lock()
+                await holding_lock.acquire()
+                holding_lock.release()
             except RuntimeError as error:
                 # The specific bug in question has been fixed already,
                 # but lets keep this check here for the future. Not
@@ -360,7 +367,7 @@ class _Macro:
 
     async def _keycode_pause(self, _=None):
         """To add a pause between keystrokes."""
-        await asyncio.sleep(self.keystroke_sleep_ms / 1000)
+        await asyncio.sleep(self.context.keystroke_sleep_ms / 1000)
 
     def keycode(self, symbol):
         """Write the symbol."""
@@ -420,7 +427,7 @@ class _Macro:
             'right': (REL_X, 1),
         }[direction.lower()]
         value *= speed
-        child_macro = _Macro(None, self.mapping)
+        child_macro = _Macro(None, self.context)
         child_macro.event(EV_REL, code, value)
         self.hold(child_macro)
 
@@ -432,7 +439,7 @@ class _Macro:
             'left': (REL_HWHEEL, 1),
             'right': (REL_HWHEEL, -1),
         }[direction.lower()]
-        child_macro = _Macro(None, self.mapping)
+        child_macro = _Macro(None, self.context)
         child_macro.event(EV_REL, code, value)
         child_macro.wait(100 / speed)
         self.hold(child_macro)
@@ -556,15 +563,15 @@ def _count_brackets(macro):
     return position
 
 
-def _parse_recurse(macro, mapping, macro_instance=None, depth=0):
+def _parse_recurse(macro, context, macro_instance=None, depth=0):
     """Handle a subset of the macro, e.g. one parameter or function call.
 
     Parameters
     ----------
     macro : string
         Just like parse
-    mapping : Mapping
-        The preset configuration
+    context : Context or None
+        Just like parse
     macro_instance : _Macro or None
         A macro instance to add tasks to
     depth : int
@@ -577,7 +584,7 @@ def _parse_recurse(macro, mapping, macro_instance=None, depth=0):
         return None
 
     if macro_instance is None:
-        macro_instance = _Macro(macro, mapping)
+        macro_instance = _Macro(macro, context)
     else:
         assert isinstance(macro_instance, _Macro)
 
@@ -617,7 +624,7 @@ def _parse_recurse(macro, mapping, macro_instance=None, depth=0):
         logger.spam('%scalls %s with %s', space, call, string_params)
         # evaluate the params
         params = [
-            _parse_recurse(param.strip(), mapping, None, depth + 1)
+            _parse_recurse(param.strip(), context, None, depth + 1)
             for param in string_params
         ]
 
@@ -643,7 +650,7 @@ def _parse_recurse(macro, mapping, macro_instance=None, depth=0):
         if len(macro) > position and macro[position] == '.':
             chain = macro[position + 1:]
             logger.spam('%sfollowed by %s', space, chain)
-            _parse_recurse(chain, mapping, macro_instance, depth)
+            _parse_recurse(chain, context, macro_instance, depth)
 
         return macro_instance
 
@@ -687,7 +694,7 @@ def handle_plus_syntax(macro):
     return output
 
 
-def parse(macro, mapping, return_errors=False):
+def parse(macro, context=None, return_errors=False):
     """parse and generate a _Macro that can be run as often as you want.
 
     If it could not be parsed, possibly due to syntax errors, will log the
@@ -699,8 +706,10 @@ def parse(macro, mapping, return_errors=False):
         "r(3, k(a).w(10))"
         "r(2, k(a).k(-)).k(b)"
         "w(1000).m(Shift_L, r(2, k(a))).w(10, 20).k(b)"
-    mapping : Mapping
-        The preset object, needed for some config stuff
+    context : Context or None
+        The context of the injection, which provides config values like
+        keystroke_sleep_ms while the macro runs. Not needed to only check
+        the syntax.
     return_errors : bool
         If True, returns errors as a string or None if parsing worked.
         If False, returns the parsed macro.
@@ -721,7 +730,7 @@ def parse(macro, mapping, return_errors=False):
         logger.spam('preparing macro %s for later execution', macro)
 
     try:
-        macro_object = _parse_recurse(macro, mapping)
+        macro_object = _parse_recurse(macro, context)
         return macro_object if not return_errors else None
     except Exception as error:
         logger.error('Failed to parse macro "%s": %s', macro, error.__repr__())
@@ -23,17 +23,44 @@
 
 For unknown reasons the numlock status can change when starting injections,
 which is why these functions exist.
+
+If a keyboard is grabbed, its LEDs tell the numlock state and pressing
+KEY_NUMLOCK on its forwarded uinput changes it. Otherwise xset and numlockx
+are used, which don't work without an X server though.
 """
 
 
 import re
 import subprocess
 
+from evdev.ecodes import EV_LED, LED_NUML, EV_KEY, KEY_NUMLOCK
+
 from keymapper.logger import logger
 
 
-def is_numlock_on():
-    """Get the current state of the numlock."""
+def find_numlock_device(devices):
+    """Get the first keyboard that has a numlock LED and key, or None."""
+    for device in devices:
+        capabilities = device.capabilities(absinfo=False)
+        has_led = LED_NUML in capabilities.get(EV_LED, [])
+        if has_led and KEY_NUMLOCK in capabilities.get(EV_KEY, []):
+            return device
+
+    return None
+
+
+def _read_led(device):
+    """Get the numlock state from the LEDs of the device, None on failure."""
+    try:
+        return LED_NUML in device.leds()
+    except OSError as error:
+        # unplugged in the meantime
+        logger.debug('Failed to read the LEDs of "%s": %s', device.path, error)
+        return None
+
+
+def _is_numlock_on_xset():
+    """Get the current state of the numlock via xset."""
     try:
         xset_q = subprocess.check_output(
             ['xset', 'q'],
@@ -53,11 +80,58 @@ def is_numlock_on():
         return None
 
 
-def set_numlock(state):
-    """Set the numlock to a given state of True or False."""
+def is_numlock_on(device=None):
+    """Get the current state of the numlock.
+
+    Returns None if it can't be found out.
+
+    Parameters
+    ----------
+    device : InputDevice or None
+        A keyboard with a numlock LED, see find_numlock_device. If None,
+        asks xset instead.
+    """
+    if device is not None:
+        state = _read_led(device)
+        if state is not None:
+            return state
+
+    return _is_numlock_on_xset()
+
+
+def set_numlock(state, device=None, uinput=None):
+    """Set the numlock to a given state of True or False.
+
+    Parameters
+    ----------
+    state : bool or None
+        does nothing if None
+    device : InputDevice or None
+        A keyboard with a numlock LED, see find_numlock_device. If None,
+        uses numlockx instead.
+    uinput : UInput or None
+        Where KEY_NUMLOCK can be written to in order to toggle it, for
+        example the uinput that events of the device are forwarded to.
+    """
     if state is None:
         return
 
+    if device is not None and uinput is not None:
+        current = _read_led(device)
+        if current is not None:
+            if current != state:
+                uinput.write(EV_KEY, KEY_NUMLOCK, 1)
+                uinput.syn()
+                uinput.write(EV_KEY, KEY_NUMLOCK, 0)
+                uinput.syn()
+
+            return
+
+    _set_numlock_numlockx(state)
+
+
+def _set_numlock_numlockx(state):
+    """Set the numlock to a given state of True or False via numlockx."""
     value = {
         True: 'on',
         False: 'off'
@@ -72,17 +146,3 @@ def set_numlock(state):
         # doesn't seem to be installed everywhere
         logger.debug('numlockx not found')
 
-
-def ensure_numlock(func):
-    """Decorator to reset the numlock to its initial state afterwards."""
-    def wrapped(*args, **kwargs):
-        # for some reason, grabbing a device can modify the num lock state.
-        # remember it and apply back later
-        numlock_before = is_numlock_on()
-
-        result = func(*args, **kwargs)
-
-        set_numlock(numlock_before)
-
-        return result
-    return wrapped
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Profile an injection process from the inside.
+
+Profilers attached to the service don't see anything of the injections,
+because they run in their own processes.
+"""
+
+
+import os
+import re
+import cProfile
+import tracemalloc
+
+from keymapper.logger import logger
+
+
+# if set in the environment of the service, all injections are profiled
+# and their profiles are written into the directory it points to
+ENV_VAR = 'KEYMAPPER_PROFILE'
+
+# how many frames tracemalloc stores for each allocation
+TRACEMALLOC_FRAMES = 10
+
+
+def get_file_name(group_key):
+    """Make the group key usable as part of a file name."""
+    return re.sub(r'[^\w.-]', '_', group_key)
+
+
+class Profiler:
+    """Records function calls and allocations of the current process.
+
+    Slows the injection down, so it is only used when requested.
+    """
+    def __init__(self, directory, group_key):
+        """
+        Parameters
+        ----------
+        directory : str
+            where to write the profile and the snapshots to
+        group_key : str
+            the group that is being injected, used for the file names
+        """
+        self.directory = directory
+        self._name = f'{get_file_name(group_key)}-{os.getpid()}'
+        self._profile = cProfile.Profile()
+        self._snapshots = 0
+
+    def start(self):
+        """Start profiling the current process."""
+        os.makedirs(self.directory, exist_ok=True)
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._profile.enable()
+        logger.info('Profiling into "%s"', self.directory)
+
+    def snapshot(self):
+        """Write the memory that was allocated since start into a file.
+
+        Returns the path of the file, which can be opened with
+        tracemalloc.Snapshot.load.
+        """
+        self._snapshots += 1
+        path = os.path.join(
+            self.directory,
+            f'{self._name}-{self._snapshots}.tracemalloc'
+        )
+        tracemalloc.take_snapshot().dump(path)
+        logger.info('Wrote tracemalloc snapshot to "%s"', path)
+        return path
+
+    def stop(self):
+        """Stop profiling and write the profile into a file.
+
+        Returns the path of the file, which can be opened with pstats.
+        """
+        self._profile.disable()
+        tracemalloc.stop()
+        path = os.path.join(self.directory, f'{self._name}.prof')
+        self._profile.dump_stats(path)
+        logger.info('Wrote profile to "%s"', path)
+        return path
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Feed recorded events through the injection without any devices.
+
+Uses the event handling of the Injector, so that problems of a capture
+(see keymapper.capture) can be reproduced and measured without the
+hardware and without root.
+"""
+
+
+import time
+import asyncio
+
+import evdev
+from evdev.ecodes import EV_SYN
+
+from keymapper.logger import logger
+from keymapper.groups import GAMEPAD
+from keymapper.injection.injector import Injector, construct_capabilities
+from keymapper.injection.context import Context
+from keymapper.injection.stats import Stats
+from keymapper.injection.keycode_mapper import active_macros
+
+
+class ReplayDevice:
+    """Pretends to be an InputDevice that reports the captured events."""
+    def __init__(self, info, events, start, realtime):
+        """
+        Parameters
+        ----------
+        info : dict
+            "name", "path" and "capabilities" of the recorded device
+        events : list of tuples
+            timestamp, type, code, value
+        start : float
+            when the replay started, as time.time()
+        realtime : bool
+            if False, reports all events as fast as possible
+        """
+        self.name = info['name']
+        self.path = info['path']
+        self.phys = 'key-mapper-replay'
+        self.fd = None
+        self._capabilities = info['capabilities']
+        self._events = events
+        self._start = start
+        self._realtime = realtime
+        self.done = asyncio.Event()
+
+    def capabilities(self, _verbose=False, absinfo=True):
+        """Like InputDevice.capabilities, but can't resolve names."""
+        if absinfo:
+            return {
+                ev_type: list(codes)
+                for ev_type, codes in self._capabilities.items()
+            }
+
+        return {
+            ev_type: [
+                code[0] if isinstance(code, tuple) else code
+                for code in codes
+            ]
+            for ev_type, codes in self._capabilities.items()
+        }
+
+    async def async_read_loop(self):
+        """Yield the events, then wait forever like a quiet device."""
+        first_timestamp = self._events[0][0] if self._events else 0
+        for timestamp, ev_type, code, value in self._events:
+            if self._realtime:
+                due = self._start + timestamp - first_timestamp
+                await asyncio.sleep(max(0.0, due - time.time()))
+            else:
+                # a real device has to wait for its fd between events
+                # as well
+                await asyncio.sleep(0)
+
+            now = time.time()
+            yield evdev.InputEvent(
+                int(now),
+                int(now % 1 * 1000000),
+                ev_type,
+                code,
+                value
+            )
+
+        self.done.set()
+        await asyncio.Event().wait()
+
+
+class ReplayUInput:
+    """Counts what would have been written into a UInput."""
+    def __init__(self, events=None):
+        """
+        Parameters
+        ----------
+        events : dict or None
+            capabilities like UInput takes them. Like the kernel does,
+            events that are not part of them are dropped. If None, all
+            events are accepted.
+        """
+        self._capabilities = None
+        if events is not None:
+            self._capabilities = {
+                (ev_type, code[0] if isinstance(code, tuple) else code)
+                for ev_type, codes in events.items()
+                for code in codes
+            }
+
+        self.write_count = 0
+        self.drop_count = 0
+
+    def write(self, ev_type, code, _value):
+        """Like UInput.write, but doesn't write anything."""
+        if (
+            self._capabilities is not None
+            and ev_type != EV_SYN
+            and (ev_type, code) not in self._capabilities
+        ):
+            self.drop_count += 1
+            return
+
+        self.write_count += 1
+
+    def syn(self):
+        """Like UInput.syn."""
+
+
+def replay(capture, mapping, realtime=False, macro_timeout=5):
+    """Handle all events of the capture like an injection would.
+
+    Returns the Context that was used, which contains the Stats, and how
+    many seconds it took.
+
+    Parameters
+    ----------
+    capture : Capture
+    mapping : Mapping
+    realtime : bool
+        if True, keep the timing of the recording. Otherwise handle all
+        events as fast as possible.
+    macro_timeout : float
+        how many seconds to wait for macros that are still running
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    group = capture.get_group()
+    context = Context(mapping)
+    # showing how fast it was is the point of replaying it
+    context.stats = Stats()
+    context.uinput = ReplayUInput(
+        construct_capabilities(context, GAMEPAD in group.types)
+    )
+    injector = Injector(group, mapping, context)
+
+    start = time.time()
+    sources = []
+    for index, info in enumerate(capture.devices):
+        events = [
+            (timestamp, ev_type, code, value)
+            for timestamp, device_index, ev_type, code, value
+            in capture.events
+            if device_index == index
+        ]
+        sources.append(ReplayDevice(info, events, start, realtime))
+
+    async def run():
+        coroutines = injector.get_coroutines(
+            sources,
+            [ReplayUInput() for _ in sources]
+        )
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+
+        for source in sources:
+            await source.done.wait()
+
+        # the last event is handled once the source is asked for the
+        # next one. Macros might still be busy writing.
+        await asyncio.sleep(0)
+        deadline = time.time() + macro_timeout
+        while any(macro.running for macro in active_macros.values()):
+            if time.time() > deadline:
+                logger.error('Macros are still running after the replay')
+                break
+
+            await asyncio.sleep(0.01)
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    return context, time.time() - start
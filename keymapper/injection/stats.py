@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Measure how much delay the injection adds to events."""
+
+
+import time
+
+
+# what happened to an event
+FORWARDED = 'forwarded'
+MAPPED = 'mapped'
+MACRO = 'macro'
+
+PATHS = [FORWARDED, MAPPED, MACRO]
+
+# Bucket i contains latencies of up to 2 ** i microseconds, starting
+# at 2 ** (i - 1). The last bucket contains everything that is slower
+# than about 9 minutes.
+NUM_BUCKETS = 30
+
+
+def get_bucket(seconds):
+    """Get the index of the bucket for the latency."""
+    microseconds = round(seconds * 1000000)
+    if microseconds <= 0:
+        # the clock might have been changed
+        return 0
+
+    return min((microseconds - 1).bit_length(), NUM_BUCKETS - 1)
+
+
+def get_bucket_limit(index):
+    """Get the highest latency of the bucket in seconds."""
+    return 2 ** index / 1000000
+
+
+class Histogram:
+    """Counts latencies in buckets of exponentially growing sizes.
+
+    Uses the same amount of memory regardless of how many events are
+    recorded.
+    """
+    __slots__ = ('buckets',)
+
+    def __init__(self, buckets=None):
+        """Create an empty histogram, or one with the provided counts.
+
+        Parameters
+        ----------
+        buckets : iterable of int
+            as returned by a previous histogram, for example after
+            sending it to a different process
+        """
+        if buckets is None:
+            self.buckets = [0] * NUM_BUCKETS
+        else:
+            self.buckets = list(buckets)
+
+    def add(self, seconds):
+        """Count a latency."""
+        self.buckets[get_bucket(seconds)] += 1
+
+    def count(self):
+        """How many latencies were added."""
+        return sum(self.buckets)
+
+    def percentile(self, fraction):
+        """Get an upper bound of the latency in seconds.
+
+        Returns None if nothing was recorded yet.
+
+        Parameters
+        ----------
+        fraction : float
+            between 0 and 1. For example 0.99 to get a latency that at
+            least 99 % of the events were faster than or equal to.
+        """
+        count = self.count()
+        if count == 0:
+            return None
+
+        threshold = fraction * count
+        total = 0
+        for index, bucket in enumerate(self.buckets):
+            total += bucket
+            if total >= threshold and bucket > 0:
+                return get_bucket_limit(index)
+
+        return get_bucket_limit(NUM_BUCKETS - 1)
+
+
+class Stats:
+    """Latencies and counters of a single injection process."""
+    def __init__(self):
+        self.histograms = {path: Histogram() for path in PATHS}
+        # how many events were read from the grabbed devices
+        self.events = 0
+
+    def record(self, path, event):
+        """Add the time that passed since the kernel reported the event.
+
+        Parameters
+        ----------
+        path : str
+            one of FORWARDED, MAPPED or MACRO
+        event : evdev.InputEvent
+        """
+        if event.sec == 0:
+            # made up by key-mapper, for example to release a key
+            return
+
+        self.histograms[path].add(time.time() - event.timestamp())
+
+    def serialize(self):
+        """Get counters and histogram buckets to send them to other processes.
+
+        Returns two dicts. The first one maps names to counts, the second
+        one maps paths to lists of bucket counts.
+        """
+        counters = {'events': self.events}
+        histograms = {}
+        for path, histogram in self.histograms.items():
+            counters[path] = histogram.count()
+            histograms[path] = list(histogram.buckets)
+
+        return counters, histograms
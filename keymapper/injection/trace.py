@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Remember what the injection did with the most recent events.
+
+Much cheaper than logging each event with -d, because nothing is
+formatted until the trace is decoded.
+"""
+
+
+import time
+import struct
+
+
+# decisions
+FORWARDED = 1
+MAPPED = 2
+MACRO = 3
+DUPLICATE = 4
+DISABLED = 5
+RELEASE = 6
+
+DECISION_NAMES = {
+    FORWARDED: 'forwarded',
+    MAPPED: 'mapped',
+    MACRO: 'macro',
+    DUPLICATE: 'duplicate',
+    DISABLED: 'disabled',
+    RELEASE: 'release',
+}
+
+# used as output code if nothing was written
+NO_OUTPUT = -1
+
+MAGIC = b'KMTR'
+VERSION = 1
+
+# magic, version, number of records
+HEADER = struct.Struct('<4sBI')
+# timestamp, type, code, value, decision, output code
+RECORD = struct.Struct('<dHHiBi')
+
+
+class TraceBuffer:
+    """Fixed-size ring buffer of what happened to input events.
+
+    Old records are overwritten once it is full.
+    """
+    def __init__(self, size=4096):
+        """Allocate the memory for all records.
+
+        Parameters
+        ----------
+        size : int
+            how many records to keep at most
+        """
+        self._size = size
+        self._buffer = bytearray(size * RECORD.size)
+        # the index of the next record to write
+        self._index = 0
+        self._full = False
+
+    def record(self, event_tuple, decision, output=NO_OUTPUT):
+        """Remember what happened to the event.
+
+        Parameters
+        ----------
+        event_tuple : int, int, int
+            type, code, value of the input
+        decision : int
+            one of FORWARDED, MAPPED, MACRO, DUPLICATE, DISABLED or RELEASE
+        output : int
+            the code that was written, if any
+        """
+        RECORD.pack_into(
+            self._buffer,
+            self._index * RECORD.size,
+            time.time(),
+            *event_tuple,
+            decision,
+            output
+        )
+        self._index += 1
+        if self._index == self._size:
+            self._index = 0
+            self._full = True
+
+    def __len__(self):
+        return self._size if self._full else self._index
+
+    def dump(self):
+        """Get all records from oldest to newest in the binary format."""
+        split = self._index * RECORD.size
+        if self._full:
+            records = self._buffer[split:] + self._buffer[:split]
+        else:
+            records = self._buffer[:split]
+
+        return HEADER.pack(MAGIC, VERSION, len(self)) + bytes(records)
+
+
+def decode(data):
+    """Get a list of records from what TraceBuffer.dump returned.
+
+    Each record is a tuple of timestamp, type, code, value, decision
+    and output.
+    """
+    data = bytes(data)
+    if len(data) < HEADER.size:
+        raise ValueError('Not a key-mapper trace, too short')
+
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a key-mapper trace')
+
+    if version != VERSION:
+        raise ValueError(f'Unsupported trace version {version}')
+
+    if len(data) != HEADER.size + count * RECORD.size:
+        raise ValueError('Trace is incomplete')
+
+    return list(RECORD.iter_unpack(data[HEADER.size:]))
+
+
+def format_record(record):
+    """Make a record from decode human readable."""
+    timestamp, ev_type, code, value, decision, output = record
+    time_string = time.strftime('%H:%M:%S', time.localtime(timestamp))
+    line = (
+        f'{time_string}.{int(timestamp % 1 * 1000000):06d} '
+        f'({ev_type}, {code}, {value}) '
+        f'{DECISION_NAMES.get(decision, decision)}'
+    )
+
+    if output != NO_OUTPUT:
+        line += f' {output}'
+
+    return line
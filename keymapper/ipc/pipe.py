@@ -34,23 +34,53 @@
 
 Beware that pipes read any available messages,
 even those written by themselves.
+
+Each message is a frame that starts with its kind, the time it was sent
+and the length of its payload. Input events are by far the most frequent
+messages, so they have their own compact binary encoding, and multiple
+of them fit into a single frame.
 """
 
 
 import os
 import time
 import json
+import select
+import struct
+import collections
 
 from keymapper.logger import logger
 from keymapper.paths import mkdir, chown
 
 
+# kinds of frames
+MESSAGE = 0
+EVENTS = 1
+
+# kind, time of sending, length of the payload
+FRAME_HEADER = struct.Struct('<BdI')
+# sec, usec, type, code, value
+EVENT = struct.Struct('<qqHHi')
+
+# anything bigger is most likely garbage
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+# how many seconds to wait for the reader when the pipe is full
+WRITE_TIMEOUT = 1
+
+
 class Pipe:
     """Pipe object."""
     def __init__(self, path):
         """Create a pipe, or open it if it already exists."""
         self._path = path
-        self._unread = []
+        self._unread = collections.deque()
+        # bytes of incomplete frames
+        self._buffer = bytearray()
+        # bytes of a frame that couldn't be written completely yet
+        self._pending = bytearray()
+        # if the previous write timed out, don't wait for the reader again
+        self._stalled = False
         self._created_at = time.time()
 
         paths = (
@@ -80,65 +110,159 @@ class Pipe:
         else:
             logger.spam('Using existing pipe for "%s"', path)
 
-        # thanks to os.O_NONBLOCK, readline will return b'' when there
+        # thanks to os.O_NONBLOCK, reading won't block when there
         # is nothing to read
         self._fds = (
             os.open(paths[0], os.O_RDONLY | os.O_NONBLOCK),
             os.open(paths[1], os.O_WRONLY | os.O_NONBLOCK)
         )
 
-        self._handles = (
-            open(self._fds[0], 'r'),
-            open(self._fds[1], 'w')
-        )
+    def _read(self):
+        """Move all complete frames from the pipe into _unread."""
+        while True:
+            try:
+                chunk = os.read(self._fds[0], 65536)
+            except BlockingIOError:
+                break
+
+            if len(chunk) == 0:
+                break
+
+            self._buffer += chunk
+
+        offset = 0
+        buffer = self._buffer
+        while len(buffer) - offset >= FRAME_HEADER.size:
+            kind, sent_at, length = FRAME_HEADER.unpack_from(buffer, offset)
+            if length > MAX_PAYLOAD:
+                logger.error('Discarding invalid data in "%s"', self._path)
+                offset = len(buffer)
+                break
+
+            end = offset + FRAME_HEADER.size + length
+            if end > len(buffer):
+                # the rest of the frame didn't arrive yet
+                break
+
+            payload = bytes(buffer[offset + FRAME_HEADER.size:end])
+            offset = end
+
+            if sent_at < self._created_at and os.environ.get('UNITTEST'):
+                # important to avoid race conditions between multiple
+                # unittests, for example old terminate messages reaching
+                # a new instance of the helper.
+                logger.spam('Ignoring old message')
+                continue
+
+            self._parse(kind, payload)
+
+        del buffer[:offset]
+
+    def _parse(self, kind, payload):
+        """Add the messages of a frame to _unread."""
+        if kind == EVENTS:
+            for event in EVENT.iter_unpack(payload):
+                self._unread.append({'type': 'event', 'message': event})
+            return
+
+        if kind == MESSAGE:
+            # Doesn't transmit pickles, to avoid injection attacks on the
+            # privileged helper. Only messages that can be converted to
+            # json are allowed.
+            self._unread.append(json.loads(payload))
+            return
+
+        logger.error('Unknown kind of frame %s in "%s"', kind, self._path)
 
     def recv(self):
-        """Read an object from the pipe or None if nothing available.
+        """Read an object from the pipe or None if nothing available."""
+        if len(self._unread) == 0:
+            self._read()
 
-        Doesn't transmit pickles, to avoid injection attacks on the
-        privileged helper. Only messages that can be converted to json
-        are allowed.
-        """
         if len(self._unread) > 0:
-            return self._unread.pop(0)
+            return self._unread.popleft()
+
+        return None
+
+    def _flush(self, deadline):
+        """Write _pending into the pipe.
+
+        Returns False if the pipe was still full at the deadline.
+        """
+        while len(self._pending) > 0:
+            try:
+                written = os.write(self._fds[1], self._pending)
+            except BlockingIOError:
+                # the pipe is full, wait for the reader
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+
+                select.select([], [self._fds[1]], [], remaining)
+                continue
+
+            del self._pending[:written]
+
+        return True
+
+    def _write(self, kind, payload):
+        """Write a frame into the pipe.
 
-        line = self._handles[0].readline()
-        if len(line) == 0:
-            return None
+        If nobody reads the pipe for WRITE_TIMEOUT seconds, frames are
+        dropped until it is read again.
+        """
+        timeout = 0 if self._stalled else WRITE_TIMEOUT
+        deadline = time.monotonic() + timeout
+        frame = FRAME_HEADER.pack(kind, time.time(), len(payload)) + payload
+
+        # the rest of a previous frame has to arrive first
+        if self._flush(deadline):
+            self._pending += frame
+            if self._flush(deadline):
+                if self._stalled:
+                    logger.debug('"%s" is being read again', self._path)
+                    self._stalled = False
+
+                return
 
-        parsed = json.loads(line)
-        if parsed[0] < self._created_at and os.environ.get('UNITTEST'):
-            # important to avoid race conditions between multiple unittests,
-            # for example old terminate messages reaching a new instance of
-            # the helper.
-            logger.spam('Ignoring old message %s', parsed)
-            return None
+            if len(self._pending) == len(frame):
+                # Nothing of it was written, so it can be dropped. Once a
+                # part of a frame is written, the rest needs to follow, or
+                # the reader can't make sense of anything after it.
+                self._pending.clear()
 
-        return parsed[1]
+        if not self._stalled:
+            logger.error(
+                'Timed out writing to "%s", dropping messages until it is '
+                'read again',
+                self._path
+            )
+            self._stalled = True
 
     def send(self, message):
         """Write an object to the pipe."""
-        dump = json.dumps((time.time(), message))
-        # there aren't any newlines supposed to be,
-        # but if there are it breaks readline().
-        self._handles[1].write(dump.replace('\n', ''))
-        self._handles[1].write('\n')
-        self._handles[1].flush()
+        self._write(MESSAGE, json.dumps(message).encode())
+
+    def send_events(self, events):
+        """Write input events to the pipe in a single frame.
+
+        They are received as {'type': 'event', 'message': event} each.
+
+        Parameters
+        ----------
+        events : list of tuples
+            sec, usec, type, code and value of each event
+        """
+        payload = b''.join([EVENT.pack(*event) for event in events])
+        self._write(EVENTS, payload)
 
     def poll(self):
         """Check if there is anything that can be read."""
-        if len(self._unread) > 0:
-            return True
-
-        # using select.select apparently won't mark the pipe as ready
-        # anymore when there are multiple lines to read but only a single
-        # line is retreived. Using read instead.
-        msg = self.recv()
-        if msg is not None:
-            self._unread.append(msg)
+        if len(self._unread) == 0:
+            self._read()
 
         return len(self._unread) > 0
 
     def fileno(self):
         """Compatibility to select.select"""
-        return self._handles[0].fileno()
+        return self._fds[0]
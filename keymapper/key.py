@@ -87,6 +87,21 @@ class Key:
         self.keys = tuple(keys)
         self.release = (*self.keys[-1][:2], 0)
 
+    @classmethod
+    def from_verified(cls, keys):
+        """Construct a Key object without checking the keys.
+
+        Parameters
+        ----------
+        keys : tuple
+            of one or more int 3-tuples, for example decoded from a
+            compiled preset
+        """
+        key = cls.__new__(cls)
+        key.keys = keys
+        key.release = (*keys[-1][:2], 0)
+        return key
+
     @classmethod
     def btn_left(cls):
         """Construct a Key object representing a left click on a mouse."""
@@ -23,15 +23,18 @@
 
 
 import os
-import json
 import copy
+import json
+import weakref
 
 from evdev.ecodes import EV_KEY, BTN_LEFT
 
 from keymapper.logger import logger
-from keymapper.paths import touch
+from keymapper.paths import touch, write_atomically
 from keymapper.config import ConfigBase, config
 from keymapper.key import Key
+from keymapper.compiled import get_compiled_path, compile_preset, \
+    load_compiled, COMPILE_THRESHOLD
 
 
 DISABLE_NAME = 'disable'
@@ -73,6 +76,16 @@ class Mapping(ConfigBase):
         self._mapping = {}  # a mapping of Key objects to strings
         self.changed = False
 
+        # all mappings that use the same _mapping, see clone. It has to be
+        # copied before it is modified while any of the others exist.
+        # None if it isn't shared.
+        self._sharers = None
+
+        # maps Key objects to their symbol before and after they changed
+        # since the mapping was loaded or the changes were taken with
+        # pop_changes. None if it didn't exist.
+        self._journal = {}
+
         # are there actually any keys set in the mapping file?
         self.num_saved_keys = 0
 
@@ -85,6 +98,46 @@ class Mapping(ConfigBase):
     def __len__(self):
         return len(self._mapping)
 
+    def _unshare(self):
+        """Stop sharing _mapping. Returns True if others still use it."""
+        if self._sharers is None:
+            return False
+
+        self._sharers.discard(self)
+        shared = len(self._sharers) > 0
+        self._sharers = None
+        return shared
+
+    def _copy_on_write(self):
+        """Stop sharing _mapping with clones, before modifying it."""
+        if self._unshare():
+            self._mapping = self._mapping.copy()
+
+    def _record(self, key, previous, symbol):
+        """Remember in the journal that the symbol of the key changed."""
+        if key in self._journal:
+            # keep what it was before the first change
+            previous = self._journal[key][0]
+
+        if previous == symbol:
+            self._journal.pop(key, None)
+        else:
+            self._journal[key] = (previous, symbol)
+
+    def pop_changes(self):
+        """Get which mappings changed since the previous call, and forget them.
+
+        Only counts changes since the preset was loaded, because loading
+        replaces everything anyway.
+
+        Returns a dict of Key objects to tuples of the previous and the
+        current symbol. The previous symbol is None if the key was added,
+        the current one is None if it was removed.
+        """
+        changes = self._journal
+        self._journal = {}
+        return changes
+
     def set(self, *args):
         """Set a config value. See `ConfigBase.set`."""
         self.changed = True
@@ -120,7 +173,9 @@ class Mapping(ConfigBase):
         symbol = symbol.strip()
         logger.debug('%s will map to "%s"', new_key, symbol)
         self.clear(new_key)  # this also clears all equivalent keys
+        self._copy_on_write()
         self._mapping[new_key] = symbol
+        self._record(new_key, None, symbol)
 
         if previous_key is not None:
             code_changed = new_key != previous_key
@@ -144,13 +199,18 @@ class Mapping(ConfigBase):
         for permutation in key.get_permutations():
             if permutation in self._mapping:
                 logger.debug('%s will be cleared', permutation)
-                del self._mapping[permutation]
+                self._copy_on_write()
+                self._record(permutation, self._mapping.pop(permutation), None)
                 self.changed = True
                 # there should be only one variation of the permutations
                 # in the mapping actually
 
     def empty(self):
         """Remove all mappings and custom configs without saving."""
+        for key, symbol in self._mapping.items():
+            self._record(key, symbol, None)
+
+        self._unshare()
         self._mapping = {}
         self.changed = True
         self.clear_config()
@@ -170,6 +230,11 @@ class Mapping(ConfigBase):
             )
 
         self.clear_config()
+        self._copy_on_write()
+        self._journal = {}
+
+        if self._load_compiled(path):
+            return
 
         with open(path, 'r') as file:
             preset_dict = json.load(file)
@@ -204,53 +269,137 @@ class Mapping(ConfigBase):
                     continue
                 self._config[key] = preset_dict[key]
 
+            self._invalidate()
+
         self.changed = False
         self.num_saved_keys = len(self)
 
+    def _load_compiled(self, path):
+        """Load the compiled copy of the preset if it is up to date.
+
+        Returns True if it was loaded.
+        """
+        try:
+            compiled = load_compiled(path)
+        except (ValueError, OSError) as error:
+            logger.error('Ignoring the compiled preset: %s', error)
+            return False
+
+        if compiled is None:
+            return False
+
+        mapping, preset_config = compiled
+        logger.debug(
+            'Loaded %d mappings from the compiled preset',
+            len(mapping)
+        )
+        self._mapping.update(mapping)
+        self._config.update(preset_config)
+        self._invalidate()
+        self.changed = False
+        self.num_saved_keys = len(self)
+        return True
+
     def clone(self):
-        """Create a copy of the mapping."""
+        """Create a copy of the mapping.
+
+        Both share the same mappings until one of them is modified, so
+        cloning is cheap even for large presets.
+        """
         mapping = Mapping()
-        mapping._mapping = copy.deepcopy(self._mapping)
-        mapping.changed = self.changed
+        mapping._copy_from(self)  # pylint: disable=protected-access
         return mapping
 
-    def save(self, path):
-        """Dump as JSON into home."""
-        logger.info('Saving preset to %s', path)
+    def _copy_from(self, other):
+        """Take the mappings and config of another mapping.
 
-        touch(path)
+        Parameters
+        ----------
+        other : Mapping
+        """
+        # pylint: disable=protected-access
+        if other._sharers is None:
+            other._sharers = weakref.WeakSet([other])
+
+        # as soon as the clone is garbage collected, the other one can
+        # modify _mapping again without copying it
+        other._sharers.add(self)
+        self._sharers = other._sharers
+        self._mapping = other._mapping
+        self._config = copy.deepcopy(other._config)
+        self._journal = other._journal.copy()
+        self.changed = other.changed
+
+    def clone_for_saving(self):
+        """Get a clone that can be saved later, for example in a thread.
+
+        Afterwards the mapping counts as saved, just like after calling
+        save.
+        """
+        mapping = self.clone()
+        self.changed = False
+        self.num_saved_keys = len(self)
+        return mapping
 
-        with open(path, 'w') as file:
-            if self._config.get('mapping') is not None:
-                logger.error(
-                    '"mapping" is reserved and cannot be used as config '
-                    'key: %s',
-                    self._config.get('mapping')
-                )
+    def dumps(self):
+        """Get the preset as JSON, like it is written into files."""
+        if self._config.get('mapping') is not None:
+            logger.error(
+                '"mapping" is reserved and cannot be used as config '
+                'key: %s',
+                self._config.get('mapping')
+            )
 
-            preset_dict = self._config.copy()  # shallow copy
-
-            # make sure to keep the option to add metadata if ever needed,
-            # so put the mapping into a special key
-            json_ready_mapping = {}
-            # tuple keys are not possible in json, encode them as string
-            for key, value in self._mapping.items():
-                new_key = '+'.join([
-                    ','.join([
-                        str(value)
-                        for value in sub_key
-                    ])
-                    for sub_key in key
+        preset_dict = self._config.copy()  # shallow copy
+
+        # make sure to keep the option to add metadata if ever needed,
+        # so put the mapping into a special key
+        json_ready_mapping = {}
+        # tuple keys are not possible in json, encode them as string
+        for key, value in self._mapping.items():
+            new_key = '+'.join([
+                ','.join([
+                    str(value)
+                    for value in sub_key
                 ])
-                json_ready_mapping[new_key] = value
+                for sub_key in key
+            ])
+            json_ready_mapping[new_key] = value
 
-            preset_dict['mapping'] = json_ready_mapping
-            json.dump(preset_dict, file, indent=4)
-            file.write('\n')
+        preset_dict['mapping'] = json_ready_mapping
+        return json.dumps(preset_dict, indent=4) + '\n'
+
+    def save(self, path):
+        """Dump as JSON into home."""
+        logger.info('Saving preset to %s', path)
+
+        touch(path)
+        content = self.dumps()
+        write_atomically(path, content)
+        self._save_compiled(path, content)
 
         self.changed = False
         self.num_saved_keys = len(self)
 
+    def _save_compiled(self, path, content):
+        """Store the compiled copy of large presets next to their json."""
+        compiled_path = get_compiled_path(path)
+        if len(self) < COMPILE_THRESHOLD:
+            # it would only make loading slower
+            if os.path.exists(compiled_path):
+                os.remove(compiled_path)
+            return
+
+        try:
+            data = compile_preset(content, self, self._config)
+        except ValueError as error:
+            logger.error('Not compiling the preset: %s', error)
+            if os.path.exists(compiled_path):
+                os.remove(compiled_path)
+            return
+
+        write_atomically(compiled_path, data)
+
     def get_symbol(self, key):
         """Read the symbol that is mapped to this keycode.
 
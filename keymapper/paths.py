@@ -55,6 +55,32 @@ def touch(path, log=True):
     chown(path)
 
 
+def write_atomically(path, content):
+    """Replace the contents of the file.
+
+    The content is written into a temporary file next to it first, which
+    then replaces the file, so that it is never only partially written.
+    The directory of the file has to exist. The content may be a str
+    or bytes.
+    """
+    tmp_path = os.path.join(
+        os.path.dirname(path),
+        f'.{os.path.basename(path)}.{os.getpid()}.tmp'
+    )
+
+    try:
+        mode = 'wb' if isinstance(content, bytes) else 'w'
+        with open(tmp_path, mode) as file:
+            file.write(content)
+
+        chown(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def mkdir(path, log=True):
     """Create a folder, give it to the user."""
     if path == '' or path is None:
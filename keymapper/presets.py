@@ -24,12 +24,13 @@
 
 import os
 import time
-import glob
 import re
+import threading
 
 from keymapper.paths import get_preset_path, mkdir, CONFIG_PATH
 from keymapper.logger import logger
 from keymapper.groups import groups
+from keymapper.compiled import get_compiled_path
 
 
 def migrate_path():
@@ -54,6 +55,135 @@ def migrate_path():
 migrate_path()
 
 
+# file systems might not be able to tell apart changes that happen within
+# this many nanoseconds by the modification time
+MTIME_GRANULARITY = 2 * 10 ** 9
+
+
+class PresetIndex:
+    """Remembers the contents of the preset directories.
+
+    A directory is only listed again when it changed. Its modification
+    time changes when presets are added, removed or renamed, and also
+    when key-mapper saves them, because that replaces the file. Our own
+    writes forget the listing right away, see invalidate.
+
+    The modification times of the presets are not remembered, because
+    editing or touching a file doesn't change its directory.
+    """
+    def __init__(self):
+        # maps directories to their inode, modification time, when they
+        # were listed and a dict of entries
+        self._directories = {}
+        # invalidate might be called from the thread of the preset_writer
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _list(self, directory):
+        """Get a dict of name: is_dir of the directory contents.
+
+        Hidden files are ignored.
+        """
+        try:
+            stat = os.stat(directory)
+        except (FileNotFoundError, NotADirectoryError):
+            with self._lock:
+                self._directories.pop(directory, None)
+            return {}
+
+        with self._lock:
+            cached = self._directories.get(directory)
+            generation = self._generation
+
+        if cached is not None:
+            inode, mtime, listed_at, entries = cached
+            # if it was listed right after it changed, another change that
+            # happened right after that can't be noticed.
+            unambiguous = listed_at - mtime > MTIME_GRANULARITY
+            if (inode, mtime) == (stat.st_ino, stat.st_mtime_ns) \
+                    and unambiguous:
+                return entries
+
+        listed_at = time.time_ns()
+        entries = {}
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                if entry.name.startswith('.'):
+                    continue
+
+                try:
+                    entries[entry.name] = entry.is_dir()
+                except FileNotFoundError:
+                    # removed in the meantime
+                    continue
+
+        with self._lock:
+            # don't remember it if it was invalidated while listing
+            if generation == self._generation:
+                self._directories[directory] = (
+                    stat.st_ino,
+                    stat.st_mtime_ns,
+                    listed_at,
+                    entries
+                )
+
+        return entries
+
+    def get_preset_names(self, group_name):
+        """Get the names of all presets of the group."""
+        return [
+            os.path.splitext(name)[0]
+            for name, is_dir
+            in self._list(get_preset_path(group_name)).items()
+            if name.endswith('.json') and not is_dir
+        ]
+
+    def get_presets(self, group_name):
+        """Get a dict of preset: mtime of the group."""
+        presets = {}
+        for preset in self.get_preset_names(group_name):
+            try:
+                mtime = os.stat(get_preset_path(group_name, preset)).st_mtime
+            except FileNotFoundError:
+                # removed in the meantime
+                continue
+
+            presets[preset] = mtime
+
+        return presets
+
+    def get_group_names(self):
+        """Get the names of all groups that have a preset directory."""
+        return [
+            name for name, is_dir
+            in self._list(get_preset_path()).items()
+            if is_dir
+        ]
+
+    def exists(self, group_name, preset):
+        """Check if the preset exists."""
+        return preset in self.get_preset_names(group_name)
+
+    def invalidate(self, directory):
+        """List the directory again the next time it is needed.
+
+        Should be called after writing into it, because the modification
+        time might not tell that apart from earlier changes.
+        """
+        with self._lock:
+            self._directories.pop(directory, None)
+            self._generation += 1
+
+    def clear(self):
+        """Forget all directories."""
+        with self._lock:
+            self._directories = {}
+            self._generation += 1
+
+
+preset_index = PresetIndex()
+
+
 def get_available_preset_name(group_name, preset='new preset', copy=False):
     """Increment the preset name until it is available."""
     if group_name is None:
@@ -66,7 +196,7 @@ def get_available_preset_name(group_name, preset='new preset', copy=False):
         preset = f'{preset} copy'
 
     # find a name that is not already taken
-    if os.path.exists(get_preset_path(group_name, preset)):
+    if preset_index.exists(group_name, preset):
         # if there already is a trailing number, increment it instead of
         # adding another one
         match = re.match(r'^(.+) (\d+)$', preset)
@@ -76,7 +206,7 @@ def get_available_preset_name(group_name, preset='new preset', copy=False):
         else:
             i = 2
 
-        while os.path.exists(get_preset_path(group_name, f'{preset} {i}')):
+        while preset_index.exists(group_name, f'{preset} {i}'):
             i += 1
 
         return f'{preset} {i}'
@@ -91,17 +221,11 @@ def get_presets(group_name):
     ----------
     group_name : string
     """
-    device_folder = get_preset_path(group_name)
-    mkdir(device_folder)
-
-    paths = glob.glob(os.path.join(device_folder, '*.json'))
-    presets = [
-        os.path.splitext(os.path.basename(path))[0]
-        for path in sorted(paths, key=os.path.getmtime)
-    ]
+    mkdir(get_preset_path(group_name))
+
+    presets = preset_index.get_presets(group_name)
     # the highest timestamp to the front
-    presets.reverse()
-    return presets
+    return sorted(presets, key=presets.get, reverse=True)
 
 
 def get_any_preset():
@@ -125,39 +249,37 @@ def find_newest_preset(group_name=None):
     group_name : string
         If set, will return the newest preset for the device or None
     """
-    # sort the oldest files to the front in order to use pop to get the newest
     if group_name is None:
-        paths = sorted(
-            glob.glob(os.path.join(get_preset_path(), '*/*.json')),
-            key=os.path.getmtime
-        )
+        preset_group_names = preset_index.get_group_names()
     else:
-        paths = sorted(
-            glob.glob(os.path.join(get_preset_path(group_name), '*.json')),
-            key=os.path.getmtime
-        )
+        preset_group_names = [group_name]
+
+    # sort the oldest presets to the front in order to use pop to get the
+    # newest
+    presets = sorted(
+        (mtime, name, preset)
+        for name in preset_group_names
+        for preset, mtime in preset_index.get_presets(name).items()
+    )
 
-    if len(paths) == 0:
+    if len(presets) == 0:
         logger.debug('No presets found')
         return get_any_preset()
 
     group_names = groups.list_group_names()
 
-    newest_path = None
-    while len(paths) > 0:
-        # take the newest path
-        path = paths.pop()
-        preset = os.path.split(path)[1]
-        group_name = os.path.split(os.path.split(path)[0])[1]
+    newest = None
+    while len(presets) > 0:
+        # take the newest preset
+        _, group_name, preset = presets.pop()
         if group_name in group_names:
-            newest_path = path
+            newest = preset
             break
 
-    if newest_path is None:
+    if newest is None:
         logger.debug('None of the configured devices is currently online')
         return get_any_preset()
 
-    preset = os.path.splitext(preset)[0]
     logger.debug('The newest preset is "%s", "%s"', group_name, preset)
 
     return group_name, preset
@@ -172,11 +294,16 @@ def delete_preset(group_name, preset):
 
     logger.info('Removing "%s"', preset_path)
     os.remove(preset_path)
+    compiled_path = get_compiled_path(preset_path)
+    if os.path.exists(compiled_path):
+        os.remove(compiled_path)
 
     device_path = get_preset_path(group_name)
+    preset_index.invalidate(device_path)
     if os.path.exists(device_path) and len(os.listdir(device_path)) == 0:
         logger.debug('Removing empty dir "%s"', device_path)
         os.rmdir(device_path)
+        preset_index.invalidate(get_preset_path())
 
 
 def rename_preset(group_name, old_preset_name, new_preset_name):
@@ -186,11 +313,15 @@ def rename_preset(group_name, old_preset_name, new_preset_name):
 
     new_preset_name = get_available_preset_name(group_name, new_preset_name)
     logger.info('Moving "%s" to "%s"', old_preset_name, new_preset_name)
-    os.rename(
-        get_preset_path(group_name, old_preset_name),
-        get_preset_path(group_name, new_preset_name)
-    )
+    old_path = get_preset_path(group_name, old_preset_name)
+    new_path = get_preset_path(group_name, new_preset_name)
+    os.rename(old_path, new_path)
+    if os.path.exists(get_compiled_path(old_path)):
+        # it is still valid, since the json didn't change
+        os.rename(get_compiled_path(old_path), get_compiled_path(new_path))
+
     # set the modification date to now
     now = time.time()
     os.utime(get_preset_path(group_name, new_preset_name), (now, now))
+    preset_index.invalidate(get_preset_path(group_name))
     return new_preset_name
@@ -22,15 +22,18 @@
 """Create some singleton objects that are needed for the app to work."""
 
 
+import os
 import stat
 import re
 import json
+import hashlib
 import subprocess
 import evdev
 
 from keymapper.logger import logger
 from keymapper.mapping import Mapping, DISABLE_NAME, DISABLE_CODE
-from keymapper.paths import get_config_path, touch, USER
+from keymapper.paths import get_config_path, touch, write_atomically
+from keymapper.user import USER, HOME
 
 
 # xkb uses keycodes that are 8 higher than those from evdev
@@ -38,14 +41,63 @@ XKB_KEYCODE_OFFSET = 8
 
 XMODMAP_FILENAME = 'xmodmap.json'
 
+# the parsed xmodmap output of the previous start, to not run xmodmap
+# again if the layout didn't change since then
+XMODMAP_CACHE_FILENAME = 'xmodmap_cache.json'
+
+
+def get_layout_fingerprint():
+    """Get a hash that changes when the keyboard layout changes.
+
+    Asking for the layout is a lot faster than asking xmodmap for the
+    complete table, but setxkbmap still runs as a subprocess. Returns
+    None if the layout is unknown.
+
+    It can't notice everything. Changes of ~/.Xmodmap within the
+    resolution of its modification time, keys that were modified with
+    xmodmap without that file, and xkb options that other tools set
+    without changing the output of setxkbmap -query keep the same
+    fingerprint. Removing xmodmap_cache.json in the config directory
+    makes key-mapper read the table again.
+    """
+    try:
+        layout = subprocess.check_output(
+            ['setxkbmap', '-query'],
+            stderr=subprocess.STDOUT
+        ).decode()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # might be within a tty
+        return None
+
+    # changes that were made with xmodmap don't show up in the layout.
+    # Those usually come from the .Xmodmap file.
+    try:
+        xmodmap_mtime = os.stat(os.path.join(HOME, '.Xmodmap')).st_mtime
+    except OSError:
+        xmodmap_mtime = None
+
+    display = os.environ.get('DISPLAY')
+    fingerprint = f'{display}\n{xmodmap_mtime}\n{layout}'
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
 
 class SystemMapping:
     """Stores information about all available keycodes."""
     def __init__(self):
         """Construct the system_mapping."""
         self._mapping = {}
-        self._xmodmap = {}
+        self._xmodmap = []
         self._case_insensitive_mapping = {}
+        # the usable names of the xmodmap and their codes
+        self._xmodmap_dict = {}
+        # maps codes to all names the xmodmap has for them
+        self._names_by_code = {}
+        # increased with each change, so that things that are derived
+        # from the names know when to update
+        self.revision = 0
+        # layout fingerprint the mapping was populated with, None if it
+        # was modified since then
+        self._fingerprint = None
         self.populate()
 
     def list_names(self):
@@ -60,39 +112,124 @@ class SystemMapping:
         return self._case_insensitive_mapping.get(symbol.lower(), symbol)
 
     def populate(self):
-        """Get a mapping of all available names to their keycodes."""
+        """Get a mapping of all available names to their keycodes.
+
+        Does nothing if the layout didn't change since the last call.
+        """
         logger.debug('Gathering available keycodes')
+        xmodmap = None
+        fingerprint = get_layout_fingerprint()
+        if fingerprint is None:
+            # compare the complete table instead
+            xmodmap = self._run_xmodmap()
+            fingerprint = hashlib.sha1(str(xmodmap).encode()).hexdigest()
+
+        if fingerprint != self._fingerprint:
+            self.clear()
+            if xmodmap is None:
+                xmodmap = self._read_xmodmap(fingerprint)
+
+            self._xmodmap = xmodmap
+            self._use_xmodmap_dict(self._find_legit_mappings())
+            self._fingerprint = fingerprint
+        else:
+            logger.debug('The keyboard layout didn\'t change')
+
+        if USER != 'root':
+            # write this stuff into the key-mapper config directory, because
+            # the systemd service won't know the user sessions xmodmap
+            self._write_xmodmap_file()
+
+    def load_xmodmap_file(self, path):
+        """Use the names of an xmodmap.json instead of those of xmodmap.
+
+        The service only knows the xmodmap of the users session from that
+        file, because it runs without access to it. Raises a
+        FileNotFoundError if it doesn't exist.
+        """
+        with open(path, 'r') as file:
+            xmodmap_dict = json.load(file)
+
         self.clear()
-        xmodmap_dict = {}
+        self._xmodmap = []
+        self._use_xmodmap_dict(xmodmap_dict)
+
+    def _use_xmodmap_dict(self, xmodmap_dict):
+        """Map the names of the xmodmap and of evdev to their codes."""
+        self._xmodmap_dict = xmodmap_dict
+        self._index_xmodmap()
+
+        names = {
+            name: ecode for name, ecode in evdev.ecodes.ecodes.items()
+            if name.startswith('KEY') or name.startswith('BTN')
+        }
+        names[DISABLE_NAME] = DISABLE_CODE
+        self._update(self._xmodmap_dict)
+        self._update(names)
+
+    @staticmethod
+    def _run_xmodmap():
+        """Get the parsed xmodmap table as a list of (keycode, names)."""
+        xmodmap = ''
         try:
             xmodmap = subprocess.check_output(
                 ['xmodmap', '-pke'],
                 stderr=subprocess.STDOUT
             ).decode()
-            xmodmap = xmodmap
-            self._xmodmap = re.findall(r'(\d+) = (.+)\n', xmodmap + '\n')
-            xmodmap_dict = self._find_legit_mappings()
         except (subprocess.CalledProcessError, FileNotFoundError):
             # might be within a tty
             pass
 
+        return re.findall(r'(\d+) = (.+)\n', xmodmap + '\n')
+
+    def _read_xmodmap(self, fingerprint):
+        """Like _run_xmodmap, but uses the table of the previous start.
+
+        Only if the fingerprint of the layout is still the same.
+        """
+        path = get_config_path(XMODMAP_CACHE_FILENAME)
+        try:
+            with open(path, 'r') as file:
+                cache = json.load(file)
+            if cache['fingerprint'] == fingerprint:
+                logger.debug('Using the cached xmodmap')
+                return [tuple(line) for line in cache['xmodmap']]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        xmodmap = self._run_xmodmap()
+
         if USER != 'root':
-            # write this stuff into the key-mapper config directory, because
-            # the systemd service won't know the user sessions xmodmap
-            path = get_config_path(XMODMAP_FILENAME)
-            touch(path)
-            with open(path, 'w') as file:
-                logger.debug('Writing "%s"', path)
-                json.dump(xmodmap_dict, file, indent=4)
+            touch(path, log=False)
+            write_atomically(path, json.dumps({
+                'fingerprint': fingerprint,
+                'xmodmap': xmodmap
+            }))
 
-        for name, code in xmodmap_dict.items():
-            self._set(name, code)
+        return xmodmap
+
+    def _write_xmodmap_file(self):
+        """Store the xmodmap as json, if it is different from the file."""
+        content = json.dumps(self._xmodmap_dict, indent=4)
+        path = get_config_path(XMODMAP_FILENAME)
+        try:
+            with open(path, 'r') as file:
+                if file.read() == content:
+                    return
+        except FileNotFoundError:
+            pass
 
-        for name, ecode in evdev.ecodes.ecodes.items():
-            if name.startswith('KEY') or name.startswith('BTN'):
-                self._set(name, ecode)
+        touch(path)
+        with open(path, 'w') as file:
+            logger.debug('Writing "%s"', path)
+            file.write(content)
 
-        self._set(DISABLE_NAME, DISABLE_CODE)
+    def _index_xmodmap(self):
+        """Map codes to their names in the parsed xmodmap."""
+        self._names_by_code = {}
+        for keycode, names in self._xmodmap:
+            code = int(keycode) - XKB_KEYCODE_OFFSET
+            self._names_by_code.setdefault(code, []).append(names.split()[0])
 
     def update(self, mapping):
         """Update this with new keys.
@@ -102,13 +239,21 @@ class SystemMapping:
         mapping : dict
             maps from name to code. Make sure your keys are lowercase.
         """
-        for name, code in mapping.items():
-            self._set(name, code)
+        self._update(mapping)
+
+    def _update(self, mapping):
+        """Map multiple names to codes at once."""
+        mapping = {str(name): code for name, code in mapping.items()}
+        self._mapping.update(mapping)
+        self._case_insensitive_mapping.update({
+            name.lower(): name for name in mapping
+        })
+        self.revision += 1
+        self._fingerprint = None
 
     def _set(self, name, code):
         """Map name to code."""
-        self._mapping[str(name)] = code
-        self._case_insensitive_mapping[str(name).lower()] = name
+        self._update({name: code})
 
     def get(self, name):
         """Return the code mapped to the key."""
@@ -121,17 +266,22 @@ class SystemMapping:
 
     def clear(self):
         """Remove all mapped keys. Only needed for tests."""
-        keys = list(self._mapping.keys())
-        for key in keys:
-            del self._mapping[key]
+        self._mapping.clear()
+        self._case_insensitive_mapping.clear()
+        self.revision += 1
+        self._fingerprint = None
+
+    def get_names(self, code):
+        """Get all names the xmodmap has for the code."""
+        return list(self._names_by_code.get(code, []))
 
     def get_name(self, code):
         """Get the first matching name for the code."""
-        for entry in self._xmodmap:
-            if int(entry[0]) - XKB_KEYCODE_OFFSET == code:
-                return entry[1].split()[0]
+        names = self._names_by_code.get(code)
+        if names is None:
+            return None
 
-        return None
+        return names[0]
 
     def _find_legit_mappings(self):
         """From the parsed xmodmap list find usable symbols and their codes."""
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Ask the service to autoload a device with as few imports as possible.
+
+udev runs this for every new node in /dev/input, which on boot are quite
+a lot. Therefore this module must not import the logger (pkg_resources is
+slow), evdev, the groups or anything else that does work on import. It
+only talks to the service, which is the one that finds out which group
+the path belongs to.
+"""
+
+
+import sys
+
+
+BUS_NAME = 'keymapper.Control'
+
+# the path that pydbus publishes BUS_NAME at
+OBJECT_PATH = f'/{BUS_NAME.replace(".", "/")}'
+
+
+def trigger_autoload(device):
+    """Send an autoload_single call to the service without waiting for it.
+
+    Returns True if the message was sent.
+
+    Parameters
+    ----------
+    device : str
+        A path like "/dev/input/event3" or the key of a group
+    """
+    # gi only loads the typelibs that are actually requested, so this is
+    # cheap compared to pydbus which also introspects the remote object
+    import gi
+    gi.require_version('Gio', '2.0')
+    gi.require_version('GLib', '2.0')
+    from gi.repository import Gio, GLib
+
+    try:
+        bus = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+        message = Gio.DBusMessage.new_method_call(
+            BUS_NAME,
+            OBJECT_PATH,
+            BUS_NAME,
+            'autoload_single'
+        )
+        message.set_body(GLib.Variant('(s)', (device,)))
+        # udev doesn't like long running RUN commands, and the service
+        # might need a moment to refresh its groups. Don't wait for it.
+        message.set_flags(Gio.DBusMessageFlags.NO_REPLY_EXPECTED)
+        bus.send_message(message, Gio.DBusSendMessageFlags.NONE)
+        bus.flush_sync(None)
+    except GLib.GError as error:
+        sys.stderr.write(f'Service not running? {error}\n')
+        return False
+
+    return True
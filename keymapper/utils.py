@@ -103,7 +103,7 @@ def will_report_key_up(event):
     return not is_wheel(event)
 
 
-def should_map_as_btn(event, mapping, gamepad):
+def should_map_as_btn(event, purposes, gamepad):
     """Does this event describe a button.
 
     If it does, this function will make sure its value is one of [-1, 0, 1],
@@ -118,7 +118,9 @@ def should_map_as_btn(event, mapping, gamepad):
     Parameters
     ----------
     event : evdev.InputEvent
-    mapping : Mapping
+    purposes : tuple
+        The purposes of the left and of the right joystick, for example
+        (context.left_purpose, context.right_purpose)
     gamepad : bool
         If the device is treated as gamepad
     """
@@ -139,13 +141,12 @@ def should_map_as_btn(event, mapping, gamepad):
             if not gamepad:
                 return False
 
-            l_purpose = mapping.get('gamepad.joystick.left_purpose')
-            r_purpose = mapping.get('gamepad.joystick.right_purpose')
+            left_purpose, right_purpose = purposes
 
-            if event.code in [ABS_X, ABS_Y] and l_purpose == BUTTONS:
+            if event.code in [ABS_X, ABS_Y] and left_purpose == BUTTONS:
                 return True
 
-            if event.code in [ABS_RX, ABS_RY] and r_purpose == BUTTONS:
+            if event.code in [ABS_RX, ABS_RY] and right_purpose == BUTTONS:
                 return True
         else:
             # for non-joystick buttons just always offer mapping them to
@@ -205,3 +206,21 @@ def get_max_abs(device, code=ABS_X):
     """
     abs_range = get_abs_range(device, code)
     return abs_range and abs_range[1]
+
+
+def get_abs_ranges(device):
+    """Figure out the max and min values of all EV_ABS codes of that device.
+
+    Cheaper than calling get_abs_range for each event, because the
+    capabilities are only asked for once.
+
+    Returns a dict of code: (min, max), which is empty if the device
+    doesn't have any EV_ABS capabilities.
+    """
+    capabilities = device.capabilities(absinfo=True)
+
+    return {
+        entry[0]: (entry[1].min, entry[1].max)
+        for entry in capabilities.get(EV_ABS, [])
+        if isinstance(entry, tuple) and isinstance(entry[1], evdev.AbsInfo)
+    }
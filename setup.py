@@ -106,6 +106,7 @@ setup(
         ('/usr/bin/', ['bin/key-mapper-service']),
         ('/usr/bin/', ['bin/key-mapper-control']),
         ('/usr/bin/', ['bin/key-mapper-helper']),
+        ('/usr/bin/', ['bin/key-mapper-autoload-trigger']),
     ],
     install_requires=[
         'setuptools',
@@ -0,0 +1,596 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Measure how fast the injection handles events.
+
+Pushes synthetic event streams through KeycodeMapper.handle_keycode,
+the per-event work of the EventProducer and the whole event handling of
+the Injector, using the patched evdev of tests/test.py.
+
+    python3 -m tests.benchmark
+    python3 -m tests.benchmark --save
+    python3 -m tests.benchmark keyboard_burst macro_storm
+
+Results are compared to the baseline of a previous --save on the same
+machine. The exit code is 1 if anything got slower than the tolerance
+allows.
+"""
+
+
+import os
+import gc
+import logging
+import sys
+import json
+import time
+import array
+import asyncio
+from argparse import ArgumentParser
+from collections import namedtuple
+
+from evdev.ecodes import EV_KEY, EV_REL, EV_ABS, EV_SYN, SYN_REPORT, \
+    REL_X, REL_Y, REL_WHEEL, ABS_X, ABS_Y, ABS_RX, ABS_Z, BTN_A, BTN_LEFT, \
+    KEY_A, KEY_S, KEY_D, KEY_F, KEY_J, KEY_K, KEY_L, KEY_Q
+
+from tests.test import InputDevice, new_event, MIN_ABS, MAX_ABS
+
+from keymapper.logger import logger, update_verbosity
+from keymapper.config import MOUSE, BUTTONS
+from keymapper.mapping import Mapping
+from keymapper.key import Key
+from keymapper.groups import groups, classify, GAMEPAD
+from keymapper.utils import should_map_as_btn
+from keymapper.injection.context import Context
+from keymapper.injection.injector import Injector
+from keymapper.injection.event_producer import EventProducer
+from keymapper.injection.keycode_mapper import KeycodeMapper, \
+    active_macros, unreleased
+from keymapper.injection.replay import ReplayUInput
+
+
+KEYBOARD = '/dev/input/event10'
+MOUSE_DEVICE = '/dev/input/event11'
+GAMEPAD_DEVICE = '/dev/input/event30'
+
+KEYCODE_MAPPER = 'keycode_mapper'
+EVENT_PRODUCER = 'event_producer'
+CONSUMER = 'consumer'
+TARGETS = [KEYCODE_MAPPER, EVENT_PRODUCER, CONSUMER]
+
+DEFAULT_BASELINE = os.path.expanduser('~/.cache/key-mapper-benchmark.json')
+
+# metrics of which higher values are better
+HIGHER_IS_BETTER = ['events_per_second']
+# metrics of which lower values are better
+LOWER_IS_BETTER = ['p50', 'p99']
+# net growth of allocated memory blocks per event is usually close to 0,
+# so relative tolerances don't work for it
+BLOCKS_TOLERANCE = 0.1
+
+Scenario = namedtuple('Scenario', ['path', 'setup', 'events'])
+
+Result = namedtuple('Result', [
+    'events',
+    'events_per_second',
+    'p50',
+    'p99',
+    'blocks_per_event',
+])
+
+
+"""Scenarios"""
+
+
+def _syn():
+    return EV_SYN, SYN_REPORT, 0
+
+
+def _keyboard_burst_setup(mapping):
+    for index, code in enumerate([KEY_A, KEY_S, KEY_D, KEY_F]):
+        mapping.change(Key(EV_KEY, code, 1), f'KEY_{"BCDE"[index]}')
+
+
+def _keyboard_burst_events(count):
+    """Fast typing of single keys, some of them mapped."""
+    keys = [KEY_A, KEY_S, KEY_D, KEY_F, KEY_J, KEY_K, KEY_L, KEY_Q]
+    events = []
+    index = 0
+    while len(events) < count:
+        code = keys[index % len(keys)]
+        events += [(EV_KEY, code, 1), _syn(), (EV_KEY, code, 0), _syn()]
+        index += 1
+
+    return events[:count]
+
+
+def _nkro_rollover_setup(mapping):
+    mapping.change(Key((EV_KEY, KEY_A, 1), (EV_KEY, KEY_S, 1)), 'KEY_B')
+    mapping.change(
+        Key((EV_KEY, KEY_A, 1), (EV_KEY, KEY_S, 1), (EV_KEY, KEY_D, 1)),
+        'KEY_C'
+    )
+    mapping.change(Key(EV_KEY, KEY_F, 1), 'KEY_D')
+
+
+def _nkro_rollover_events(count):
+    """Many keys held at the same time and released in a different order.
+
+    Each new key has to be checked against all combinations of the
+    pressed keys.
+    """
+    keys = [KEY_A, KEY_S, KEY_D, KEY_F, KEY_J, KEY_K, KEY_L, KEY_Q]
+    events = []
+    while len(events) < count:
+        for code in keys:
+            events += [(EV_KEY, code, 1), _syn()]
+        for code in reversed(keys):
+            events += [(EV_KEY, code, 0), _syn()]
+
+    return events[:count]
+
+
+def _mouse_motion_setup(mapping):
+    mapping.change(Key(EV_KEY, BTN_LEFT, 1), 'KEY_A')
+
+
+def _mouse_motion_events(count):
+    """What an 8 kHz gaming mouse reports, all of which is forwarded."""
+    events = []
+    index = 0
+    while len(events) < count:
+        events += [
+            (EV_REL, REL_X, index % 7 - 3),
+            (EV_REL, REL_Y, index % 5 - 2),
+            _syn()
+        ]
+        index += 1
+
+    return events[:count]
+
+
+def _gamepad_abs_setup(mapping):
+    mapping.set('gamepad.joystick.left_purpose', MOUSE)
+    mapping.set('gamepad.joystick.right_purpose', BUTTONS)
+    mapping.change(Key(EV_ABS, ABS_RX, 1), 'KEY_A')
+    mapping.change(Key(EV_ABS, ABS_RX, -1), 'KEY_B')
+    mapping.change(Key(EV_ABS, ABS_Z, 1), 'KEY_C')
+    mapping.change(Key(EV_KEY, BTN_A, 1), 'KEY_D')
+
+
+def _gamepad_abs_events(count):
+    """Sticks and triggers that keep reporting slightly different values."""
+    events = []
+    index = 0
+    step = (MAX_ABS - MIN_ABS) // 64
+    while len(events) < count:
+        value = MIN_ABS + (index * step) % (MAX_ABS - MIN_ABS)
+        events += [
+            (EV_ABS, ABS_X, value),
+            (EV_ABS, ABS_Y, MAX_ABS - value + MIN_ABS),
+            (EV_ABS, ABS_RX, value),
+            (EV_ABS, ABS_Z, index % 256),
+            _syn()
+        ]
+        if index % 32 == 0:
+            events += [(EV_KEY, BTN_A, 1), _syn(), (EV_KEY, BTN_A, 0)]
+        index += 1
+
+    return events[:count]
+
+
+def _wheel_spam_setup(mapping):
+    mapping.change(Key(EV_REL, REL_WHEEL, 1), 'KEY_A')
+    mapping.change(Key(EV_REL, REL_WHEEL, -1), 'KEY_B')
+
+
+def _wheel_spam_events(count):
+    """Free spinning wheels, which don't report any releases."""
+    events = []
+    index = 0
+    while len(events) < count:
+        direction = 1 if index // 50 % 2 == 0 else -1
+        events += [(EV_REL, REL_WHEEL, direction), _syn()]
+        index += 1
+
+    return events[:count]
+
+
+def _macro_storm_setup(mapping):
+    mapping.set('macros.keystroke_sleep_ms', 0)
+    mapping.change(Key(EV_KEY, KEY_A, 1), 'k(KEY_B).k(KEY_C)')
+    mapping.change(Key(EV_KEY, KEY_S, 1), 'r(3, k(KEY_D))')
+    mapping.change(Key(EV_KEY, KEY_D, 1), 'h(k(KEY_E))')
+
+
+def _macro_storm_events(count):
+    """Keys that start macros, pressed again while the macros still run."""
+    keys = [KEY_A, KEY_S, KEY_D, KEY_A]
+    events = []
+    index = 0
+    while len(events) < count:
+        code = keys[index % len(keys)]
+        events += [(EV_KEY, code, 1), _syn(), (EV_KEY, code, 0), _syn()]
+        index += 1
+
+    return events[:count]
+
+
+SCENARIOS = {
+    'keyboard_burst': Scenario(
+        KEYBOARD,
+        _keyboard_burst_setup,
+        _keyboard_burst_events
+    ),
+    'nkro_rollover': Scenario(
+        KEYBOARD,
+        _nkro_rollover_setup,
+        _nkro_rollover_events
+    ),
+    'mouse_motion_8khz': Scenario(
+        MOUSE_DEVICE,
+        _mouse_motion_setup,
+        _mouse_motion_events
+    ),
+    'gamepad_abs_flood': Scenario(
+        GAMEPAD_DEVICE,
+        _gamepad_abs_setup,
+        _gamepad_abs_events
+    ),
+    'wheel_spam': Scenario(
+        MOUSE_DEVICE,
+        _wheel_spam_setup,
+        _wheel_spam_events
+    ),
+    'macro_storm': Scenario(
+        KEYBOARD,
+        _macro_storm_setup,
+        _macro_storm_events
+    ),
+}
+
+
+"""Measuring"""
+
+
+class BenchmarkDevice(InputDevice):
+    """Reports prepared events as fast as the consumer asks for them.
+
+    Measures for each event how long it took until the consumer wanted the
+    next one.
+    """
+    def __init__(self, path, events):
+        super().__init__(path)
+        self.events = events
+        self.latencies = array.array('Q', [0]) * len(events)
+        self.blocks = 0
+        self.end = 0
+        self.done = asyncio.Event()
+
+    async def async_read_loop(self):
+        latencies = self.latencies
+        for index, event in enumerate(self.events):
+            start = time.perf_counter_ns()
+            yield event
+            latencies[index] = time.perf_counter_ns() - start
+            # a real device has to wait for its fd, which allows macros
+            # and the event producer to run
+            await asyncio.sleep(0)
+
+        self.end = time.perf_counter()
+        self.blocks = sys.getallocatedblocks()
+        self.done.set()
+        await asyncio.Event().wait()
+
+
+def _reset():
+    """Forget pressed keys and macros of the previous run."""
+    active_macros.clear()
+    unreleased.clear()
+
+
+def _create_context(scenario):
+    mapping = Mapping()
+    scenario.setup(mapping)
+    context = Context(mapping)
+    context.uinput = ReplayUInput()
+    return context
+
+
+def _create_events(scenario, count):
+    return [
+        new_event(*event_tuple)
+        for event_tuple in scenario.events(count)
+    ]
+
+
+async def _run_keycode_mapper(scenario, events):
+    """Call handle_keycode for each event the consumer would pass to it."""
+    context = _create_context(scenario)
+    source = InputDevice(scenario.path)
+    gamepad = classify(source) == GAMEPAD
+    producer = EventProducer(context)
+    producer.set_abs_range_from(source)
+    purposes = (context.left_purpose, context.right_purpose)
+    events = [
+        event for event in events
+        if not producer.is_handled(event)
+        and should_map_as_btn(event, purposes, gamepad)
+    ]
+    keycode_mapper = KeycodeMapper(context, source, ReplayUInput())
+    latencies = array.array('Q', [0]) * len(events)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    for index, event in enumerate(events):
+        start = time.perf_counter_ns()
+        keycode_mapper.handle_keycode(event)
+        latencies[index] = time.perf_counter_ns() - start
+        # allow started macros to run
+        await asyncio.sleep(0)
+
+    blocks = sys.getallocatedblocks() - blocks
+    return latencies, sum(latencies) / 1e9, blocks
+
+
+async def _run_event_producer(scenario, events):
+    """Do what the EventProducer does for each event of the consumer."""
+    context = _create_context(scenario)
+    producer = EventProducer(context)
+    producer.set_abs_range_from(InputDevice(scenario.path))
+    latencies = array.array('Q', [0]) * len(events)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    for index, event in enumerate(events):
+        start = time.perf_counter_ns()
+        if producer.is_handled(event):
+            producer.notify(event)
+        latencies[index] = time.perf_counter_ns() - start
+
+    blocks = sys.getallocatedblocks() - blocks
+    return latencies, sum(latencies) / 1e9, blocks
+
+
+async def _run_consumer(scenario, events):
+    """Feed the events through the event handling of the Injector."""
+    context = _create_context(scenario)
+    group = groups.find(path=scenario.path)
+    injector = Injector(group, context.mapping, context)
+    source = BenchmarkDevice(scenario.path, events)
+    coroutines = injector.get_coroutines([source], [ReplayUInput()])
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    await source.done.wait()
+
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return source.latencies, source.end - start, source.blocks - blocks
+
+
+RUNNERS = {
+    KEYCODE_MAPPER: _run_keycode_mapper,
+    EVENT_PRODUCER: _run_event_producer,
+    CONSUMER: _run_consumer,
+}
+
+
+def _percentile(sorted_latencies, fraction):
+    index = min(
+        int(fraction * len(sorted_latencies)),
+        len(sorted_latencies) - 1
+    )
+    return sorted_latencies[index] / 1e9
+
+
+def run_benchmark(name, target, count=20000, repeat=3):
+    """Measure how fast the target handles the events of a scenario.
+
+    Returns the Result of the fastest of all repetitions, or None if none
+    of the events of the scenario reach the target.
+
+    Parameters
+    ----------
+    name : str
+        key of SCENARIOS
+    target : str
+        one of KEYCODE_MAPPER, EVENT_PRODUCER or CONSUMER
+    count : int
+        how many events to push through the target
+    repeat : int
+        how often to measure it
+    """
+    scenario = SCENARIOS[name]
+    best = None
+    for _ in range(repeat):
+        _reset()
+        events = _create_events(scenario, count)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        gc.disable()
+        try:
+            latencies, seconds, blocks = loop.run_until_complete(
+                RUNNERS[target](scenario, events)
+            )
+            # cancel macros that are still running
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+            loop.run_until_complete(asyncio.sleep(0))
+        finally:
+            gc.enable()
+            loop.close()
+
+        if len(latencies) == 0:
+            return None
+
+        latencies = sorted(latencies)
+        result = Result(
+            events=len(latencies),
+            events_per_second=len(latencies) / max(seconds, 1e-9),
+            p50=_percentile(latencies, 0.5),
+            p99=_percentile(latencies, 0.99),
+            blocks_per_event=blocks / len(latencies)
+        )
+        if best is None or result.events_per_second > best.events_per_second:
+            best = result
+
+    _reset()
+    return best
+
+
+def compare(results, baseline, tolerance):
+    """Find results that are worse than the baseline.
+
+    Returns a list of human readable descriptions of the regressions.
+
+    Parameters
+    ----------
+    results : dict
+        mapping of "scenario/target" to a dict of the fields of Result
+    baseline : dict
+        the same format as results, from a previous run
+    tolerance : float
+        for example 0.3 to allow results to be 30 % worse
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        previous = baseline[key]
+        for metric in HIGHER_IS_BETTER:
+            if result[metric] < previous[metric] * (1 - tolerance):
+                regressions.append(
+                    f'{key} {metric}: {result[metric]:.0f}, '
+                    f'was {previous[metric]:.0f}'
+                )
+
+        for metric in LOWER_IS_BETTER:
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f'{key} {metric}: {result[metric] * 1e6:.1f} µs, '
+                    f'was {previous[metric] * 1e6:.1f} µs'
+                )
+
+        blocks = result['blocks_per_event']
+        if blocks > previous['blocks_per_event'] + BLOCKS_TOLERANCE:
+            regressions.append(
+                f'{key} blocks_per_event: {blocks:.2f}, '
+                f'was {previous["blocks_per_event"]:.2f}'
+            )
+
+    return regressions
+
+
+def main(argv):
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        'scenarios', nargs='*', metavar='SCENARIO',
+        help=f'Which scenarios to run, all by default: {", ".join(SCENARIOS)}'
+    )
+    parser.add_argument(
+        '--events', action='store', dest='count', type=int, default=20000,
+        help='How many events each scenario pushes through each target'
+    )
+    parser.add_argument(
+        '--repeat', action='store', dest='repeat', type=int, default=3,
+        help='Take the fastest of that many runs'
+    )
+    parser.add_argument(
+        '--baseline', action='store', dest='baseline',
+        default=DEFAULT_BASELINE, metavar='PATH',
+        help='Where the baseline is stored'
+    )
+    parser.add_argument(
+        '--save', action='store_true', dest='save', default=False,
+        help='Store the results as the new baseline'
+    )
+    parser.add_argument(
+        '--tolerance', action='store', dest='tolerance', type=float,
+        default=0.3, help='How much worse results may be, 0.3 being 30 %%'
+    )
+    options = parser.parse_args(argv)
+
+    unknown = [name for name in options.scenarios if name not in SCENARIOS]
+    if len(unknown) > 0:
+        parser.error(f'Unknown scenarios: {", ".join(unknown)}')
+
+    update_verbosity(False)
+    # don't mix the table with infos about the mappings
+    logger.setLevel(logging.WARNING)
+
+    print(
+        f'{"scenario":<20}{"target":<16}{"events/s":>12}'
+        f'{"p50 µs":>10}{"p99 µs":>10}{"blocks/event":>14}'
+    )
+    results = {}
+    for name in options.scenarios or SCENARIOS:
+        for target in TARGETS:
+            result = run_benchmark(
+                name,
+                target,
+                options.count,
+                options.repeat
+            )
+            if result is None:
+                continue
+
+            results[f'{name}/{target}'] = result._asdict()
+            print(
+                f'{name:<20}{target:<16}{result.events_per_second:>12.0f}'
+                f'{result.p50 * 1e6:>10.1f}{result.p99 * 1e6:>10.1f}'
+                f'{result.blocks_per_event:>14.2f}'
+            )
+
+    if options.save:
+        baseline = {}
+        if os.path.exists(options.baseline):
+            with open(options.baseline, 'r') as file:
+                baseline = json.load(file)
+
+        baseline.update(results)
+        os.makedirs(os.path.dirname(options.baseline), exist_ok=True)
+        with open(options.baseline, 'w') as file:
+            json.dump(baseline, file, indent=4)
+
+        print(f'Saved the baseline to "{options.baseline}"')
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print('No baseline to compare to yet, use --save to create one')
+        return 0
+
+    with open(options.baseline, 'r') as file:
+        baseline = json.load(file)
+
+    regressions = compare(results, baseline, options.tolerance)
+    for regression in regressions:
+        print(f'Regression: {regression}')
+
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
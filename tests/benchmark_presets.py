@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+"""Measure how fast presets load from json and from their compiled copy.
+
+Large presets get a compiled copy next to their json when saved, which
+Mapping.load prefers as long as it is up to date.
+
+    python3 -m tests.benchmark_presets
+    python3 -m tests.benchmark_presets --mappings 50000
+"""
+
+
+import os
+import gc
+import sys
+import time
+import shutil
+import logging
+import tempfile
+from argparse import ArgumentParser
+from collections import namedtuple
+
+from evdev.ecodes import EV_KEY, EV_ABS
+
+from keymapper.logger import logger, update_verbosity
+from keymapper.mapping import Mapping
+from keymapper.key import Key
+from keymapper.compiled import get_compiled_path
+
+
+JSON = 'json'
+COMPILED = 'compiled'
+FORMATS = [JSON, COMPILED]
+
+SYMBOLS = ['a', 'KEY_B', 'k(a).k(b)', 'mouse(up, 4)', 'disable', 'ü']
+
+LoadResult = namedtuple('LoadResult', [
+    'mappings',
+    'seconds',
+    'rss',
+])
+
+
+def create_presets(directory, count):
+    """Write a preset with that many mappings in both formats.
+
+    Returns a dict of format to the path of the preset.
+    """
+    mapping = Mapping()
+    for i in range(count):
+        key = Key((EV_KEY, i % 700, 1), (EV_ABS, i // 700, 1 + i % 2))
+        mapping.change(key, SYMBOLS[i % len(SYMBOLS)])
+
+    paths = {
+        JSON: os.path.join(directory, f'{JSON}.json'),
+        COMPILED: os.path.join(directory, f'{COMPILED}.json'),
+    }
+
+    mapping.save(paths[COMPILED])
+    if not os.path.exists(get_compiled_path(paths[COMPILED])):
+        raise ValueError(f'{count} mappings are too few to be compiled')
+
+    shutil.copy(paths[COMPILED], paths[JSON])
+    return paths
+
+
+def _get_rss():
+    """Get the resident memory of this process in bytes."""
+    with open('/proc/self/statm', 'r') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _measure_rss(path):
+    """Get by how many bytes loading the preset grows a fresh process."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            before = _get_rss()
+            mapping = Mapping()
+            mapping.load(path)
+            os.write(write_fd, str(_get_rss() - before).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'r') as file:
+        rss = file.read()
+
+    os.waitpid(pid, 0)
+    return int(rss)
+
+
+def run_load_benchmark(path, repeat=3):
+    """Measure how fast and how memory hungry loading the preset is.
+
+    Returns a LoadResult with the fastest of all repetitions.
+
+    Parameters
+    ----------
+    path : str
+        one of the paths returned by create_presets
+    repeat : int
+        how often to measure it
+    """
+    seconds = None
+    mappings = 0
+    for _ in range(repeat):
+        mapping = Mapping()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            mapping.load(path)
+            duration = time.perf_counter() - start
+        finally:
+            gc.enable()
+
+        mappings = len(mapping)
+        if seconds is None or duration < seconds:
+            seconds = duration
+
+    return LoadResult(
+        mappings=mappings,
+        seconds=seconds,
+        rss=_measure_rss(path)
+    )
+
+
+def main(argv):
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--mappings', action='store', dest='count', type=int, default=20000,
+        help='How many mappings the preset contains'
+    )
+    parser.add_argument(
+        '--repeat', action='store', dest='repeat', type=int, default=3,
+        help='Take the fastest of that many runs'
+    )
+    options = parser.parse_args(argv)
+
+    update_verbosity(False)
+    # don't mix the table with infos about the mappings
+    logger.setLevel(logging.WARNING)
+
+    directory = tempfile.mkdtemp(prefix='key-mapper-benchmark-')
+    try:
+        paths = create_presets(directory, options.count)
+        print(f'{"format":<12}{"mappings":>10}{"load ms":>10}{"rss MiB":>10}')
+        for name in FORMATS:
+            result = run_load_benchmark(paths[name], options.repeat)
+            print(
+                f'{name:<12}{result.mappings:>10}'
+                f'{result.seconds * 1000:>10.1f}'
+                f'{result.rss / 2 ** 20:>10.1f}'
+            )
+    finally:
+        shutil.rmtree(directory)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
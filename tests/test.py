@@ -361,12 +361,14 @@ class InputDevice:
             self.log('no events to read', self.group_key)
             return
 
-        # consume all of them
-        while pending_events[self.group_key][1].poll():
+        # pending events arrive one after the other, so each read only
+        # gets the one that is already there, like the kernel would
+        # provide them.
+        if pending_events[self.group_key][1].poll():
+            time.sleep(EVENT_READ_TIMEOUT)
             event = pending_events[self.group_key][1].recv()
             self.log(event, 'read')
             yield event
-            time.sleep(EVENT_READ_TIMEOUT)
 
     def read_loop(self):
         """Endless loop that yields events."""
@@ -509,6 +511,7 @@ update_verbosity(True)
 from keymapper.injection.injector import Injector
 from keymapper.config import config
 from keymapper.gui.reader import reader
+from keymapper.gui.writer import preset_writer
 from keymapper.groups import groups
 from keymapper.state import system_mapping, custom_mapping
 from keymapper.paths import get_config_path
@@ -550,6 +553,7 @@ def quick_cleanup(log=True):
         pending_events[device] = None
         setup_pipe(device)
 
+    reader.stop_watching()
     try:
         reader.terminate()
     except (BrokenPipeError, OSError):
@@ -568,6 +572,9 @@ def quick_cleanup(log=True):
 
     macro_variables._start()
 
+    # don't write presets of the previous test into the new one
+    preset_writer.clear()
+
     if os.path.exists(tmp):
         shutil.rmtree(tmp)
 
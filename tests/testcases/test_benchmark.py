@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import json
+import unittest
+
+from tests.test import quick_cleanup, tmp
+from tests.benchmark import run_benchmark, compare, main, SCENARIOS, \
+    TARGETS, KEYCODE_MAPPER, CONSUMER
+from tests import benchmark_presets
+
+from keymapper.logger import update_verbosity
+from keymapper.compiled import COMPILE_THRESHOLD
+from keymapper.injection.keycode_mapper import active_macros, unreleased
+
+
+class TestBenchmark(unittest.TestCase):
+    def tearDown(self):
+        # main() makes the logs quieter
+        update_verbosity(True)
+        quick_cleanup()
+
+    def test_run_benchmark(self):
+        # the benchmark shouldn't rot
+        for name in SCENARIOS:
+            for target in TARGETS:
+                result = run_benchmark(name, target, count=100, repeat=1)
+                if name == 'mouse_motion_8khz' and target == KEYCODE_MAPPER:
+                    # nothing of that is mapped as button
+                    self.assertIsNone(result)
+                    continue
+
+                self.assertGreater(result.events, 0)
+                self.assertLessEqual(result.events, 100)
+                self.assertGreater(result.events_per_second, 0)
+                self.assertLessEqual(result.p50, result.p99)
+
+                self.assertEqual(len(unreleased), 0)
+                self.assertEqual(len(active_macros), 0)
+
+        result = run_benchmark('keyboard_burst', CONSUMER, 100, 1)
+        self.assertEqual(result.events, 100)
+
+    def test_compare(self):
+        baseline = {
+            'foo/consumer': {
+                'events_per_second': 1000,
+                'p50': 0.001,
+                'p99': 0.002,
+                'blocks_per_event': 0,
+            }
+        }
+
+        results = {
+            'foo/consumer': {
+                'events_per_second': 800,
+                'p50': 0.0012,
+                'p99': 0.002,
+                'blocks_per_event': 0.05,
+            },
+            'bar/consumer': {
+                'events_per_second': 1,
+                'p50': 1,
+                'p99': 1,
+                'blocks_per_event': 1,
+            }
+        }
+        self.assertEqual(compare(results, baseline, 0.3), [])
+
+        results['foo/consumer']['events_per_second'] = 600
+        results['foo/consumer']['p99'] = 0.003
+        results['foo/consumer']['blocks_per_event'] = 0.5
+        regressions = compare(results, baseline, 0.3)
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('events_per_second', regressions[0])
+        self.assertIn('p99', regressions[1])
+        self.assertIn('blocks_per_event', regressions[2])
+
+    def test_main(self):
+        path = os.path.join(tmp, 'benchmark.json')
+        args = ['wheel_spam', '--events', '50', '--repeat', '1']
+        self.assertEqual(main(args + ['--baseline', path, '--save']), 0)
+
+        with open(path, 'r') as file:
+            baseline = json.load(file)
+
+        self.assertIn('wheel_spam/consumer', baseline)
+        self.assertNotIn('macro_storm/consumer', baseline)
+
+        # nothing can be that fast
+        for result in baseline.values():
+            result['events_per_second'] = 10 ** 12
+        with open(path, 'w') as file:
+            json.dump(baseline, file)
+
+        self.assertEqual(main(args + ['--baseline', path]), 1)
+
+
+class TestPresetBenchmark(unittest.TestCase):
+    def tearDown(self):
+        update_verbosity(True)
+        quick_cleanup()
+
+    def test_run_load_benchmark(self):
+        paths = benchmark_presets.create_presets(tmp, COMPILE_THRESHOLD)
+        for name in benchmark_presets.FORMATS:
+            result = benchmark_presets.run_load_benchmark(paths[name], 1)
+            self.assertEqual(result.mappings, COMPILE_THRESHOLD)
+            self.assertGreater(result.seconds, 0)
+            self.assertGreater(result.rss, 0)
+
+    def test_main(self):
+        args = ['--mappings', str(COMPILE_THRESHOLD), '--repeat', '1']
+        self.assertEqual(benchmark_presets.main(args), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import os
+import json
+import unittest
+
+from evdev.ecodes import EV_KEY, EV_REL, KEY_A, KEY_B, BTN_MOUSE
+
+from keymapper.mapping import Mapping
+from keymapper.key import Key
+from keymapper.config import MOUSE
+from keymapper.state import system_mapping
+from keymapper.injection.compile_report import compile_report, \
+    format_report
+
+from tests.test import quick_cleanup, tmp
+
+
+class TestCompileReport(unittest.TestCase):
+    def setUp(self):
+        system_mapping.clear()
+        system_mapping._set('a', KEY_A)
+        system_mapping._set('b', KEY_B)
+
+    def tearDown(self):
+        quick_cleanup()
+
+    def test_compile_report(self):
+        mapping = Mapping()
+        mapping.change(Key(EV_KEY, 1, 1), 'a')
+        combination = Key((EV_KEY, 2, 1), (EV_KEY, 3, 1), (EV_KEY, 4, 1))
+        mapping.change(combination, 'b')
+        mapping.change(Key(EV_KEY, 5, 1), 'k(a).r(2, k(b))')
+        mapping.set('gamepad.joystick.left_purpose', MOUSE)
+
+        report = compile_report(mapping)
+        self.assertEqual(report.mappings, 3)
+        # both orders of the first two keys of the combination
+        self.assertEqual(report.key_to_code, 3)
+        self.assertEqual(report.macros, 1)
+        self.assertEqual(report.max_permutations, 2)
+        self.assertEqual(report.longest_combination, 3)
+        self.assertGreater(report.macro_tasks, 0)
+        self.assertEqual(report.max_macro_tasks, report.macro_tasks)
+        self.assertIn(KEY_A, report.capabilities[EV_KEY])
+        self.assertIn(KEY_B, report.capabilities[EV_KEY])
+        self.assertIn(BTN_MOUSE, report.capabilities[EV_KEY])
+        self.assertIn(EV_REL, report.capabilities)
+        self.assertGreater(report.memory, 0)
+        self.assertGreaterEqual(report.peak_memory, report.memory)
+        self.assertGreater(report.seconds, 0)
+        self.assertEqual(report.errors, [])
+
+        lines = format_report(report)
+        self.assertIn('mappings', lines[0])
+        self.assertIn('EV_REL', '\n'.join(lines))
+        self.assertNotIn('error', '\n'.join(lines))
+
+    def test_errors(self):
+        mapping = Mapping()
+        mapping.change(Key(EV_KEY, 1, 1), 'a')
+        mapping.change(Key(EV_KEY, 2, 1), 'foo')
+        mapping.change(Key(EV_KEY, 3, 1), 'k(foo)')
+
+        report = compile_report(mapping)
+        self.assertEqual(report.key_to_code, 1)
+        self.assertEqual(report.macros, 0)
+        self.assertEqual(len(report.errors), 2)
+        self.assertIn('Unknown symbol "foo"', report.errors[0])
+        self.assertIn('Failed to parse "k(foo)"', report.errors[1])
+
+        lines = format_report(report)
+        self.assertEqual(len([l for l in lines if l.startswith('error')]), 2)
+
+    def test_xmodmap_file(self):
+        # the symbols of the session are replaced with those of the file,
+        # just like the service only knows the file
+        path = os.path.join(tmp, 'xmodmap.json')
+        with open(path, 'w') as file:
+            json.dump({'foo': 50}, file)
+
+        mapping = Mapping()
+        mapping.change(Key(EV_KEY, 1, 1), 'foo')
+        mapping.change(Key(EV_KEY, 2, 1), 'a')
+        mapping.change(Key(EV_KEY, 3, 1), 'KEY_B')
+
+        report = compile_report(mapping, path)
+        self.assertEqual(report.key_to_code, 2)
+        self.assertEqual(len(report.errors), 1)
+        self.assertIn('Unknown symbol "a"', report.errors[0])
+        self.assertEqual(system_mapping.get('foo'), 50)
+
+        with self.assertRaises(FileNotFoundError):
+            compile_report(mapping, os.path.join(tmp, 'bar.json'))
+
+    def test_permutations(self):
+        mapping = Mapping()
+        combination = Key(*[(EV_KEY, code, 1) for code in range(1, 6)])
+        mapping.change(combination, 'a')
+        report = compile_report(mapping)
+        self.assertEqual(report.max_permutations, 24)
+
+    def test_empty(self):
+        report = compile_report(Mapping())
+        self.assertEqual(report.mappings, 0)
+        self.assertEqual(report.longest_combination, 0)
+        self.assertEqual(report.max_permutations, 0)
+        self.assertEqual(report.errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import os
+import unittest
+
+from evdev.ecodes import EV_KEY, EV_ABS
+
+from keymapper.mapping import Mapping
+from keymapper.paths import get_preset_path
+from keymapper.presets import delete_preset, rename_preset
+from keymapper.key import Key
+from keymapper.compiled import get_compiled_path, compile_preset, \
+    load_compiled, COMPILE_THRESHOLD, HEADER
+
+from tests.test import quick_cleanup
+
+
+def create_mapping(count):
+    mapping = Mapping()
+    for i in range(count):
+        key = Key((EV_KEY, i % 700, 1), (EV_ABS, i // 700, -1))
+        mapping.change(key, f'k({i}).ü')
+
+    return mapping
+
+
+class TestCompiled(unittest.TestCase):
+    def setUp(self):
+        self.path = get_preset_path('Foo Device', 'test')
+        self.compiled_path = get_compiled_path(self.path)
+
+    def tearDown(self):
+        quick_cleanup()
+
+    def test_get_compiled_path(self):
+        self.assertEqual(
+            get_compiled_path('/a/b/c.json'),
+            '/a/b/.c.json.compiled'
+        )
+
+    def test_save_load(self):
+        mapping = create_mapping(COMPILE_THRESHOLD)
+        mapping.change(Key(EV_KEY, 1000, 1), 'a')
+        mapping._config['foo'] = {'bar': 1}
+        mapping.save(self.path)
+        self.assertTrue(os.path.exists(self.compiled_path))
+
+        compiled_mapping, compiled_config = load_compiled(self.path)
+        self.assertEqual(compiled_config, {'foo': {'bar': 1}})
+        self.assertEqual(compiled_mapping, dict(mapping))
+
+        loaded = Mapping()
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), COMPILE_THRESHOLD + 1)
+        self.assertEqual(loaded.num_saved_keys, COMPILE_THRESHOLD + 1)
+        self.assertFalse(loaded.changed)
+        self.assertEqual(loaded.get_symbol(Key(EV_KEY, 1000, 1)), 'a')
+        self.assertEqual(
+            loaded.get_symbol(Key((EV_KEY, 3, 1), (EV_ABS, 1, -1))),
+            'k(703).ü'
+        )
+        self.assertEqual(loaded.get('foo.bar'), 1)
+        for key, _ in loaded:
+            self.assertEqual(key.release, (*key[-1][:2], 0))
+
+    def test_small_preset(self):
+        mapping = create_mapping(COMPILE_THRESHOLD)
+        mapping.save(self.path)
+        self.assertTrue(os.path.exists(self.compiled_path))
+
+        mapping.clear(Key((EV_KEY, 0, 1), (EV_ABS, 0, -1)))
+        mapping.save(self.path)
+        self.assertFalse(os.path.exists(self.compiled_path))
+
+        loaded = Mapping()
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), COMPILE_THRESHOLD - 1)
+
+    def test_outdated(self):
+        mapping = create_mapping(COMPILE_THRESHOLD)
+        mapping.save(self.path)
+
+        # edited by hand
+        with open(self.path, 'r') as file:
+            content = file.read()
+        with open(self.path, 'w') as file:
+            file.write(content.replace('k(0).', 'k(-1).'))
+
+        self.assertIsNone(load_compiled(self.path))
+        loaded = Mapping()
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), COMPILE_THRESHOLD)
+        self.assertEqual(
+            loaded.get_symbol(Key((EV_KEY, 0, 1), (EV_ABS, 0, -1))),
+            'k(-1).ü'
+        )
+
+    def test_broken(self):
+        mapping = create_mapping(COMPILE_THRESHOLD)
+        mapping.save(self.path)
+
+        with open(self.compiled_path, 'rb') as file:
+            data = file.read()
+
+        for broken in [b'', b'foo' * 100, data[:HEADER.size], data[:-1]]:
+            with open(self.compiled_path, 'wb') as file:
+                file.write(broken)
+
+            self.assertRaises(ValueError, lambda: load_compiled(self.path))
+
+            # falls back to the json
+            loaded = Mapping()
+            loaded.load(self.path)
+            self.assertEqual(len(loaded), COMPILE_THRESHOLD)
+
+    def test_compile_preset(self):
+        mapping = Mapping()
+        mapping.change(Key(EV_KEY, -1, 1), 'a')
+        self.assertRaises(
+            ValueError,
+            lambda: compile_preset(mapping.dumps(), mapping, {})
+        )
+
+    def test_delete_rename(self):
+        mapping = create_mapping(COMPILE_THRESHOLD)
+        mapping.save(self.path)
+
+        rename_preset('Foo Device', 'test', 'bar')
+        self.assertFalse(os.path.exists(self.compiled_path))
+        new_path = get_preset_path('Foo Device', 'bar')
+        self.assertIsNotNone(load_compiled(new_path))
+
+        delete_preset('Foo Device', 'bar')
+        self.assertFalse(os.path.exists(get_compiled_path(new_path)))
+        self.assertFalse(os.path.exists(get_preset_path('Foo Device')))
+
+
+if __name__ == "__main__":
+    unittest.main()
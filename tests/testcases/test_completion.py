@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from keymapper.state import SystemMapping, system_mapping
+from keymapper.gui.completion import SymbolIndex, symbol_index, LIMIT, \
+    EXTRA_NAMES
+
+from tests.test import quick_cleanup
+
+
+class TestCompletion(unittest.TestCase):
+    def setUp(self):
+        self.mapping = SystemMapping()
+        self.mapping.clear()
+        for code, name in enumerate([
+            'a', 'A', 'Alt_L', 'KEY_A', 'KEY_AB', 'BTN_A', 'Caps_Lock',
+            'KEY_CAPSLOCK', 'space', 'BackSpace', 'KEY_BACKSPACE'
+        ]):
+            self.mapping._set(name, code)
+
+    def tearDown(self):
+        quick_cleanup()
+
+    def test_search(self):
+        index = SymbolIndex(self.mapping, extra_names=[])
+        self.assertEqual(index.search(''), [])
+        self.assertEqual(index.search('foo'), [])
+
+        # exact matches, then prefixes, then shorter ones
+        self.assertEqual(index.search('a')[:3], ['A', 'a', 'Alt_L'])
+        self.assertEqual(index.search('key_a'), ['KEY_A', 'KEY_AB'])
+        self.assertEqual(index.search('KEY_A', limit=1), ['KEY_A'])
+
+        self.assertEqual(
+            index.search('space'),
+            ['space', 'BackSpace', 'KEY_BACKSPACE']
+        )
+        self.assertEqual(index.search('CAPS'), ['Caps_Lock', 'KEY_CAPSLOCK'])
+        self.assertEqual(index.search('acks'), ['BackSpace', 'KEY_BACKSPACE'])
+        self.assertEqual(index.search('ackspa_'), [])
+
+    def test_same_as_filtering(self):
+        # same results as filtering all names one by one
+        names = list(system_mapping.list_names()) + EXTRA_NAMES
+        for query in ['k', 'ey_', 'key_f1', 'btn_', 'mouse(', 'z', '_l']:
+            expected = sorted(
+                name for name in names
+                if query in name.lower()
+            )
+            result = symbol_index.search(query, limit=len(names))
+            self.assertEqual(sorted(result), expected)
+            self.assertLessEqual(len(symbol_index.search(query)), LIMIT)
+
+    def test_rebuild(self):
+        index = SymbolIndex(self.mapping, extra_names=['wheel(up, 1)'])
+        self.assertEqual(index.search('foo'), [])
+        self.assertEqual(index.search('wheel'), ['wheel(up, 1)'])
+
+        self.mapping._set('Foo', 100)
+        self.assertEqual(index.search('foo'), ['Foo'])
+
+        self.mapping.clear()
+        self.assertEqual(index.search('foo'), [])
+        self.assertEqual(index.search('wheel'), ['wheel(up, 1)'])
+
+
+if __name__ == "__main__":
+    unittest.main()
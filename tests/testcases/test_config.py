@@ -22,7 +22,7 @@
 import os
 import unittest
 
-from keymapper.config import config, GlobalConfig
+from keymapper.config import config, GlobalConfig, ConfigBase
 from keymapper.paths import touch, CONFIG_PATH
 
 from tests.test import quick_cleanup, tmp
@@ -164,6 +164,50 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config.get("a"), "b")
         self.assertEqual(config.get(["a"]), "b")
 
+    def test_cache(self):
+        child = ConfigBase(fallback=config)
+        self.assertEqual(child.get('macros.keystroke_sleep_ms'), 10)
+
+        config.set('macros.keystroke_sleep_ms', 20)
+        self.assertEqual(child.get('macros.keystroke_sleep_ms'), 20)
+
+        child.set('macros.keystroke_sleep_ms', 30)
+        self.assertEqual(child.get('macros.keystroke_sleep_ms'), 30)
+        self.assertEqual(child.get(['macros', 'keystroke_sleep_ms']), 30)
+
+        child.remove('macros.keystroke_sleep_ms')
+        self.assertEqual(child.get('macros.keystroke_sleep_ms'), 20)
+
+        child.set('macros.keystroke_sleep_ms', 40)
+        child.clear_config()
+        self.assertEqual(child.get('macros.keystroke_sleep_ms'), 20)
+
+        # modifying returned values doesn't modify the config
+        child.set('a', {'b': 1})
+        child.get('a')['b'] = 2
+        self.assertEqual(child.get('a'), {'b': 1})
+
+        # dots in lists are not splitting chunks
+        child.set(['c.d'], 1)
+        self.assertIsNone(child.get('c.d', log_unknown=False))
+        self.assertEqual(child.get(['c.d']), 1)
+
+    def test_snapshot(self):
+        child = ConfigBase(fallback=config)
+        child.set('a', {'b': 1})
+        paths = ['a', 'a.b', 'gamepad.joystick.non_linearity']
+        snapshot = child.snapshot(paths)
+        self.assertEqual(snapshot, {
+            'a': {'b': 1},
+            'a.b': 1,
+            'gamepad.joystick.non_linearity': 4
+        })
+
+        snapshot['a']['b'] = 2
+        child.set('a.b', 3)
+        self.assertEqual(child.get('a.b'), 3)
+        self.assertEqual(snapshot['a.b'], 1)
+
 
 if __name__ == "__main__":
     unittest.main()
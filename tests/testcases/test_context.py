@@ -38,13 +38,20 @@ class TestContext(unittest.TestCase):
         self.mapping.change(Key((1, 33, 1), (1, 34, 1), (1, 35, 1)), 'c')
         self.context = Context(self.mapping)
 
-    def test_update_purposes(self):
+    def test_update_settings(self):
         self.mapping.set('gamepad.joystick.left_purpose', BUTTONS)
         self.mapping.set('gamepad.joystick.right_purpose', MOUSE)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertEqual(self.context.left_purpose, BUTTONS)
         self.assertEqual(self.context.right_purpose, MOUSE)
 
+        self.assertEqual(self.context.pointer_speed, 80)
+        self.mapping.set('gamepad.joystick.pointer_speed', 10)
+        self.assertEqual(self.context.pointer_speed, 80)
+        self.context.update_settings()
+        self.assertEqual(self.context.pointer_speed, 10)
+        self.assertEqual(self.context.trace_size, 0)
+
     def test_parse_macros(self):
         self.assertEqual(len(self.context.macros), 1)
         self.assertEqual(self.context.macros[((1, 31, 1),)].code, 'k(a)')
@@ -79,7 +86,7 @@ class TestContext(unittest.TestCase):
         self.assertTrue(self.context.maps_joystick())
         self.mapping.set('gamepad.joystick.left_purpose', NONE)
         self.mapping.set('gamepad.joystick.right_purpose', NONE)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertFalse(self.context.maps_joystick())
 
     def test_joystick_as_dpad(self):
@@ -87,33 +94,33 @@ class TestContext(unittest.TestCase):
 
         self.mapping.set('gamepad.joystick.left_purpose', WHEEL)
         self.mapping.set('gamepad.joystick.right_purpose', MOUSE)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertFalse(self.context.joystick_as_dpad())
 
         self.mapping.set('gamepad.joystick.left_purpose', BUTTONS)
         self.mapping.set('gamepad.joystick.right_purpose', NONE)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertTrue(self.context.joystick_as_dpad())
 
         self.mapping.set('gamepad.joystick.left_purpose', MOUSE)
         self.mapping.set('gamepad.joystick.right_purpose', BUTTONS)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertTrue(self.context.joystick_as_dpad())
 
     def test_joystick_as_mouse(self):
         self.assertTrue(self.context.maps_joystick())
 
         self.mapping.set('gamepad.joystick.right_purpose', MOUSE)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertTrue(self.context.joystick_as_mouse())
 
         self.mapping.set('gamepad.joystick.left_purpose', NONE)
         self.mapping.set('gamepad.joystick.right_purpose', NONE)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertFalse(self.context.joystick_as_mouse())
 
         self.mapping.set('gamepad.joystick.right_purpose', BUTTONS)
-        self.context.update_purposes()
+        self.context.update_settings()
         self.assertFalse(self.context.joystick_as_mouse())
 
     def test_writes_keys(self):
@@ -23,8 +23,10 @@
 
 
 import os
+import io
 import time
 import unittest
+from contextlib import redirect_stdout
 from unittest import mock
 import collections
 from importlib.util import spec_from_loader, module_from_spec
@@ -104,8 +106,9 @@ class TestControl(unittest.TestCase):
 
         communicate(options('autoload', None, None, None, False, False, False), daemon)
         self.assertEqual(len(start_history), 2)
-        self.assertEqual(start_history[0], (groups_[0].key, presets[0]))
-        self.assertEqual(start_history[1], (groups_[1].key, presets[1]))
+        # started concurrently, so the order is not fixed
+        self.assertIn((groups_[0].key, presets[0]), start_history)
+        self.assertIn((groups_[1].key, presets[1]), start_history)
         self.assertIn(groups_[0].key, daemon.injectors)
         self.assertIn(groups_[1].key, daemon.injectors)
         self.assertFalse(daemon.autoload_history.may_autoload(groups_[0].key, presets[0]))
@@ -183,8 +186,27 @@ class TestControl(unittest.TestCase):
         communicate(options('autoload', config_dir, None, None, False, False, False), daemon)
 
         self.assertEqual(len(start_history), 2)
-        self.assertEqual(start_history[0], (groups_[0].key, presets[0]))
-        self.assertEqual(start_history[1], (groups_[1].key, presets[1]))
+        self.assertIn((groups_[0].key, presets[0]), start_history)
+        self.assertIn((groups_[1].key, presets[1]), start_history)
+
+    def test_autoload_report(self):
+        daemon = Daemon()
+        daemon.get_autoload_report = lambda: {
+            'Foo Device 2': {'refresh': 0.1, 'load_preset': 0.0025},
+            'Bar Device': {}
+        }
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            communicate(options('autoload-report', None, None, None, False, False, False), daemon)
+
+        lines = output.getvalue().split('\n')
+        self.assertEqual(lines[0], 'Foo Device 2')
+        self.assertEqual(lines[1].split(), ['refresh', '100.0', 'ms'])
+        self.assertEqual(lines[2].split(), ['load_preset', '2.5', 'ms'])
+        self.assertEqual(lines[3].split(), ['total', '102.5', 'ms'])
+        self.assertEqual(lines[4], 'Bar Device')
+        self.assertEqual(lines[5].split(), ['total', '0.0', 'ms'])
 
     def test_start_stop(self):
         group = groups.find(key='Foo Device 2')
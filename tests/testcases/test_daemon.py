@@ -25,11 +25,14 @@ import unittest
 import time
 import subprocess
 import json
+import threading
+from unittest import mock
 
 import evdev
 from evdev.ecodes import EV_KEY, EV_ABS
-from gi.repository import Gtk
+from gi.repository import Gtk, Gio, GLib
 from pydbus import SystemBus
+from pydbus.registration import ObjectWrapper
 
 from keymapper.state import custom_mapping, system_mapping
 from keymapper.config import config
@@ -38,7 +41,8 @@ from keymapper.paths import get_config_path, mkdir, get_preset_path
 from keymapper.key import Key
 from keymapper.mapping import Mapping
 from keymapper.injection.injector import STARTING, RUNNING, STOPPED, UNKNOWN
-from keymapper.daemon import Daemon, BUS_NAME
+from keymapper.daemon import Daemon, PresetCache, Workers, \
+    _DaemonObjectWrapper, BUS_NAME, OBJECT_PATH
 
 from tests.test import cleanup, uinput_write_history_pipe, new_event, \
     push_events, is_service_running, fixtures, tmp
@@ -399,6 +403,376 @@ class TestDaemon(unittest.TestCase):
         self.assertEqual(daemon.injectors[group.key].get_state(), STOPPED)
         self.assertTrue(daemon.autoload_history.may_autoload(group.key, preset))
 
+    def test_get_timings(self):
+        group = groups.find(key='Foo Device 2')
+        preset = 'preset8'
+
+        mapping = Mapping()
+        mapping.change(Key(3, 2, 1), 'a')
+        mapping.save(group.get_preset_path(preset))
+        config.save_config()
+
+        self.daemon = Daemon()
+        self.assertEqual(self.daemon.get_timings(group.key), {})
+        self.daemon.set_config_dir(get_config_path())
+        self.daemon.start_injecting(group.key, preset)
+
+        # the steps of the service are known right away
+        timings = self.daemon.get_timings(group.key)
+        for step in ['load_xmodmap', 'load_preset', 'start_process']:
+            self.assertGreaterEqual(timings[step], 0)
+
+        # the injection reports its steps together with its state
+        for _ in range(10):
+            time.sleep(0.1)
+            if self.daemon.get_state(group.key) != STARTING:
+                break
+
+        timings = self.daemon.get_timings(group.key)
+        for step in ['context', 'grab', 'numlock', 'uinput']:
+            self.assertGreaterEqual(timings[step], 0)
+
+    def test_preset_cache(self):
+        group = groups.find(key='Foo Device 2')
+        preset = 'preset9'
+
+        mapping = Mapping()
+        mapping.change(Key(3, 2, 1), 'a')
+        mapping.save(group.get_preset_path(preset))
+
+        config.save_config()
+        daemon = Daemon()
+        self.daemon = daemon
+        daemon.set_config_dir(get_config_path())
+
+        load_calls = []
+        original_load = Mapping.load
+
+        def load(mapping, path):
+            load_calls.append(path)
+            original_load(mapping, path)
+
+        Mapping.load = load
+
+        try:
+            daemon.start_injecting(group.key, preset)
+            self.assertEqual(len(load_calls), 1)
+            context = daemon.injectors[group.key].context
+
+            # starting it again uses the compiled preset of the cache
+            daemon.start_injecting(group.key, preset)
+            self.assertEqual(len(load_calls), 1)
+            self.assertIs(daemon.injectors[group.key].context, context)
+            self.assertEqual(len(daemon.preset_cache), 1)
+
+            # the preset changed
+            mapping.change(Key(3, 2, 1), 'b')
+            mapping.save(group.get_preset_path(preset))
+            daemon.start_injecting(group.key, preset)
+            self.assertEqual(len(load_calls), 2)
+            self.assertIsNot(daemon.injectors[group.key].context, context)
+            context = daemon.injectors[group.key].context
+            # the outdated version was removed
+            self.assertEqual(len(daemon.preset_cache), 1)
+
+            # the keyboard layout changed
+            xmodmap_path = os.path.join(get_config_path(), 'xmodmap.json')
+            with open(xmodmap_path, 'w') as file:
+                file.write('{"qux": 100}')
+            daemon.start_injecting(group.key, preset)
+            self.assertEqual(len(load_calls), 3)
+            self.assertIsNot(daemon.injectors[group.key].context, context)
+            self.assertEqual(system_mapping.get('qux'), 100)
+        finally:
+            Mapping.load = original_load
+
+    def test_preset_cache_size(self):
+        cache = PresetCache(size=2)
+        cache.put(('a', 1, 1, None), 'context a')
+        cache.put(('b', 1, 1, None), 'context b')
+        self.assertEqual(cache.get(('a', 1, 1, None)), 'context a')
+
+        # b is the least recently used one
+        cache.put(('c', 1, 1, None), 'context c')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(('b', 1, 1, None)))
+        self.assertEqual(cache.get(('c', 1, 1, None)), 'context c')
+
+        # a newer version of a replaces the old one
+        cache.put(('a', 2, 1, None), 'context a2')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(('a', 1, 1, None)))
+        self.assertEqual(cache.get(('a', 2, 1, None)), 'context a2')
+
+    def test_state_changed(self):
+        group = groups.find(name='Bar Device')
+        preset = 'foo'
+        custom_mapping.change(Key(EV_KEY, 9, 1), 'a')
+        custom_mapping.save(group.get_preset_path(preset))
+
+        self.daemon = Daemon()
+        self.daemon.set_config_dir(get_config_path())
+
+        states = []
+
+        def on_state_changed(group_key, state):
+            states.append((group_key, state))
+
+        self.daemon.state_changed.connect(on_state_changed)
+
+        self.daemon.start_injecting(group.key, preset)
+        self.assertEqual(states, [(group.key, STARTING)])
+
+        # the process reports its progress via the main loop
+        for _ in range(20):
+            time.sleep(0.05)
+            gtk_iteration()
+            if len(states) > 1:
+                break
+
+        self.assertEqual(states, [(group.key, STARTING), (group.key, RUNNING)])
+
+        # asking for the state doesn't emit anything again
+        self.assertEqual(self.daemon.get_state(group.key), RUNNING)
+        gtk_iteration()
+        self.assertEqual(len(states), 2)
+
+        self.daemon.stop_injecting(group.key)
+        self.assertEqual(states[-1], (group.key, STOPPED))
+
+        # the process exits, which doesn't change anything anymore
+        time.sleep(0.2)
+        gtk_iteration()
+        self.assertEqual(len(states), 3)
+
+    def test_state_changed_after_request(self):
+        group = groups.find(name='Bar Device')
+        preset = 'foo'
+        custom_mapping.change(Key(EV_KEY, 9, 1), 'a')
+        custom_mapping.save(group.get_preset_path(preset))
+
+        self.daemon = Daemon()
+        self.daemon.set_config_dir(get_config_path())
+
+        states = []
+
+        def on_state_changed(group_key, state):
+            states.append((group_key, state))
+
+        self.daemon.state_changed.connect(on_state_changed)
+
+        self.daemon.start_injecting(group.key, preset)
+        self.assertEqual(states, [(group.key, STARTING)])
+
+        # a worker thread reads the message that finishes starting before
+        # the main loop gets to it
+        injector = self.daemon.injectors[group.key]
+        for _ in range(20):
+            time.sleep(0.05)
+            self.daemon.get_stats(group.key)
+            if injector.get_state() == RUNNING:
+                break
+
+        gtk_iteration()
+        self.assertEqual(states, [(group.key, STARTING), (group.key, RUNNING)])
+
+    def test_workers(self):
+        workers = Workers(max_workers=2)
+        calls = []
+        both_started = threading.Barrier(2, timeout=2)
+
+        def task(key, number):
+            calls.append((key, number, 'start'))
+            if number == 0:
+                # the first task of both keys has to run at the same time
+                both_started.wait()
+            time.sleep(0.01)
+            calls.append((key, number, 'end'))
+
+        for number in range(3):
+            workers.submit('a', task, 'a', number)
+            workers.submit('b', task, 'b', number)
+
+        self.assertTrue(workers.join(timeout=2))
+        self.assertEqual(len(calls), 12)
+
+        # tasks of the same key ran one after the other in order
+        for key in ['a', 'b']:
+            self.assertEqual(
+                [call[1:] for call in calls if call[0] == key],
+                [
+                    (0, 'start'), (0, 'end'),
+                    (1, 'start'), (1, 'end'),
+                    (2, 'start'), (2, 'end'),
+                ]
+            )
+
+        # failing tasks don't stop the queue
+        def fail():
+            raise ValueError('foo')
+
+        workers.submit('a', fail)
+        workers.submit('a', task, 'a', 3)
+        self.assertTrue(workers.join(timeout=2))
+        self.assertEqual(calls[-1], ('a', 3, 'end'))
+
+    def test_workers_exclusive(self):
+        workers = Workers(max_workers=4)
+        calls = []
+
+        def task(name):
+            calls.append((name, 'start'))
+            time.sleep(0.02)
+            calls.append((name, 'end'))
+
+        workers.submit('a', task, 'a1')
+        workers.submit('b', task, 'b1')
+        workers.submit_exclusive(task, 'all')
+        workers.submit('a', task, 'a2')
+        workers.submit('c', task, 'c1')
+        self.assertTrue(workers.join(timeout=2))
+
+        index = calls.index(('all', 'start'))
+        # everything before it is done, nothing else started meanwhile
+        self.assertEqual(
+            sorted(calls[:index]),
+            sorted([
+                ('a1', 'start'), ('a1', 'end'),
+                ('b1', 'start'), ('b1', 'end')
+            ])
+        )
+        self.assertEqual(calls[index + 1], ('all', 'end'))
+        self.assertEqual(len(calls), 10)
+
+    def test_get_worker_key(self):
+        group = groups.find(key='Foo Device 2')
+        path = group.paths[0]
+        self.assertIsNone(Daemon.get_worker_key('stop_all', ()))
+        self.assertIsNone(Daemon.get_worker_key('autoload', ()))
+        self.assertEqual(
+            Daemon.get_worker_key('start_injecting', (group.key, 'a')),
+            group.key
+        )
+        # the same queue as starting and stopping it by hand
+        self.assertEqual(
+            Daemon.get_worker_key('autoload_single', (path,)),
+            group.key
+        )
+        self.assertEqual(
+            Daemon.get_worker_key('autoload_single', ('/dev/input/foo',)),
+            '/dev/input/foo'
+        )
+
+    def test_slow_dbus_methods(self):
+        class Invocation:
+            def __init__(self):
+                self.returned = threading.Event()
+                self.value = None
+
+            def return_value(self, value):
+                self.value = value
+                self.returned.set()
+
+        daemon = Daemon()
+        self.daemon = daemon
+        node_info = Gio.DBusNodeInfo.new_for_xml(daemon.dbus)
+        wrapper = _DaemonObjectWrapper(daemon, node_info.interfaces)
+
+        started = threading.Event()
+        proceed = threading.Event()
+
+        def start_injecting(group_key, preset):
+            started.set()
+            proceed.wait(timeout=2)
+            return True
+
+        daemon.start_injecting = start_injecting
+
+        def call(method_name, signature, args):
+            invocation = Invocation()
+            wrapper.call_method(
+                None, None, OBJECT_PATH, BUS_NAME, method_name,
+                GLib.Variant(signature, args), invocation
+            )
+            return invocation
+
+        start_invocation = call('start_injecting', '(ss)', ('foo', 'bar'))
+        self.assertTrue(started.wait(timeout=2))
+        self.assertFalse(start_invocation.returned.is_set())
+
+        # fast methods are answered while start_injecting is busy
+        hello_invocation = call('hello', '(s)', ('baz',))
+        self.assertTrue(hello_invocation.returned.is_set())
+        self.assertEqual(hello_invocation.value.unpack(), ('baz',))
+
+        proceed.set()
+        self.assertTrue(start_invocation.returned.wait(timeout=2))
+        self.assertEqual(start_invocation.value.unpack(), (True,))
+
+    def test_slow_dbus_method_fails(self):
+        class Invocation:
+            def __init__(self):
+                self.returned = threading.Event()
+                self.error = None
+
+            def return_dbus_error(self, name, message):
+                self.error = (name, message)
+                self.returned.set()
+
+        daemon = Daemon()
+        self.daemon = daemon
+        node_info = Gio.DBusNodeInfo.new_for_xml(daemon.dbus)
+        wrapper = _DaemonObjectWrapper(daemon, node_info.interfaces)
+
+        invocation = Invocation()
+        error = RuntimeError('foo')
+        with mock.patch.object(
+            ObjectWrapper, 'call_method', side_effect=error
+        ):
+            wrapper.call_method(
+                None, None, OBJECT_PATH, BUS_NAME, 'stop_all',
+                GLib.Variant('()', ()), invocation
+            )
+            self.assertTrue(invocation.returned.wait(timeout=2))
+
+        self.assertEqual(
+            invocation.error,
+            (f'{BUS_NAME}.Error.RuntimeError', 'foo')
+        )
+        # the queue keeps working
+        self.assertTrue(daemon.workers.join(timeout=2))
+
+    def test_slow_dbus_method_replies_once(self):
+        class Invocation:
+            def __init__(self):
+                self.replies = []
+
+            def return_value(self, value):
+                self.replies.append(value)
+
+            def return_dbus_error(self, name, message):
+                self.replies.append((name, message))
+
+        daemon = Daemon()
+        self.daemon = daemon
+        node_info = Gio.DBusNodeInfo.new_for_xml(daemon.dbus)
+        wrapper = _DaemonObjectWrapper(daemon, node_info.interfaces)
+
+        def call_method(*args):
+            # fails after it replied
+            args[-1].return_value(None)
+            raise RuntimeError('foo')
+
+        invocation = Invocation()
+        with mock.patch.object(ObjectWrapper, 'call_method', call_method):
+            wrapper.call_method(
+                None, None, OBJECT_PATH, BUS_NAME, 'stop_all',
+                GLib.Variant('()', ()), invocation
+            )
+            self.assertTrue(daemon.workers.join(timeout=2))
+
+        self.assertEqual(invocation.replies, [None])
+
     def test_autoload(self):
         preset = 'preset7'
         group = groups.find(key='Foo Device 2')
@@ -500,6 +874,81 @@ class TestDaemon(unittest.TestCase):
         self.assertEqual(self.daemon.get_state(group.key), STARTING)
         self.assertIsNotNone(groups.find(key='Foo Device 2'))
 
+    def test_autoload_report(self):
+        preset = 'preset7'
+        group_keys = ['Foo Device 2', 'Bar Device']
+        for group_key in group_keys:
+            group = groups.find(key=group_key)
+            mapping = Mapping()
+            mapping.change(Key(3, 2, 1), 'a')
+            mapping.save(group.get_preset_path(preset))
+            config.set_autoload_preset(group.key, preset)
+
+        # one after the other
+        config.set('daemon.autoload_concurrency', 1)
+        config.save_config()
+
+        self.daemon = Daemon()
+        self.daemon.set_config_dir(get_config_path())
+        self.assertEqual(self.daemon.get_autoload_report(), {})
+        self.daemon.autoload()
+
+        report = self.daemon.get_autoload_report()
+        self.assertEqual(set(report.keys()), set(group_keys))
+        for group_key in group_keys:
+            self.assertEqual(self.daemon.get_state(group_key), STARTING)
+            for step in [
+                'refresh', 'load_preset', 'load_xmodmap', 'start_process'
+            ]:
+                self.assertGreaterEqual(report[group_key][step], 0)
+
+        # the injection processes report their own steps when they are done
+        for _ in range(10):
+            time.sleep(0.1)
+            report = self.daemon.get_autoload_report()
+            if 'uinput' in report['Bar Device']:
+                break
+
+        self.assertGreaterEqual(report['Bar Device']['grab'], 0)
+        self.assertGreaterEqual(report['Bar Device']['uinput'], 0)
+
+        # a new autoload forgets about the previous one
+        self.daemon.stop_all()
+        config.set_autoload_preset('Foo Device 2', None)
+        config.set('daemon.autoload_concurrency', 4)
+        config.save_config()
+        self.daemon.set_config_dir(get_config_path())
+        self.daemon.autoload()
+        self.assertEqual(
+            list(self.daemon.get_autoload_report().keys()),
+            ['Bar Device']
+        )
+
+    def test_autoload_path(self):
+        # udev only knows the path of the new node
+        preset = 'preset7'
+        group = groups.find(key='Foo Device 2')
+
+        mapping = Mapping()
+        mapping.change(Key(3, 2, 1), 'a')
+        mapping.save(group.get_preset_path(preset))
+
+        config.set_autoload_preset(group.key, preset)
+        config.save_config()
+
+        self.daemon = Daemon()
+        self.daemon.set_config_dir(get_config_path())
+        history = self.daemon.autoload_history._autoload_history
+
+        # not part of any group
+        self.daemon.autoload_single('/dev/input/event31')
+        self.assertEqual(len(history), 0)
+
+        groups.set_groups([])
+        self.daemon.autoload_single('/dev/input/event10')
+        self.assertEqual(history[group.key][1], preset)
+        self.assertEqual(self.daemon.get_state(group.key), STARTING)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -27,6 +27,7 @@ from evdev.ecodes import EV_KEY, EV_ABS, ABS_HAT0X, KEY_A, \
 
 from keymapper.config import config, BUTTONS
 from keymapper.mapping import Mapping
+from keymapper.injection.context import Context
 from keymapper import utils
 
 from tests.test import new_event, InputDevice, MAX_ABS, MIN_ABS
@@ -37,6 +38,23 @@ class TestDevUtils(unittest.TestCase):
         self.assertEqual(utils.get_abs_range(InputDevice('/dev/input/event30'))[1], MAX_ABS)
         self.assertIsNone(utils.get_abs_range(InputDevice('/dev/input/event10')))
 
+    def test_get_abs_ranges(self):
+        device = InputDevice('/dev/input/event30')
+        abs_ranges = utils.get_abs_ranges(device)
+        self.assertEqual(
+            sorted(abs_ranges.keys()),
+            sorted(device.capabilities(absinfo=False)[EV_ABS])
+        )
+        for code in abs_ranges:
+            self.assertEqual(abs_ranges[code], (MIN_ABS, MAX_ABS))
+            self.assertEqual(
+                abs_ranges[code],
+                utils.get_abs_range(device, code)
+            )
+
+        device = InputDevice('/dev/input/event10')
+        self.assertEqual(utils.get_abs_ranges(device), {})
+
     def test_will_report_key_up(self):
         self.assertFalse(
             utils.will_report_key_up(new_event(EV_REL, REL_WHEEL, 1)))
@@ -54,9 +72,11 @@ class TestDevUtils(unittest.TestCase):
 
     def test_should_map_as_btn(self):
         mapping = Mapping()
+        context = Context(mapping)
 
         def do(gamepad, event):
-            return utils.should_map_as_btn(event, mapping, gamepad)
+            purposes = (context.left_purpose, context.right_purpose)
+            return utils.should_map_as_btn(event, purposes, gamepad)
 
         """D-Pad"""
 
@@ -115,6 +135,9 @@ class TestDevUtils(unittest.TestCase):
 
         mapping.set('gamepad.joystick.right_purpose', BUTTONS)
         config.set('gamepad.joystick.left_purpose', BUTTONS)
+        # the context doesn't know yet
+        self.assertFalse(do(1, new_event(EV_ABS, ecodes.ABS_Y, -1)))
+        context.update_settings()
         # but only for gamepads
         self.assertFalse(do(0, new_event(EV_ABS, ecodes.ABS_Y, -1)))
         self.assertTrue(do(1, new_event(EV_ABS, ecodes.ABS_Y, -1)))
@@ -190,6 +190,45 @@ class TestGroups(unittest.TestCase):
         self.assertEqual(group2.name, 'Foo Device')
         self.assertEqual(group3.name, 'Foo Device')
 
+    def test_find(self):
+        group_1 = _Group(['/dev/a', '/dev/b'], ['a'], [KEYBOARD], 'a')
+        group_2 = _Group(['/dev/c'], ['a'], [MOUSE], 'a 2')
+        group_3 = _Group(['/dev/d'], ['b'], [], 'b')
+        groups.set_groups([group_1, group_2, group_3])
+
+        self.assertIs(groups.find(key='a 2'), group_2)
+        self.assertIs(groups.find(path='/dev/b'), group_1)
+        self.assertIs(groups.find(path='/dev/d'), group_3)
+        # not unique, the first one is returned
+        self.assertIs(groups.find(name='a'), group_1)
+        self.assertIs(groups.find(name='a', path='/dev/c'), group_2)
+        self.assertIs(groups.find(key='a 2', name='a'), group_2)
+        self.assertIs(groups.find(), group_1)
+
+        self.assertIsNone(groups.find(key='a 2', path='/dev/a'))
+        self.assertIsNone(groups.find(key='a', name='b'))
+        self.assertIsNone(groups.find(path='/dev/e'))
+        self.assertIsNone(groups.find(name='c'))
+
+        # the indexes are updated when groups change
+        groups.loads(json.dumps([group_3.dumps()]))
+        self.assertIsNone(groups.find(key='a'))
+        self.assertEqual(groups.find(path='/dev/d').key, 'b')
+
+        groups.set_groups([])
+        self.assertIsNone(groups.find(name='b'))
+        self.assertIsNone(groups.find())
+
+    def test_find_duplicate_key(self):
+        # shouldn't happen, but behaves like a linear search if it does
+        group_1 = _Group(['/dev/a'], ['a'], [KEYBOARD], 'a')
+        group_2 = _Group(['/dev/a'], ['b'], [MOUSE], 'a')
+        groups.set_groups([group_1, group_2])
+        self.assertIs(groups.find(key='a'), group_1)
+        self.assertIs(groups.find(path='/dev/a'), group_1)
+        self.assertIs(groups.find(key='a', name='b'), group_2)
+        self.assertIs(groups.find(path='/dev/a', name='b'), group_2)
+
     def test_classify(self):
         # properly detects if the device is a gamepad
         EV_ABS = evdev.ecodes.EV_ABS
@@ -19,6 +19,7 @@
 # along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
 import unittest
 from unittest import mock
 import time
@@ -32,7 +33,7 @@ from evdev.ecodes import EV_REL, EV_KEY, EV_ABS, ABS_HAT0X, BTN_LEFT, \
 from keymapper.injection.injector import Injector, is_in_capabilities, \
     STARTING, RUNNING, STOPPED, NO_GRAB, UNKNOWN
 from keymapper.injection.numlock import is_numlock_on, set_numlock, \
-    ensure_numlock
+    find_numlock_device
 from keymapper.state import custom_mapping, system_mapping
 from keymapper.mapping import Mapping, DISABLE_CODE, DISABLE_NAME
 from keymapper.config import config, NONE, MOUSE, WHEEL, BUTTONS
@@ -44,7 +45,7 @@ from keymapper.groups import groups, classify, GAMEPAD
 from tests.test import new_event, push_events, fixtures, \
     EVENT_READ_TIMEOUT, uinput_write_history_pipe, \
     MAX_ABS, quick_cleanup, read_write_history_pipe, InputDevice, uinputs, \
-    keyboard_keys, MIN_ABS
+    keyboard_keys, MIN_ABS, tmp
 
 
 class TestInjector(unittest.TestCase):
@@ -277,24 +278,61 @@ class TestInjector(unittest.TestCase):
         set_numlock(not before)  # should change
         self.assertEqual(not before, is_numlock_on())
 
-        @ensure_numlock
-        def wrapped_1():
-            set_numlock(not is_numlock_on())
-
-        @ensure_numlock
-        def wrapped_2():
-            pass
-
-        # should not change
-        wrapped_1()
-        self.assertEqual(not before, is_numlock_on())
-        wrapped_2()
-        self.assertEqual(not before, is_numlock_on())
-
         # toggle one more time to restore the previous configuration
         set_numlock(before)
         self.assertEqual(before, is_numlock_on())
 
+    def test_numlock_leds(self):
+        class Keyboard:
+            path = '/dev/input/event1234'
+            leds_on = [evdev.ecodes.LED_CAPSL]
+
+            def capabilities(self, absinfo=True):
+                return {
+                    EV_KEY: [KEY_A, evdev.ecodes.KEY_NUMLOCK],
+                    evdev.ecodes.EV_LED: [evdev.ecodes.LED_NUML]
+                }
+
+            def leds(self):
+                return self.leds_on
+
+        keyboard = Keyboard()
+        mouse = InputDevice('/dev/input/event11')
+        self.assertIsNone(find_numlock_device([mouse]))
+        self.assertEqual(find_numlock_device([mouse, keyboard]), keyboard)
+
+        uinput = mock.Mock()
+        with mock.patch('subprocess.check_output') as check_output:
+            self.assertFalse(is_numlock_on(keyboard))
+
+            # already off
+            set_numlock(False, keyboard, uinput)
+            uinput.write.assert_not_called()
+
+            # presses numlock to turn it on
+            set_numlock(True, keyboard, uinput)
+            self.assertEqual(uinput.write.call_args_list, [
+                mock.call(EV_KEY, evdev.ecodes.KEY_NUMLOCK, 1),
+                mock.call(EV_KEY, evdev.ecodes.KEY_NUMLOCK, 0),
+            ])
+
+            keyboard.leds_on = [evdev.ecodes.LED_NUML]
+            self.assertTrue(is_numlock_on(keyboard))
+
+            # no subprocesses needed for any of that
+            check_output.assert_not_called()
+
+        # falls back to xset and numlockx if the LEDs can't be read
+        def leds():
+            raise OSError()
+
+        keyboard.leds = leds
+        with mock.patch('subprocess.check_output') as check_output:
+            check_output.return_value = b'Num Lock:    on    '
+            self.assertTrue(is_numlock_on(keyboard))
+            set_numlock(True, keyboard, uinput)
+            self.assertEqual(check_output.call_count, 2)
+
     def test_gamepad_to_mouse(self):
         # maps gamepad joystick events to mouse events
         config.set('gamepad.joystick.non_linearity', 1)
@@ -536,6 +574,7 @@ class TestInjector(unittest.TestCase):
         # one mapping that is unknown in the system_mapping on purpose
         input_b = 10
         custom_mapping.change(Key(EV_KEY, input_b, 1), 'b')
+        custom_mapping.set('injection.record_stats', True)
 
         # stuff the custom_mapping outputs (except for the unknown b)
         system_mapping.clear()
@@ -568,6 +607,11 @@ class TestInjector(unittest.TestCase):
 
         uinput_write_history_pipe[0].poll(timeout=1)
         self.assertEqual(self.injector.get_state(), RUNNING)
+        # reported together with the state
+        self.assertEqual(
+            set(self.injector.get_timings().keys()),
+            {'context', 'grab', 'numlock', 'uinput', 'set_numlock'}
+        )
         time.sleep(EVENT_READ_TIMEOUT * 10)
 
         # sending anything arbitrary does not stop the process
@@ -628,6 +672,50 @@ class TestInjector(unittest.TestCase):
         self.assertEqual(numlock_before, numlock_after)
         self.assertEqual(self.injector.get_state(), RUNNING)
 
+        counters, histograms = self.injector.get_stats()
+        self.assertEqual(counters['events'], 9)
+        # the release of the macro doesn't write anything
+        self.assertEqual(counters['forwarded'], 5)
+        self.assertEqual(counters['mapped'], 2)
+        self.assertEqual(counters['macro'], 1)
+        self.assertEqual(sum(histograms['forwarded']), 5)
+        self.assertEqual(sum(histograms['mapped']), 2)
+        self.assertEqual(sum(histograms['macro']), 1)
+
+    def test_profile(self):
+        directory = os.path.join(tmp, 'profiles')
+        custom_mapping.change(Key(EV_KEY, 10, 1), 'a')
+        self.injector = Injector(
+            groups.find(name='Bar Device'),
+            custom_mapping,
+            profile_dir=directory
+        )
+        self.injector.start()
+        time.sleep(0.5)
+        self.assertEqual(self.injector.get_state(), RUNNING)
+
+        snapshot_path = self.injector.take_snapshot()
+        self.assertTrue(snapshot_path.startswith(directory))
+        self.assertTrue(os.path.exists(snapshot_path))
+
+        self.injector.stop_injecting()
+        self.injector.join(5)
+        self.assertEqual(self.injector.get_state(), STOPPED)
+        profiles = [
+            name for name in os.listdir(directory)
+            if name.endswith('.prof')
+        ]
+        self.assertEqual(len(profiles), 1)
+        self.injector = None
+
+    def test_no_profile(self):
+        custom_mapping.change(Key(EV_KEY, 10, 1), 'a')
+        self.injector = Injector(groups.find(name='Bar Device'), custom_mapping)
+        self.injector.start()
+        time.sleep(0.5)
+        self.assertEqual(self.injector.get_state(), RUNNING)
+        self.assertEqual(self.injector.take_snapshot(), '')
+
     def test_any_funky_event_as_button(self):
         # as long as should_map_as_btn says it should be a button,
         # it will be.
@@ -885,7 +973,7 @@ class TestModifyCapabilities(unittest.TestCase):
         mapping.change(Key(EV_KEY, 81, 1), DISABLE_NAME)
 
         macro_code = 'r(2, m(sHiFt_l, r(2, k(1).k(2))))'
-        macro = parse(macro_code, mapping)
+        macro = parse(macro_code)
 
         mapping.change(Key(EV_KEY, 60, 111), macro_code)
 
@@ -41,10 +41,13 @@ from keymapper.state import custom_mapping, system_mapping, XMODMAP_FILENAME
 from keymapper.paths import CONFIG_PATH, get_preset_path, get_config_path
 from keymapper.config import config, WHEEL, MOUSE, BUTTONS
 from keymapper.gui.reader import reader
+from keymapper.gui.writer import SAVE_DELAY, preset_writer
 from keymapper.injection.injector import RUNNING, FAILED, UNKNOWN
 from keymapper.gui.row import Row, to_string, HOLDING, IDLE
 from keymapper.gui.window import Window
+from keymapper.gui.row_list import ROW_BATCH_SIZE
 from keymapper.key import Key
+from keymapper.mapping import Mapping
 from keymapper.daemon import Daemon
 from keymapper.groups import groups
 from keymapper.gui.helper import RootHelper
@@ -633,10 +636,37 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(reader.get_unreleased_keys(), ev_1)
 
         # focus different row
-        self.window.add_empty()
+        self.window.row_list.add_empty()
         self.window.window.set_focus(self.get_rows()[1].keycode_input)
         self.assertEqual(reader.get_unreleased_keys(), None)
 
+    def test_lazy_rows(self):
+        num_mappings = ROW_BATCH_SIZE * 2 + 5
+        for code in range(1, num_mappings + 1):
+            custom_mapping.change(Key(EV_KEY, code, 1), 'a', None)
+        self.window.get('preset_name_input').set_text('many')
+        self.window.save_preset()
+        self.window.on_rename_button_clicked(None)
+        self.window.on_create_preset_clicked(None)
+
+        self.window.on_select_preset(FakePresetDropdown('many'))
+        self.assertEqual(len(custom_mapping), num_mappings)
+
+        # only the first few rows and the empty row exist
+        rows = self.get_rows()
+        self.assertEqual(len(rows), ROW_BATCH_SIZE + 1)
+        self.assertIsNone(rows[-1].get_key())
+
+        # the rest is added before the empty row
+        self.window.row_list.add_rows(num_mappings)
+        rows = self.get_rows()
+        self.assertEqual(len(rows), num_mappings + 1)
+        self.assertIsNone(rows[-1].get_key())
+        self.assertEqual(
+            [row.get_key() for row in rows[:-1]],
+            [key for key, _ in custom_mapping]
+        )
+
     def test_rows(self):
         """Comprehensive test for rows."""
         system_mapping.clear()
@@ -952,6 +982,37 @@ class TestIntegration(unittest.TestCase):
             content = f.read()
             self.assertIn('abcd', content)
 
+    def test_save_preset_later(self):
+        path = get_preset_path('Foo Device', 'new preset')
+        custom_mapping.change(Key(EV_KEY, 14, 1), 'abcd', None)
+        self.window.save_preset_later()
+        self.assertFalse(custom_mapping.changed)
+        with open(path) as f:
+            self.assertNotIn('abcd', f.read())
+
+        # saving right away writes pending changes as well
+        self.window.save_preset()
+        with open(path) as f:
+            self.assertIn('abcd', f.read())
+
+        custom_mapping.change(Key(EV_KEY, 14, 1), 'efgh', None)
+        self.window.save_preset_later()
+        time.sleep(SAVE_DELAY + 0.2)
+        with open(path) as f:
+            self.assertIn('efgh', f.read())
+
+    def test_save_preset_later_error(self):
+        def save(*_):
+            raise PermissionError('foo')
+
+        custom_mapping.change(Key(EV_KEY, 14, 1), 'abcd', None)
+        with patch.object(Mapping, 'save', save):
+            self.window.save_preset_later()
+            preset_writer.flush()
+
+        gtk_iteration()
+        self.assertIn('Permission denied', self.get_status_text())
+
     def test_check_for_unknown_symbols(self):
         status = self.window.get('status_bar')
         error_icon = self.window.get('error_status_icon')
@@ -1503,6 +1564,34 @@ class TestIntegration(unittest.TestCase):
             self.window.device_store
         ])
 
+    def test_check_add_row_on_change(self):
+        # no timeout is needed to add new empty rows
+        self.assertEqual(self.window.timeouts, [])
+        num_rows = len(self.get_rows())
+        row = self.get_rows()[-1]
+        self.assertFalse(row.is_complete())
+
+        row.set_new_key(Key(EV_KEY, 10, 1))
+        self.assertEqual(len(self.get_rows()), num_rows)
+        row.symbol_input.set_text('a')
+        rows = self.get_rows()
+        self.assertEqual(len(rows), num_rows + 1)
+        self.assertIsNone(rows[-1].get_key())
+
+        # completions are only set up when they are needed
+        empty = rows[-1]
+        self.assertIsNone(empty.symbol_input.get_completion())
+        self.window.window.set_focus(empty.symbol_input)
+        gtk_iteration()
+        self.assertIsNotNone(empty.symbol_input.get_completion())
+
+        # removing the empty row adds a new one
+        empty.on_delete_button_clicked()
+        rows = self.get_rows()
+        self.assertEqual(len(rows), num_rows + 1)
+        self.assertIsNot(rows[-1], empty)
+        self.assertFalse(rows[-1].is_complete())
+
     def test_screw_up_rows(self):
         # add a row that is not present in custom_mapping
         key_list = self.window.get('key_list')
@@ -1520,7 +1609,7 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(num_rows_before, 5)
 
         # it returns true to keep the glib timeout going
-        self.assertTrue(self.window.check_add_row())
+        self.assertTrue(self.window.row_list.check_add_row())
         # it still adds a new empty row and won't break
         num_rows_after = len(key_list.get_children())
         self.assertEqual(num_rows_after, num_rows_before + 1)
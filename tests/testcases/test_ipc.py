@@ -19,10 +19,13 @@
 # along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
+import time
 import unittest
 import select
+from unittest import mock
 
-from keymapper.ipc.pipe import Pipe
+from keymapper.ipc.pipe import Pipe, FRAME_HEADER, MESSAGE
 from keymapper.ipc.socket import Server, Client, Base
 
 
@@ -137,6 +140,78 @@ class TestPipe(unittest.TestCase):
         self.assertEqual(p2.recv(), 3)
         self.assertEqual(p2.recv(), None)
 
+    def test_send_events(self):
+        p1 = Pipe('/tmp/key-mapper-test/pipe')
+        p2 = Pipe('/tmp/key-mapper-test/pipe')
+
+        p1.send({'type': 'groups', 'message': 'foo'})
+        p1.send_events([
+            (1, 2, 3, 4, 5),
+            (6, 7, 8, 9, -1),
+        ])
+        p1.send_events([(10, 11, 12, 13, 14)])
+
+        self.assertEqual(p2.recv(), {'type': 'groups', 'message': 'foo'})
+        self.assertEqual(p2.recv(), {'type': 'event', 'message': (
+            1, 2, 3, 4, 5
+        )})
+        self.assertEqual(p2.recv(), {'type': 'event', 'message': (
+            6, 7, 8, 9, -1
+        )})
+        self.assertTrue(p2.poll())
+        self.assertEqual(p2.recv(), {'type': 'event', 'message': (
+            10, 11, 12, 13, 14
+        )})
+        self.assertFalse(p2.poll())
+
+    def test_partial_frame(self):
+        p1 = Pipe('/tmp/key-mapper-test/pipe')
+        payload = b'[1, 2]'
+        frame = FRAME_HEADER.pack(MESSAGE, time.time(), len(payload))
+        frame += payload
+
+        # the rest didn't arrive yet
+        os.write(p1._fds[1], frame[:5])
+        self.assertFalse(p1.poll())
+        os.write(p1._fds[1], frame[5:-1])
+        self.assertFalse(p1.poll())
+        self.assertIsNone(p1.recv())
+
+        os.write(p1._fds[1], frame[-1:])
+        self.assertTrue(p1.poll())
+        self.assertEqual(p1.recv(), [1, 2])
+        self.assertIsNone(p1.recv())
+
+    def test_full_pipe(self):
+        p1 = Pipe('/tmp/key-mapper-test/pipe')
+        p2 = Pipe('/tmp/key-mapper-test/pipe')
+
+        # nobody reads the pipe, so it fills up at some point
+        payload = list(range(1000))
+        start = time.monotonic()
+        with mock.patch('keymapper.ipc.pipe.WRITE_TIMEOUT', 0.1):
+            for _ in range(200):
+                p1.send(payload)
+
+        # the writer waited for the reader only once
+        self.assertLess(time.monotonic() - start, 1)
+
+        # messages that were not dropped arrive unharmed
+        received = 0
+        while p2.poll():
+            self.assertEqual(p2.recv(), payload)
+            received += 1
+
+        self.assertGreater(received, 0)
+        self.assertLess(received, 200)
+
+        # the rest of a partially written message is written first
+        p1.send([1])
+        while p2.poll():
+            message = p2.recv()
+
+        self.assertEqual(message, [1])
+
 
 if __name__ == "__main__":
     unittest.main()
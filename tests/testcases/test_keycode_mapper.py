@@ -496,11 +496,12 @@ class TestKeycodeMapper(unittest.TestCase):
         self.assertEqual(uinput_write_history[8].t, (EV_KEY, 103, 0))
 
     def test_macro_writes_to_context_uinput(self):
+        context = Context(self.mapping)
+
         macro_mapping = {
-            ((EV_KEY, 1, 1),): parse('k(a)', self.mapping)
+            ((EV_KEY, 1, 1),): parse('k(a)', context)
         }
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
         context.uinput = UInput()
         forward_to = UInput()
@@ -527,12 +528,13 @@ class TestKeycodeMapper(unittest.TestCase):
         system_mapping._set('a', code_a)
         system_mapping._set('b', code_b)
 
+        context = Context(self.mapping)
+
         macro_mapping = {
-            ((EV_KEY, 1, 1),): parse('k(a)', self.mapping),
-            ((EV_KEY, 2, 1),): parse('r(5, k(b))', self.mapping)
+            ((EV_KEY, 1, 1),): parse('k(a)', context),
+            ((EV_KEY, 2, 1),): parse('r(5, k(b))', context)
         }
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
         keycode_mapper = KeycodeMapper(context, self.source, None)
 
@@ -577,14 +579,15 @@ class TestKeycodeMapper(unittest.TestCase):
         system_mapping._set('b', code_b)
         system_mapping._set('c', code_c)
 
+        context = Context(self.mapping)
+
         macro_mapping = {
-            ((EV_KEY, 1, 1),): parse('k(a).h(k(b)).k(c)', self.mapping)
+            ((EV_KEY, 1, 1),): parse('k(a).h(k(b)).k(c)', context)
         }
 
         def handler(*args):
             history.append(args)
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
         keycode_mapper = KeycodeMapper(context, self.source, None)
 
@@ -645,10 +648,12 @@ class TestKeycodeMapper(unittest.TestCase):
         system_mapping._set('c', code_c)
         system_mapping._set('d', code_d)
 
+        context = Context(self.mapping)
+
         macro_mapping = {
-            ((EV_KEY, 1, 1),): parse('h(k(b))', self.mapping),
-            ((EV_KEY, 2, 1),): parse('k(c).r(1, r(1, r(1, h(k(a))))).k(d)', self.mapping),
-            ((EV_KEY, 3, 1),): parse('h(k(b))', self.mapping)
+            ((EV_KEY, 1, 1),): parse('h(k(b))', context),
+            ((EV_KEY, 2, 1),): parse('k(c).r(1, r(1, r(1, h(k(a))))).k(d)', context),
+            ((EV_KEY, 3, 1),): parse('h(k(b))', context)
         }
 
         history = []
@@ -656,7 +661,6 @@ class TestKeycodeMapper(unittest.TestCase):
         def handler(*args):
             history.append(args)
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
         keycode_mapper = KeycodeMapper(context, self.source, None)
 
@@ -772,8 +776,10 @@ class TestKeycodeMapper(unittest.TestCase):
         system_mapping._set('b', code_b)
         system_mapping._set('c', code_c)
 
+        context = Context(self.mapping)
+
         macro_mapping = {
-            ((EV_KEY, 1, 1),): parse('k(a).h(k(b)).k(c)', self.mapping),
+            ((EV_KEY, 1, 1),): parse('k(a).h(k(b)).k(c)', context),
         }
 
         history = []
@@ -781,7 +787,6 @@ class TestKeycodeMapper(unittest.TestCase):
         def handler(*args):
             history.append(args)
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
         keycode_mapper = KeycodeMapper(context, self.source, None)
 
@@ -848,9 +853,11 @@ class TestKeycodeMapper(unittest.TestCase):
         up_1 = (*key_1, 0)
         up_2 = (*key_2, 0)
 
+        context = Context(self.mapping)
+
         macro_mapping = {
-            (down_0, down_1): parse('k(1).h(k(2)).k(3)', self.mapping),
-            (down_2,): parse('k(a).h(k(b)).k(c)', self.mapping)
+            (down_0, down_1): parse('k(1).h(k(2)).k(3)', context),
+            (down_2,): parse('k(a).h(k(b)).k(c)', context)
         }
 
         def handler(*args):
@@ -858,7 +865,6 @@ class TestKeycodeMapper(unittest.TestCase):
 
         loop = asyncio.get_event_loop()
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
 
         uinput_1 = UInput()
@@ -970,9 +976,11 @@ class TestKeycodeMapper(unittest.TestCase):
 
         repeats = 10
 
+        context = Context(self.mapping)
+
         macro_mapping = {
-            (right,): parse(f'r({repeats}, k(1))', self.mapping),
-            (left,): parse(f'r({repeats}, k(2))', self.mapping)
+            (right,): parse(f'r({repeats}, k(1))', context),
+            (left,): parse(f'r({repeats}, k(2))', context)
         }
 
         history = []
@@ -980,7 +988,6 @@ class TestKeycodeMapper(unittest.TestCase):
         def handler(*args):
             history.append(args)
 
-        context = Context(self.mapping)
         context.macros = macro_mapping
         keycode_mapper = KeycodeMapper(context, self.source, None)
 
@@ -1200,7 +1207,8 @@ class TestKeycodeMapper(unittest.TestCase):
         up_1 = (EV_ABS, ABS_HAT1X, 0)
         up_2 = (EV_ABS, ABS_HAT1Y, 0)
 
-        macro_mapping = {(down_1,): parse('h(k(a))', self.mapping)}
+        context = Context(self.mapping)
+        macro_mapping = {(down_1,): parse('h(k(a))', context)}
         _key_to_code = {(down_1, down_2): 91}
 
         macro_history = []
@@ -1213,7 +1221,6 @@ class TestKeycodeMapper(unittest.TestCase):
 
         loop = asyncio.get_event_loop()
 
-        context = Context(self.mapping)
         context.uinput = uinput
         context.key_to_code = _key_to_code
         context.macros = macro_mapping
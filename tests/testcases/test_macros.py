@@ -29,6 +29,7 @@ from evdev.ecodes import EV_REL, EV_KEY, REL_Y, REL_X, REL_WHEEL, REL_HWHEEL
 
 from keymapper.injection.macros import parse, _Macro, _extract_params, \
     is_this_a_macro, _parse_recurse, handle_plus_syntax, _count_brackets
+from keymapper.injection.context import Context
 from keymapper.config import config
 from keymapper.mapping import Mapping
 from keymapper.state import system_mapping
@@ -41,6 +42,7 @@ class TestMacros(unittest.TestCase):
         self.result = []
         self.loop = asyncio.get_event_loop()
         self.mapping = Mapping()
+        self.context = Context(self.mapping)
 
     def tearDown(self):
         self.result = []
@@ -85,7 +87,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(handle_plus_syntax(''), '')
 
     def test_run_plus_syntax(self):
-        macro = parse('a + b + c + d', self.mapping)
+        macro = parse('a + b + c + d', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('a'),
             system_mapping.get('b'),
@@ -137,17 +139,17 @@ class TestMacros(unittest.TestCase):
         expect(',,', ['', '', ''])
 
     def test_fails(self):
-        self.assertIsNone(parse('r(1, a)', self.mapping))
-        self.assertIsNone(parse('r(a, k(b))', self.mapping))
-        self.assertIsNone(parse('m(a, b)', self.mapping))
+        self.assertIsNone(parse('r(1, a)', self.context))
+        self.assertIsNone(parse('r(a, k(b))', self.context))
+        self.assertIsNone(parse('m(a, b)', self.context))
 
     def test_parse_params(self):
-        self.assertEqual(_parse_recurse('', self.mapping), None)
-        self.assertEqual(_parse_recurse('5', self.mapping), 5)
-        self.assertEqual(_parse_recurse('foo', self.mapping), 'foo')
+        self.assertEqual(_parse_recurse('', self.context), None)
+        self.assertEqual(_parse_recurse('5', self.context), 5)
+        self.assertEqual(_parse_recurse('foo', self.context), 'foo')
 
     def test_0(self):
-        macro = parse('k(1)', self.mapping)
+        macro = parse('k(1)', self.context)
         one_code = system_mapping.get('1')
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {one_code})
         self.assertSetEqual(macro.get_capabilities()[EV_REL], set())
@@ -158,7 +160,7 @@ class TestMacros(unittest.TestCase):
 
     def test_1(self):
         # quotation marks are removed automatically and don't do any harm
-        macro = parse('k(1).k("a").k(3)', self.mapping)
+        macro = parse('k(1).k("a").k(3)', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('1'),
             system_mapping.get('a'),
@@ -174,43 +176,43 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 0)
 
     def test_return_errors(self):
-        error = parse('k(1).h(k(a)).k(3)', self.mapping, return_errors=True)
+        error = parse('k(1).h(k(a)).k(3)', self.context, return_errors=True)
         self.assertIsNone(error)
-        error = parse('k(1))', self.mapping, return_errors=True)
+        error = parse('k(1))', self.context, return_errors=True)
         self.assertIn('bracket', error)
-        error = parse('k((1)', self.mapping, return_errors=True)
+        error = parse('k((1)', self.context, return_errors=True)
         self.assertIn('bracket', error)
-        error = parse('k((1).k)', self.mapping, return_errors=True)
+        error = parse('k((1).k)', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('r(a, k(1))', self.mapping, return_errors=True)
+        error = parse('r(a, k(1))', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('k()', self.mapping, return_errors=True)
+        error = parse('k()', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('k(1)', self.mapping, return_errors=True)
+        error = parse('k(1)', self.context, return_errors=True)
         self.assertIsNone(error)
-        error = parse('k(1, 1)', self.mapping, return_errors=True)
+        error = parse('k(1, 1)', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('h(1, 1)', self.mapping, return_errors=True)
+        error = parse('h(1, 1)', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('h(h(h(1, 1)))', self.mapping, return_errors=True)
+        error = parse('h(h(h(1, 1)))', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('r(1)', self.mapping, return_errors=True)
+        error = parse('r(1)', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('r(1, 1)', self.mapping, return_errors=True)
+        error = parse('r(1, 1)', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('r(k(1), 1)', self.mapping, return_errors=True)
+        error = parse('r(k(1), 1)', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('r(1, k(1))', self.mapping, return_errors=True)
+        error = parse('r(1, k(1))', self.context, return_errors=True)
         self.assertIsNone(error)
-        error = parse('m(asdf, k(a))', self.mapping, return_errors=True)
+        error = parse('m(asdf, k(a))', self.context, return_errors=True)
         self.assertIsNotNone(error)
-        error = parse('foo(a)', self.mapping, return_errors=True)
+        error = parse('foo(a)', self.context, return_errors=True)
         self.assertIn('unknown', error.lower())
         self.assertIn('foo', error)
 
     def test_hold(self):
         # repeats k(a) as long as the key is held down
-        macro = parse('k(1).h(k(a)).k(3)', self.mapping)
+        macro = parse('k(1).h(k(a)).k(3)', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('1'),
             system_mapping.get('a'),
@@ -244,7 +246,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 1)
 
     def test_dont_hold(self):
-        macro = parse('k(1).h(k(a)).k(3)', self.mapping)
+        macro = parse('k(1).h(k(a)).k(3)', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('1'),
             system_mapping.get('a'),
@@ -264,7 +266,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 1)
 
     def test_just_hold(self):
-        macro = parse('k(1).h().k(3)', self.mapping)
+        macro = parse('k(1).h().k(3)', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('1'),
             system_mapping.get('3')
@@ -294,7 +296,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 0)
 
     def test_dont_just_hold(self):
-        macro = parse('k(1).h().k(3)', self.mapping)
+        macro = parse('k(1).h().k(3)', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('1'),
             system_mapping.get('3')
@@ -314,7 +316,7 @@ class TestMacros(unittest.TestCase):
 
     def test_hold_down(self):
         # writes down and waits for the up event until the key is released
-        macro = parse('h(a)', self.mapping)
+        macro = parse('h(a)', self.context)
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {
             system_mapping.get('a'),
         })
@@ -347,7 +349,7 @@ class TestMacros(unittest.TestCase):
         start = time.time()
         repeats = 20
 
-        macro = parse(f'r({repeats}, k(k)).r(1, k(k))', self.mapping)
+        macro = parse(f'r({repeats}, k(k)).r(1, k(k))', self.context)
         k_code = system_mapping.get('k')
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {k_code})
 
@@ -367,7 +369,7 @@ class TestMacros(unittest.TestCase):
 
     def test_3(self):
         start = time.time()
-        macro = parse('r(3, k(m).w(100))', self.mapping)
+        macro = parse('r(3, k(m).w(100))', self.context)
         m_code = system_mapping.get('m')
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {m_code})
         self.loop.run_until_complete(macro.run(self.handler))
@@ -387,7 +389,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros[0].child_macros), 0)
 
     def test_4(self):
-        macro = parse('  r(2,\nk(\nr ).k(minus\n )).k(m)  ', self.mapping)
+        macro = parse('  r(2,\nk(\nr ).k(minus\n )).k(m)  ', self.context)
 
         r = system_mapping.get('r')
         minus = system_mapping.get('minus')
@@ -408,7 +410,7 @@ class TestMacros(unittest.TestCase):
 
     def test_5(self):
         start = time.time()
-        macro = parse('w(200).r(2,m(w,\nr(2,\tk(BtN_LeFt))).w(10).k(k))', self.mapping)
+        macro = parse('w(200).r(2,m(w,\nr(2,\tk(BtN_LeFt))).w(10).k(k))', self.context)
 
         self.assertEqual(len(macro.child_macros), 1)
         self.assertEqual(len(macro.child_macros[0].child_macros), 1)
@@ -437,15 +439,16 @@ class TestMacros(unittest.TestCase):
 
     def test_6(self):
         # does nothing without .run
-        macro = parse('k(a).r(3, k(b))', self.mapping)
+        macro = parse('k(a).r(3, k(b))', self.context)
         self.assertIsInstance(macro, _Macro)
         self.assertListEqual(self.result, [])
 
     def test_keystroke_sleep_config(self):
         # global config as fallback
         config.set('macros.keystroke_sleep_ms', 100)
+        self.context.update_settings()
         start = time.time()
-        macro = parse('k(a).k(b)', self.mapping)
+        macro = parse('k(a).k(b)', self.context)
         self.loop.run_until_complete(macro.run(self.handler))
         delta = time.time() - start
         # is currently over 400, k(b) adds another sleep afterwards
@@ -454,8 +457,9 @@ class TestMacros(unittest.TestCase):
 
         # now set the value in the mapping, which is prioritized
         self.mapping.set('macros.keystroke_sleep_ms', 50)
+        self.context.update_settings()
         start = time.time()
-        macro = parse('k(a).k(b)', self.mapping)
+        macro = parse('k(a).k(b)', self.context)
         self.loop.run_until_complete(macro.run(self.handler))
         delta = time.time() - start
         self.assertGreater(delta, 0.150)
@@ -470,7 +474,7 @@ class TestMacros(unittest.TestCase):
         b = system_mapping.get('b')
         c = system_mapping.get('c')
 
-        macro = parse('k(a).m(b, h()).k(c)', self.mapping)
+        macro = parse('k(a).m(b, h()).k(c)', self.context)
         asyncio.ensure_future(macro.run(self.handler))
         self.assertFalse(macro.is_holding())
 
@@ -513,8 +517,8 @@ class TestMacros(unittest.TestCase):
         self.assertListEqual(self.result, expected)
 
     def test_mouse(self):
-        macro_1 = parse('mouse(up, 4)', self.mapping)
-        macro_2 = parse('wheel(left, 3)', self.mapping)
+        macro_1 = parse('mouse(up, 4)', self.context)
+        macro_2 = parse('wheel(left, 3)', self.context)
         macro_1.press_key()
         macro_2.press_key()
         asyncio.ensure_future(macro_1.run(self.handler))
@@ -537,7 +541,7 @@ class TestMacros(unittest.TestCase):
         self.assertIn(REL_X, macro_2.get_capabilities()[EV_REL])
 
     def test_event_1(self):
-        macro = parse('e(EV_KEY, KEY_A, 1)', self.mapping)
+        macro = parse('e(EV_KEY, KEY_A, 1)', self.context)
         a_code = system_mapping.get('a')
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {a_code})
         self.assertSetEqual(macro.get_capabilities()[EV_REL], set())
@@ -547,7 +551,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 0)
 
     def test_event_2(self):
-        macro = parse('r(1, e(5421, 324, 154))', self.mapping)
+        macro = parse('r(1, e(5421, 324, 154))', self.context)
         code = 324
         self.assertSetEqual(macro.get_capabilities()[5421], {324})
         self.assertSetEqual(macro.get_capabilities()[EV_REL], set())
@@ -558,7 +562,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 1)
 
     def test_ifeq_runs(self):
-        macro = parse('set(foo, 2).ifeq(foo, 2, k(a), k(b))', self.mapping)
+        macro = parse('set(foo, 2).ifeq(foo, 2, k(a), k(b))', self.context)
         code_a = system_mapping.get('a')
         code_b = system_mapping.get('b')
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {code_a, code_b})
@@ -572,7 +576,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 2)
 
     def test_ifeq_unknown_key(self):
-        macro = parse('ifeq(qux, 2, k(a), k(b))', self.mapping)
+        macro = parse('ifeq(qux, 2, k(a), k(b))', self.context)
         code_a = system_mapping.get('a')
         code_b = system_mapping.get('b')
         self.assertSetEqual(macro.get_capabilities()[EV_KEY], {code_a, code_b})
@@ -586,7 +590,7 @@ class TestMacros(unittest.TestCase):
         self.assertEqual(len(macro.child_macros), 2)
 
     def test_ifeq_runs_multiprocessed(self):
-        macro = parse('ifeq(foo, 3, k(a), k(b))', self.mapping)
+        macro = parse('ifeq(foo, 3, k(a), k(b))', self.context)
         code_a = system_mapping.get('a')
         code_b = system_mapping.get('b')
 
@@ -596,7 +600,7 @@ class TestMacros(unittest.TestCase):
 
         def set_foo(value):
             # will write foo = 2 into the shared dictionary of macros
-            macro_2 = parse(f'set(foo, {value})', self.mapping)
+            macro_2 = parse(f'set(foo, {value})', self.context)
             loop = asyncio.new_event_loop()
             loop.run_until_complete(macro_2.run(lambda: None))
 
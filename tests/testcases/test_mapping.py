@@ -20,10 +20,12 @@
 
 
 import os
+import gc
 import unittest
 import json
+from unittest import mock
 
-from evdev.ecodes import EV_KEY, EV_ABS, ABS_HAT0X, KEY_A
+from evdev.ecodes import EV_KEY, EV_ABS, ABS_HAT0X, KEY_A, KEY_LEFTALT
 
 from keymapper.mapping import Mapping
 from keymapper.state import SystemMapping, XMODMAP_FILENAME
@@ -66,6 +68,83 @@ class TestSystemMapping(unittest.TestCase):
             self.assertNotIn('KEY_A', content)
             self.assertNotIn('disable', content)
 
+    def test_populate_cached(self):
+        xmodmap = (
+            'keycode  38 = a A a A\n'
+            'keycode  64 = Alt_L Meta_L Alt_L Meta_L\n'
+            'keycode 204 = NoSymbol Alt_L NoSymbol Alt_L\n'
+            'keycode 205 = Meta_L NoSymbol\n'
+        )
+        outputs = {
+            'setxkbmap': 'rules: evdev\nlayout: us\n',
+            'xmodmap': xmodmap
+        }
+        calls = []
+
+        def check_output(command, *_, **__):
+            calls.append(command[0])
+            return outputs[command[0]].encode()
+
+        path = os.path.join(tmp, XMODMAP_FILENAME)
+        with mock.patch('subprocess.check_output', check_output):
+            system_mapping = SystemMapping()
+            self.assertEqual(system_mapping.get('a'), KEY_A)
+            self.assertEqual(system_mapping.get_name(KEY_LEFTALT), 'Alt_L')
+            self.assertEqual(system_mapping.get_names(197), ['Meta_L'])
+            self.assertIsNone(system_mapping.get_name(1000))
+            self.assertEqual(system_mapping.get_names(1000), [])
+            with open(path, 'r') as file:
+                self.assertEqual(json.load(file)['a'], KEY_A)
+            self.assertIn('xmodmap', calls)
+
+            # nothing is rebuilt or written if the layout is the same
+            calls.clear()
+            revision = system_mapping.revision
+            os.utime(path, (0, 0))
+            system_mapping.populate()
+            self.assertEqual(system_mapping.revision, revision)
+            self.assertEqual(os.stat(path).st_mtime, 0)
+            self.assertNotIn('xmodmap', calls)
+
+            # the next start doesn't need to ask xmodmap either
+            system_mapping = SystemMapping()
+            self.assertEqual(system_mapping.get('a'), KEY_A)
+            self.assertEqual(system_mapping.get_names(197), ['Meta_L'])
+            self.assertNotIn('xmodmap', calls)
+
+            # but a modified mapping is populated again
+            system_mapping._set('foo', 1)
+            system_mapping.populate()
+            self.assertIsNone(system_mapping.get('foo'))
+            self.assertEqual(system_mapping.get('a'), KEY_A)
+
+            # a different layout
+            outputs['setxkbmap'] = 'rules: evdev\nlayout: de\n'
+            outputs['xmodmap'] = xmodmap.replace(' 38 ', ' 39 ')
+            system_mapping.populate()
+            self.assertEqual(system_mapping.get('a'), KEY_A + 1)
+            self.assertNotEqual(os.stat(path).st_mtime, 0)
+            self.assertIn('xmodmap', calls)
+
+            system_mapping.clear()
+            self.assertIsNone(system_mapping.get('a'))
+            system_mapping.populate()
+            self.assertEqual(system_mapping.get('a'), KEY_A + 1)
+
+    def test_populate_without_layout(self):
+        # without setxkbmap the whole xmodmap output is compared
+        def check_output(command, *_, **__):
+            if command[0] == 'setxkbmap':
+                raise FileNotFoundError()
+            return b'keycode  38 = a A a A\n'
+
+        with mock.patch('subprocess.check_output', check_output):
+            system_mapping = SystemMapping()
+            self.assertEqual(system_mapping.get('a'), KEY_A)
+            revision = system_mapping.revision
+            system_mapping.populate()
+            self.assertEqual(system_mapping.revision, revision)
+
     def test_correct_case(self):
         system_mapping = SystemMapping()
         system_mapping.clear()
@@ -200,6 +279,130 @@ class TestMapping(unittest.TestCase):
         self.assertIsNone(mapping2.get_symbol(Key(EV_KEY, 2, 3)))
         self.assertIsNone(mapping2.get_symbol(Key(EV_KEY, 1, 3)))
 
+    def test_clone_copy_on_write(self):
+        ev_1 = Key(EV_KEY, 1, 1)
+        ev_2 = Key(EV_KEY, 2, 1)
+
+        mapping1 = Mapping()
+        mapping1.change(ev_1, 'a')
+        mapping2 = mapping1.clone()
+        self.assertIs(mapping1._mapping, mapping2._mapping)
+
+        mapping2.change(ev_2, 'b')
+        mapping2.clear(ev_1)
+        self.assertEqual(len(mapping1), 1)
+        self.assertEqual(mapping1.get_symbol(ev_1), 'a')
+        self.assertIsNone(mapping1.get_symbol(ev_2))
+        self.assertEqual(len(mapping2), 1)
+        self.assertEqual(mapping2.get_symbol(ev_2), 'b')
+
+        mapping3 = mapping1.clone()
+        mapping1.empty()
+        self.assertEqual(len(mapping1), 0)
+        self.assertEqual(mapping3.get_symbol(ev_1), 'a')
+
+    def test_clone_discarded(self):
+        ev_1 = Key(EV_KEY, 1, 1)
+        ev_2 = Key(EV_KEY, 2, 1)
+        ev_3 = Key(EV_KEY, 3, 1)
+
+        mapping1 = Mapping()
+        mapping1.change(ev_1, 'a')
+        shared = mapping1._mapping
+        clone = mapping1.clone()
+        mapping2 = mapping1.clone()
+        del clone
+        gc.collect()
+
+        # mapping2 still uses it
+        mapping1.change(ev_2, 'b')
+        self.assertIsNot(mapping1._mapping, shared)
+        self.assertIs(mapping2._mapping, shared)
+        self.assertEqual(len(mapping2), 1)
+
+        # after the clone is gone, it isn't copied anymore
+        clone = mapping1.clone()
+        del clone
+        gc.collect()
+        unshared = mapping1._mapping
+        mapping1.change(ev_3, 'c')
+        self.assertIs(mapping1._mapping, unshared)
+
+    def test_clone_config(self):
+        mapping1 = Mapping()
+        mapping1.set('gamepad.joystick.left_purpose', 'wheel')
+        mapping2 = mapping1.clone()
+        mapping1.set('gamepad.joystick.left_purpose', 'buttons')
+        self.assertEqual(
+            mapping2.get('gamepad.joystick.left_purpose'),
+            'wheel'
+        )
+
+    def test_clone_for_saving(self):
+        ev_1 = Key(EV_KEY, 1, 1)
+        ev_2 = Key(EV_KEY, 2, 1)
+        self.mapping.change(ev_1, 'a')
+        self.assertTrue(self.mapping.changed)
+
+        clone = self.mapping.clone_for_saving()
+        self.assertFalse(self.mapping.changed)
+        self.assertEqual(self.mapping.num_saved_keys, 1)
+
+        self.mapping.change(ev_2, 'b')
+        self.assertIsNone(clone.get_symbol(ev_2))
+
+        path = get_preset_path('Foo Device', 'test')
+        clone.save(path)
+        loaded = Mapping()
+        loaded.load(path)
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.get_symbol(ev_1), 'a')
+
+    def test_pop_changes(self):
+        one = Key(EV_KEY, 10, 1)
+        two = Key(EV_KEY, 11, 1)
+        three = Key(EV_KEY, 12, 1)
+
+        self.mapping.change(one, '1')
+        self.mapping.change(two, '2')
+        self.assertEqual(self.mapping.pop_changes(), {
+            one: (None, '1'),
+            two: (None, '2'),
+        })
+        self.assertEqual(self.mapping.pop_changes(), {})
+
+        # saving doesn't take them away from whoever needs them
+        self.mapping.change(one, 'a')
+        path = get_preset_path('Foo Device', 'test')
+        self.mapping.save(path)
+        self.mapping.change(three, '3', two)
+        self.assertEqual(self.mapping.pop_changes(), {
+            one: ('1', 'a'),
+            two: ('2', None),
+            three: (None, '3'),
+        })
+
+        # changing them back is not a change anymore
+        self.mapping.change(one, '1')
+        self.mapping.change(one, 'a')
+        self.assertEqual(self.mapping.pop_changes(), {})
+
+        clone = self.mapping.clone()
+        self.mapping.change(one, 'b')
+        clone.clear(one)
+        self.assertEqual(clone.pop_changes(), {one: ('a', None)})
+        self.assertEqual(self.mapping.pop_changes(), {one: ('a', 'b')})
+
+        self.mapping.empty()
+        self.assertEqual(self.mapping.pop_changes(), {
+            one: ('b', None),
+            three: ('3', None),
+        })
+
+        self.mapping.change(two, '2')
+        self.mapping.load(path)
+        self.assertEqual(self.mapping.pop_changes(), {})
+
     def test_save_load(self):
         one = Key(EV_KEY, 10, 1)
         two = Key(EV_KEY, 11, 1)
@@ -23,7 +23,8 @@ import os
 import unittest
 from unittest import mock
 
-from keymapper.paths import touch, mkdir, get_preset_path, get_config_path
+from keymapper.paths import touch, mkdir, get_preset_path, \
+    get_config_path, write_atomically
 from keymapper.user import get_user
 
 from tests.test import quick_cleanup, tmp
@@ -65,6 +66,22 @@ class TestPaths(unittest.TestCase):
         self.assertTrue(os.path.exists('/tmp/b/c/d/e'))
         self.assertTrue(os.path.isdir('/tmp/b/c/d/e'))
 
+    def test_write_atomically(self):
+        path = os.path.join(tmp, 'foo.json')
+        mkdir(tmp)
+        write_atomically(path, 'abc')
+        write_atomically(path, 'def')
+        with open(path, 'r') as file:
+            self.assertEqual(file.read(), 'def')
+
+        # the old content stays if writing fails
+        with mock.patch('os.replace', lambda *_: _raise(OSError())):
+            self.assertRaises(OSError, lambda: write_atomically(path, 'ghi'))
+        with open(path, 'r') as file:
+            self.assertEqual(file.read(), 'def')
+
+        self.assertEqual(os.listdir(tmp), ['foo.json'])
+
     def test_get_preset_path(self):
         self.assertEqual(get_preset_path(), os.path.join(tmp, 'presets'))
         self.assertEqual(get_preset_path('a'), os.path.join(tmp, 'presets/a'))
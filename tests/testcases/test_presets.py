@@ -21,12 +21,13 @@
 
 import os
 import unittest
+from unittest import mock
 import shutil
 import time
 
 from keymapper.presets import find_newest_preset, rename_preset, \
     get_any_preset, delete_preset, get_available_preset_name, get_presets, \
-    migrate_path
+    migrate_path, PresetIndex
 from keymapper.paths import CONFIG_PATH, get_preset_path, touch, mkdir
 from keymapper.state import custom_mapping
 
@@ -237,5 +238,98 @@ class TestFindPresets(unittest.TestCase):
         )
 
 
+class TestPresetIndex(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+
+    def test_changes(self):
+        index = PresetIndex()
+        self.assertEqual(index.get_presets('Foo Device'), {})
+        self.assertEqual(index.get_group_names(), [])
+
+        touch(get_preset_path('Foo Device', 'a'))
+        os.mknod(get_preset_path('Foo Device', '.b'))
+        self.assertEqual(list(index.get_presets('Foo Device')), ['a'])
+        self.assertTrue(index.exists('Foo Device', 'a'))
+        self.assertFalse(index.exists('Foo Device', 'b'))
+        self.assertFalse(index.exists('Bar Device', 'a'))
+        self.assertEqual(index.get_group_names(), ['Foo Device'])
+
+        rename_preset('Foo Device', 'a', 'b')
+        self.assertEqual(list(index.get_presets('Foo Device')), ['b'])
+
+        delete_preset('Foo Device', 'b')
+        self.assertEqual(index.get_presets('Foo Device'), {})
+
+    def test_cache(self):
+        index = PresetIndex()
+        touch(get_preset_path('Foo Device', 'a'))
+        # give the file system clock some time to advance
+        time.sleep(0.05)
+
+        def scandir(*_):
+            raise AssertionError('Should use the cache')
+
+        # directories that were listed right after they were modified
+        # are listed again, because further changes might not be
+        # noticeable by their modification time
+        self.assertIn('a', index.get_presets('Foo Device'))
+        with mock.patch('os.scandir', scandir):
+            self.assertRaises(
+                AssertionError,
+                lambda: index.get_presets('Foo Device')
+            )
+
+        with mock.patch('keymapper.presets.MTIME_GRANULARITY', 0):
+            self.assertIn('a', index.get_presets('Foo Device'))
+            with mock.patch('os.scandir', scandir):
+                self.assertIn('a', index.get_presets('Foo Device'))
+
+            touch(get_preset_path('Foo Device', 'b'))
+            self.assertEqual(len(index.get_presets('Foo Device')), 2)
+
+            index.clear()
+            with mock.patch('os.scandir', scandir):
+                self.assertRaises(
+                    AssertionError,
+                    lambda: index.get_presets('Foo Device')
+                )
+
+    def test_mtimes(self):
+        index = PresetIndex()
+        touch(get_preset_path('Foo Device', 'a'))
+        touch(get_preset_path('Foo Device', 'b'))
+        os.utime(get_preset_path('Foo Device', 'a'), (1, 1))
+        os.utime(get_preset_path('Foo Device', 'b'), (2, 2))
+
+        def scandir(*_):
+            raise AssertionError('Should use the cache')
+
+        with mock.patch('keymapper.presets.MTIME_GRANULARITY', 0):
+            self.assertEqual(index.get_presets('Foo Device'), {'a': 1, 'b': 2})
+
+            # touching a preset doesn't modify the directory, but it is
+            # the newest one afterwards
+            with mock.patch('os.scandir', scandir):
+                os.utime(get_preset_path('Foo Device', 'a'), (3, 3))
+                self.assertEqual(
+                    index.get_presets('Foo Device'),
+                    {'a': 3, 'b': 2}
+                )
+
+            index.invalidate(get_preset_path('Foo Device'))
+            with mock.patch('os.scandir', scandir):
+                self.assertRaises(
+                    AssertionError,
+                    lambda: index.get_presets('Foo Device')
+                )
+
+            # other directories are still known
+            self.assertEqual(index.get_group_names(), ['Foo Device'])
+            with mock.patch('os.scandir', scandir):
+                self.assertEqual(index.get_group_names(), ['Foo Device'])
+
+
 if __name__ == "__main__":
     unittest.main()
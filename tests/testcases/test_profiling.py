@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import pstats
+import unittest
+import tracemalloc
+
+from keymapper.injection.profiling import Profiler, get_file_name
+
+from tests.test import quick_cleanup, tmp
+
+
+def allocate():
+    return [str(i) for i in range(1000)]
+
+
+class TestProfiling(unittest.TestCase):
+    def tearDown(self):
+        quick_cleanup()
+
+    def test_get_file_name(self):
+        self.assertEqual(get_file_name('Foo Device 2'), 'Foo_Device_2')
+        self.assertEqual(get_file_name('a/b.c'), 'a_b.c')
+
+    def test_profiler(self):
+        directory = os.path.join(tmp, 'profiles')
+        profiler = Profiler(directory, 'Foo Device 2')
+        profiler.start()
+        self.assertTrue(tracemalloc.is_tracing())
+
+        strings = allocate()
+        snapshot_path = profiler.snapshot()
+        self.assertTrue(snapshot_path.startswith(directory))
+        self.assertTrue(snapshot_path.endswith('-1.tracemalloc'))
+        self.assertNotEqual(profiler.snapshot(), snapshot_path)
+
+        profile_path = profiler.stop()
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIn('Foo_Device_2', profile_path)
+
+        snapshot = tracemalloc.Snapshot.load(snapshot_path)
+        self.assertGreater(len(snapshot.statistics('lineno')), 0)
+
+        stats = pstats.Stats(profile_path)
+        functions = [function[2] for function in stats.stats]
+        self.assertIn('allocate', functions)
+        self.assertEqual(len(strings), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,6 +24,7 @@ from unittest import mock
 import time
 import multiprocessing
 
+from gi.repository import GLib
 from evdev.ecodes import EV_KEY, EV_ABS, ABS_HAT0X, KEY_COMMA, \
     BTN_TOOL_DOUBLETAP, ABS_Z, ABS_Y, KEY_A, \
     EV_REL, REL_WHEEL, REL_X, ABS_X, ABS_RZ
@@ -537,6 +538,48 @@ class TestReader(unittest.TestCase):
         self.assertTrue(reader.are_new_devices_available())
         self.assertFalse(reader.are_new_devices_available())
 
+    def test_watch(self):
+        context = GLib.MainContext.default()
+
+        def iterate():
+            while context.pending():
+                context.iteration(False)
+
+        results = []
+        reader.group = groups.find(key='Foo Device 2')
+        reader.watch(lambda: results.append(reader.read()))
+        iterate()
+        self.assertEqual(results, [])
+
+        reader._results.send_events([(0, 0, EV_KEY, KEY_A, 1)])
+        iterate()
+        self.assertEqual(results, [Key(EV_KEY, KEY_A, 1)])
+        # nothing to debounce
+        self.assertIsNone(reader._debounce_timeout)
+
+        reader._results.send_events([(0, 0, EV_REL, REL_WHEEL, 1)])
+        iterate()
+        self.assertEqual(len(reader._unreleased), 2)
+        self.assertIsNotNone(reader._debounce_timeout)
+
+        # the wheel is considered released after a few ticks, without
+        # any new events arriving
+        start = time.time()
+        while reader._debounce_timeout is not None:
+            context.iteration(True)
+            if time.time() - start > 1:
+                raise AssertionError('Did not release the wheel')
+
+        self.assertEqual(len(reader._unreleased), 1)
+        self.assertEqual(reader.get_unreleased_keys(), (EV_KEY, KEY_A, 1))
+
+        reader.stop_watching()
+        self.assertIsNone(reader._io_watch)
+        calls = len(results)
+        reader._results.send_events([(0, 0, EV_KEY, KEY_COMMA, 1)])
+        iterate()
+        self.assertEqual(len(results), calls)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import time
+import unittest
+
+import evdev
+from evdev.ecodes import EV_KEY, EV_REL, EV_ABS, EV_SYN, KEY_A, KEY_B, \
+    REL_X, ABS_X
+
+from keymapper.capture import record, load, write_header, write_event, \
+    Capture
+from keymapper.injection.replay import replay
+from keymapper.groups import groups, GAMEPAD
+from keymapper.config import MOUSE
+from keymapper.mapping import Mapping
+from keymapper.key import Key
+from keymapper.state import system_mapping
+
+from tests.test import new_event, push_events, quick_cleanup, tmp, \
+    InputDevice, MAX_ABS
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(tmp, exist_ok=True)
+        self.path = os.path.join(tmp, 'capture')
+
+    def tearDown(self):
+        quick_cleanup()
+
+    def test_record(self):
+        group = groups.find(key='Foo Device 2')
+        push_events(group.key, [
+            new_event(EV_KEY, KEY_A, 1, 1234.5),
+            new_event(EV_KEY, KEY_A, 0, 1234.6),
+            new_event(EV_REL, REL_X, -3, 1234.7),
+        ])
+
+        self.assertEqual(record(group, self.path, duration=0.3), 3)
+
+        capture = load(self.path)
+        self.assertEqual(capture.group_key, group.key)
+        self.assertEqual(len(capture.devices), len(group.paths))
+        self.assertEqual(capture.get_group().name, group.name)
+        self.assertEqual(capture.get_group().types, group.types)
+        self.assertAlmostEqual(capture.get_duration(), 0.2, places=5)
+        self.assertEqual(
+            [event[2:] for event in capture.events],
+            [(EV_KEY, KEY_A, 1), (EV_KEY, KEY_A, 0), (EV_REL, REL_X, -3)]
+        )
+
+        # the capabilities can be used to fake the device again
+        device = InputDevice(group.paths[0])
+        self.assertEqual(
+            capture.devices[0]['capabilities'],
+            device.capabilities(absinfo=True)
+        )
+
+    def test_load_invalid(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'foo')
+        self.assertRaises(ValueError, lambda: load(self.path))
+
+        # an incomplete record at the end is ignored
+        device = InputDevice('/dev/input/event30')
+        with open(self.path, 'wb') as file:
+            write_header(file, 'gamepad', [GAMEPAD], [device])
+            write_event(file, 0, new_event(EV_ABS, ABS_X, 1000))
+            file.write(b'123')
+
+        capture = load(self.path)
+        self.assertEqual(len(capture.events), 1)
+        self.assertIsInstance(
+            capture.devices[0]['capabilities'][EV_ABS][0][1],
+            evdev.AbsInfo
+        )
+
+    def test_replay(self):
+        device = InputDevice('/dev/input/event10')
+        code_b = 91
+        system_mapping._set('b', code_b)
+        mapping = Mapping()
+        mapping.change(Key(EV_KEY, KEY_A, 1), 'b')
+
+        with open(self.path, 'wb') as file:
+            write_header(file, 'Foo Device 2', [], [device])
+            for index in range(100):
+                timestamp = 100 + index * 0.001
+                write_event(file, 0, new_event(EV_KEY, KEY_A, 1, timestamp))
+                write_event(file, 0, new_event(EV_SYN, 0, 0, timestamp))
+                write_event(file, 0, new_event(EV_KEY, KEY_A, 0, timestamp))
+                write_event(file, 0, new_event(EV_KEY, KEY_B, 1, timestamp))
+                write_event(file, 0, new_event(EV_KEY, KEY_B, 0, timestamp))
+
+        capture = load(self.path)
+        context, seconds = replay(capture, mapping)
+
+        counters, _ = context.stats.serialize()
+        self.assertEqual(counters['events'], 500)
+        # a down and up for each a
+        self.assertEqual(counters['mapped'], 200)
+        self.assertEqual(context.uinput.write_count, 200)
+        # b and the syn events
+        self.assertEqual(counters['forwarded'], 300)
+        self.assertEqual(counters['macro'], 0)
+        self.assertLess(seconds, capture.get_duration() + 5)
+
+        # realtime keeps the timing of the recording
+        start = time.time()
+        replay(capture, mapping, realtime=True)
+        self.assertGreaterEqual(time.time() - start, capture.get_duration())
+
+    def test_replay_gamepad(self):
+        device = InputDevice('/dev/input/event30')
+        mapping = Mapping()
+        mapping.set('gamepad.joystick.left_purpose', MOUSE)
+        mapping.set('gamepad.joystick.right_purpose', MOUSE)
+
+        with open(self.path, 'wb') as file:
+            write_header(file, 'gamepad', [GAMEPAD], [device])
+            write_event(file, 0, new_event(EV_ABS, ABS_X, MAX_ABS, 100))
+            write_event(file, 0, new_event(EV_ABS, ABS_X, MAX_ABS, 100.2))
+
+        capture = load(self.path)
+        self.assertEqual(capture.get_group().types, [GAMEPAD])
+
+        # the joystick moves the mouse
+        context, _ = replay(capture, mapping, realtime=True)
+        self.assertGreater(context.uinput.write_count, 0)
+        self.assertEqual(context.uinput.drop_count, 0)
+
+        # without knowing that it is a gamepad, the uinput lacks the
+        # capabilities for that
+        capture = Capture('gamepad', [], capture.devices, capture.events)
+        context, _ = replay(capture, mapping, realtime=True)
+        self.assertEqual(context.uinput.write_count, 0)
+        self.assertGreater(context.uinput.drop_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
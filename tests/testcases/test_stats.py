@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from evdev.ecodes import EV_KEY
+
+from keymapper.injection.stats import Histogram, Stats, get_bucket, \
+    get_bucket_limit, NUM_BUCKETS, FORWARDED, MAPPED, MACRO
+
+from tests.test import new_event
+
+
+class TestStats(unittest.TestCase):
+    def test_get_bucket(self):
+        self.assertEqual(get_bucket(-1), 0)
+        self.assertEqual(get_bucket(0), 0)
+        self.assertEqual(get_bucket(0.000001), 0)
+        self.assertEqual(get_bucket(0.000002), 1)
+        self.assertEqual(get_bucket(0.000003), 2)
+        self.assertEqual(get_bucket(0.000004), 2)
+        self.assertEqual(get_bucket(0.000005), 3)
+        self.assertEqual(get_bucket(0.001), 10)
+        self.assertEqual(get_bucket(100000), NUM_BUCKETS - 1)
+
+        for index in range(NUM_BUCKETS):
+            self.assertEqual(get_bucket(get_bucket_limit(index)), index)
+
+    def test_percentile(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.count(), 0)
+        self.assertIsNone(histogram.percentile(0.5))
+
+        for _ in range(98):
+            histogram.add(0.0001)
+        histogram.add(0.001)
+        histogram.add(0.01)
+
+        self.assertEqual(histogram.count(), 100)
+        self.assertEqual(histogram.percentile(0.5), get_bucket_limit(7))
+        self.assertEqual(histogram.percentile(0.98), get_bucket_limit(7))
+        self.assertEqual(histogram.percentile(0.99), get_bucket_limit(10))
+        self.assertEqual(histogram.percentile(1), get_bucket_limit(14))
+
+        # the buckets can be sent to other processes
+        copy = Histogram(histogram.buckets)
+        self.assertEqual(copy.percentile(1), get_bucket_limit(14))
+        self.assertEqual(len(copy.buckets), NUM_BUCKETS)
+
+    def test_stats(self):
+        stats = Stats()
+        stats.events = 3
+        stats.record(MAPPED, new_event(EV_KEY, 1, 1))
+        stats.record(MAPPED, new_event(EV_KEY, 1, 0))
+        stats.record(FORWARDED, new_event(EV_KEY, 2, 1, timestamp=0))
+
+        counters, histograms = stats.serialize()
+        self.assertEqual(counters, {
+            'events': 3,
+            FORWARDED: 0,
+            MAPPED: 2,
+            MACRO: 0
+        })
+        self.assertEqual(sum(histograms[MAPPED]), 2)
+        # it was just now, so it is certainly faster than a second
+        self.assertLess(
+            Histogram(histograms[MAPPED]).percentile(1),
+            get_bucket_limit(get_bucket(1))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from evdev.ecodes import EV_KEY, EV_ABS, ABS_HAT0X
+
+from keymapper.injection.trace import TraceBuffer, decode, format_record, \
+    FORWARDED, MAPPED, DUPLICATE, DISABLED, RELEASE, NO_OUTPUT
+from keymapper.injection.keycode_mapper import KeycodeMapper
+from keymapper.injection.context import Context
+from keymapper.injection.stats import Stats
+from keymapper.mapping import Mapping, DISABLE_CODE
+
+from tests.test import new_event, UInput, InputDevice, quick_cleanup
+
+
+class TestTrace(unittest.TestCase):
+    def tearDown(self):
+        quick_cleanup()
+
+    def test_ring_buffer(self):
+        trace_buffer = TraceBuffer(size=3)
+        self.assertEqual(decode(trace_buffer.dump()), [])
+
+        trace_buffer.record((EV_KEY, 1, 1), MAPPED, 30)
+        trace_buffer.record((EV_KEY, 1, 0), RELEASE, 30)
+        self.assertEqual(len(trace_buffer), 2)
+        records = decode(trace_buffer.dump())
+        self.assertEqual(records[0][1:], (EV_KEY, 1, 1, MAPPED, 30))
+        self.assertEqual(records[1][1:], (EV_KEY, 1, 0, RELEASE, 30))
+
+        # overwrites the oldest ones
+        trace_buffer.record((EV_ABS, ABS_HAT0X, -1), FORWARDED, ABS_HAT0X)
+        trace_buffer.record((EV_KEY, 2, 1), DUPLICATE)
+        self.assertEqual(len(trace_buffer), 3)
+        records = decode(trace_buffer.dump())
+        self.assertEqual([record[1:] for record in records], [
+            (EV_KEY, 1, 0, RELEASE, 30),
+            (EV_ABS, ABS_HAT0X, -1, FORWARDED, ABS_HAT0X),
+            (EV_KEY, 2, 1, DUPLICATE, NO_OUTPUT),
+        ])
+        self.assertLessEqual(records[0][0], records[2][0])
+
+        self.assertTrue(format_record(records[1]).endswith(
+            f'({EV_ABS}, {ABS_HAT0X}, -1) forwarded {ABS_HAT0X}'
+        ))
+        self.assertTrue(format_record(records[2]).endswith(
+            f'({EV_KEY}, 2, 1) duplicate'
+        ))
+
+    def test_decode_invalid(self):
+        dump = TraceBuffer(size=2).dump()
+        self.assertRaises(ValueError, lambda: decode(b''))
+        self.assertRaises(ValueError, lambda: decode(b'abcd' + dump[4:]))
+
+        trace_buffer = TraceBuffer(size=2)
+        trace_buffer.record((EV_KEY, 1, 1), MAPPED, 30)
+        self.assertRaises(ValueError, lambda: decode(trace_buffer.dump()[:-1]))
+
+    def test_keycode_mapper(self):
+        mapping = Mapping()
+        context = Context(mapping)
+        context.key_to_code = {
+            ((EV_KEY, 1, 1),): 30,
+            ((EV_KEY, 2, 1),): DISABLE_CODE,
+        }
+        context.uinput = UInput()
+        context.trace = TraceBuffer()
+        context.stats = Stats()
+        forward_to = UInput()
+        source = InputDevice('/dev/input/event11')
+        keycode_mapper = KeycodeMapper(context, source, forward_to)
+
+        keycode_mapper.handle_keycode(new_event(EV_KEY, 1, 1))
+        keycode_mapper.handle_keycode(new_event(EV_KEY, 1, 1))
+        keycode_mapper.handle_keycode(new_event(EV_KEY, 1, 0))
+        keycode_mapper.handle_keycode(new_event(EV_KEY, 2, 1))
+        keycode_mapper.handle_keycode(new_event(EV_KEY, 3, 1))
+        keycode_mapper.handle_keycode(new_event(EV_KEY, 3, 0))
+
+        records = decode(context.trace.dump())
+        self.assertEqual([record[1:] for record in records], [
+            (EV_KEY, 1, 1, MAPPED, 30),
+            (EV_KEY, 1, 1, DUPLICATE, NO_OUTPUT),
+            (EV_KEY, 1, 0, RELEASE, 30),
+            (EV_KEY, 2, 1, DISABLED, NO_OUTPUT),
+            (EV_KEY, 3, 1, FORWARDED, 3),
+            (EV_KEY, 3, 0, FORWARDED, 3),
+        ])
+
+        # the same helper records the stats
+        counters, _ = context.stats.serialize()
+        self.assertEqual(counters['mapped'], 2)
+        self.assertEqual(counters['forwarded'], 2)
+        self.assertEqual(counters['macro'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sys
+import json
+import unittest
+import subprocess
+
+from keymapper.trigger import OBJECT_PATH, BUS_NAME
+
+
+# seconds that starting the trigger may take at most. Importing the
+# daemon takes way longer than that.
+STARTUP_BUDGET = 0.25
+
+MEASURE = '''
+import sys
+import time
+import json
+start = time.perf_counter()
+import keymapper.trigger
+import gi
+gi.require_version('Gio', '2.0')
+from gi.repository import Gio, GLib
+print(json.dumps({
+    'time': time.perf_counter() - start,
+    'modules': list(sys.modules.keys())
+}))
+'''
+
+
+class TestTrigger(unittest.TestCase):
+    def test_object_path(self):
+        self.assertEqual(BUS_NAME, 'keymapper.Control')
+        self.assertEqual(OBJECT_PATH, '/keymapper/Control')
+
+    def test_startup_time(self):
+        # a new interpreter, because this one already has everything
+        # imported
+        env = {**os.environ, 'PYTHONPATH': os.getcwd()}
+        output = subprocess.check_output(
+            [sys.executable, '-c', MEASURE],
+            env=env
+        )
+        result = json.loads(output.decode().strip().split('\n')[-1])
+
+        for module in [
+            'evdev', 'pydbus', 'pkg_resources', 'keymapper.logger',
+            'keymapper.daemon', 'keymapper.groups', 'keymapper.config'
+        ]:
+            self.assertNotIn(module, result['modules'])
+
+        self.assertLess(result['time'], STARTUP_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# key-mapper - GUI for device specific keyboard mappings
+# Copyright (C) 2021 sezanzeb <proxima@sezanzeb.de>
+#
+# This file is part of key-mapper.
+#
+# key-mapper is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# key-mapper is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with key-mapper.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import time
+import unittest
+
+from evdev.ecodes import EV_KEY
+
+from keymapper.paths import mkdir
+from keymapper.key import Key
+from keymapper.mapping import Mapping
+from keymapper.gui.writer import PresetWriter
+
+from tests.test import quick_cleanup, tmp
+
+
+KEY = Key(EV_KEY, 30, 1)
+
+
+def read(path):
+    """Get the symbol of the only mapping in the preset."""
+    mapping = Mapping()
+    mapping.load(path)
+    return mapping.get_symbol(KEY)
+
+
+def create(symbol):
+    mapping = Mapping()
+    mapping.change(KEY, symbol)
+    return mapping
+
+
+class TestWriter(unittest.TestCase):
+    def setUp(self):
+        mkdir(tmp)
+        self.path = os.path.join(tmp, 'foo.json')
+        self.writer = PresetWriter(delay=0.1)
+
+    def tearDown(self):
+        self.writer.clear()
+        quick_cleanup()
+
+    def test_save(self):
+        self.writer.save(self.path, create('a'))
+        self.writer.save(self.path, create('b'))
+        self.assertFalse(os.path.exists(self.path))
+
+        # changes reset the delay
+        time.sleep(0.06)
+        self.writer.save(self.path, create('c'))
+        time.sleep(0.06)
+        self.assertFalse(os.path.exists(self.path))
+
+        time.sleep(0.1)
+        self.assertEqual(read(self.path), 'c')
+
+    def test_save_clone(self):
+        mapping = create('a')
+        self.writer.save(self.path, mapping.clone_for_saving())
+        # modifying it afterwards doesn't affect what is saved
+        mapping.change(KEY, 'b')
+        self.writer.flush()
+        self.assertEqual(read(self.path), 'a')
+
+    def test_flush(self):
+        other_path = os.path.join(tmp, 'bar.json')
+        self.writer.save(self.path, create('a'))
+        self.writer.save(other_path, create('b'))
+        self.writer.flush()
+        self.assertEqual(read(self.path), 'a')
+        self.assertEqual(read(other_path), 'b')
+
+        # nothing pending anymore that could overwrite newer stuff
+        create('c').save(self.path)
+        time.sleep(0.2)
+        self.assertEqual(read(self.path), 'c')
+
+    def test_clear(self):
+        self.writer.save(self.path, create('a'))
+        self.writer.clear()
+        time.sleep(0.2)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_error(self):
+        # the path is a directory. Logs an error, doesn't crash
+        path = os.path.join(tmp, 'bar.json')
+        os.mkdir(path)
+        self.writer.save(path, create('a'))
+        self.writer.flush()
+        self.assertTrue(os.path.isdir(path))
+
+        # the thread is still alive
+        self.writer.save(self.path, create('b'))
+        time.sleep(0.2)
+        self.assertEqual(read(self.path), 'b')
+
+    def test_callback(self):
+        results = []
+
+        def callback(path, error):
+            results.append((path, error))
+
+        self.writer.save(self.path, create('a'), callback)
+        self.writer.flush()
+        self.assertEqual(results, [(self.path, None)])
+
+        path = os.path.join(tmp, 'bar.json')
+        os.mkdir(path)
+        self.writer.save(path, create('a'), callback)
+        time.sleep(0.2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[1][0], path)
+        self.assertIsInstance(results[1][1], OSError)
+
+
+if __name__ == "__main__":
+    unittest.main()